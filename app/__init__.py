@@ -39,6 +39,10 @@ def create_app():
     app.register_blueprint(vendor.bp)
     app.register_blueprint(profile.bp)
 
+    # CLI commands (flask audit-indexes, ...)
+    from app.cli import register_commands
+    register_commands(app)
+
     # Context Processor untuk menyisipkan waktu server ke semua template
     from datetime import datetime
     @app.context_processor
@@ -0,0 +1,198 @@
+"""
+Flask CLI commands (jalankan dengan `flask <command>`)
+"""
+import json
+from datetime import date, timedelta
+
+import click
+from sqlalchemy import func, select, text
+
+from app import db
+
+
+# ==========================================
+# INDEX AUDIT
+# ==========================================
+
+def _audited_queries():
+    """(name, table, statement) for the hot lookup paths covered by indexes"""
+    from app.models import (
+        Attendance, AttendanceRequest, Booking, RescheduleRequest, StudentSchedule,
+        TeacherSessionOverride
+    )
+    today = date.today()
+    month_start = today.replace(day=1)
+
+    return [
+        ('booking per enrollment/tanggal/sesi', 'bookings',
+         select(Booking.id).where(Booking.enrollment_id == 1, Booking.date == today, Booking.timeslot_id == 1)),
+        ('booking pengajar per rentang tanggal', 'bookings',
+         select(Booking.id).where(Booking.teacher_id == 1, Booking.date >= today,
+                                  Booking.date < today + timedelta(days=7), Booking.status == 'booked')),
+        ('attendance per booking', 'attendances',
+         select(Attendance.id).where(Attendance.booking_id == 1)),
+        ('attendance pengajar per bulan', 'attendances',
+         select(func.count(Attendance.id)).where(Attendance.teacher_id == 1, Attendance.date >= month_start,
+                                                 Attendance.date < month_start + timedelta(days=31))),
+        ('override per pengajar/tanggal/sesi', 'teacher_session_overrides',
+         select(TeacherSessionOverride.id).where(TeacherSessionOverride.original_teacher_id == 1,
+                                                 TeacherSessionOverride.date == today,
+                                                 TeacherSessionOverride.timeslot_id == 1)),
+        ('jadwal pengajar per hari/sesi', 'student_schedules',
+         select(StudentSchedule.id).where(StudentSchedule.teacher_id == 1, StudentSchedule.day_of_week == 0,
+                                          StudentSchedule.timeslot_id == 1)),
+        ('request absen per booking', 'attendance_requests',
+         select(AttendanceRequest.id).where(AttendanceRequest.booking_id == 1,
+                                            AttendanceRequest.approval_status == 'pending')),
+        ('badge request absen pending', 'attendance_requests',
+         select(func.count()).select_from(AttendanceRequest).where(AttendanceRequest.approval_status == 'pending')),
+        ('badge reschedule pending', 'reschedule_requests',
+         select(func.count()).select_from(RescheduleRequest).where(RescheduleRequest.status == 'pending')),
+    ]
+
+
+def _plan_uses_seq_scan(sql, table):
+    """Run EXPLAIN for the current dialect and report whether `table` is fully scanned"""
+    dialect = db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        # Small/seeded tables make seq scans "cheaper"; disable them so the
+        # planner only falls back to one when no usable index exists.
+        db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = db.session.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        def walk(node):
+            if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') == table:
+                return True
+            return any(walk(child) for child in node.get('Plans', []))
+
+        return walk(plan[0]['Plan']), json.dumps(plan, indent=1)
+
+    if dialect == 'sqlite':
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+        details = [row[-1] for row in rows]
+        seq = any(d.startswith(f'SCAN {table}') and 'USING' not in d for d in details)
+        return seq, '\n'.join(details)
+
+    raise click.ClickException(f'EXPLAIN audit not supported for dialect {dialect}')
+
+
+def register_commands(app):
+
+    @app.cli.command('audit-indexes')
+    @click.option('--verbose', is_flag=True, help='Tampilkan query plan lengkap')
+    def audit_indexes(verbose):
+        """Cek (EXPLAIN) bahwa query hot-path memakai index, bukan sequential scan."""
+        failures = 0
+        for name, table, stmt in _audited_queries():
+            sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+            seq_scan, plan = _plan_uses_seq_scan(sql, table)
+            click.echo(f"[{'FAIL' if seq_scan else ' OK '}] {name} ({table})")
+            if verbose or seq_scan:
+                click.echo(plan)
+            failures += seq_scan
+            db.session.rollback()
+
+        if failures:
+            raise click.ClickException(f'{failures} query masih sequential scan')
+        click.echo('Semua query memakai index.')
+
+    @app.cli.group('recap-rollup')
+    def recap_rollup():
+        """Rekap sesi pengajar bulanan (tabel teacher_session_rollup)."""
+
+    @recap_rollup.command('verify')
+    def recap_rollup_verify():
+        """Bandingkan rollup dengan agregat live dari tabel attendances."""
+        from app.services.recap import find_rollup_mismatches
+
+        mismatches = find_rollup_mismatches()
+        for (teacher_id, year, month), stored, live in mismatches:
+            click.echo(f'[DIFF] teacher={teacher_id} {year}-{month:02d}: rollup={stored} live={live}')
+        if mismatches:
+            raise click.ClickException(f'{len(mismatches)} baris rollup tidak sesuai (jalankan `flask recap-rollup rebuild`)')
+        click.echo('Rollup sesuai dengan data absensi.')
+
+    @recap_rollup.command('rebuild')
+    def recap_rollup_rebuild():
+        """Bangun ulang rollup dari awal lalu verifikasi."""
+        from app.services.recap import find_rollup_mismatches, rebuild_rollup
+
+        count = rebuild_rollup()
+        mismatches = find_rollup_mismatches()
+        if mismatches:
+            db.session.rollback()
+            raise click.ClickException(f'Rebuild gagal: {len(mismatches)} baris masih berbeda, dibatalkan')
+        db.session.commit()
+        click.echo(f'Rollup dibangun ulang: {count} baris.')
+
+    @app.cli.group('wa-queue')
+    def wa_queue():
+        """Antrian pesan WA keluar (tabel outbound_messages)."""
+
+    @wa_queue.command('status')
+    def wa_queue_status():
+        """Jumlah pesan per status."""
+        from app.services.outbound_messages import queue_stats
+
+        stats = queue_stats()
+        for status in ('pending', 'sending', 'sent', 'dead'):
+            click.echo(f'{status:>8}: {stats.get(status, 0)}')
+
+    @wa_queue.command('dispatch')
+    def wa_queue_dispatch():
+        """Kirim semua pesan yang sudah jatuh tempo sekarang (tanpa scheduler)."""
+        from app.services.outbound_messages import dispatch_outbound_messages
+
+        counts = dispatch_outbound_messages()
+        click.echo(f"Terkirim {counts['sent']}, dijadwalkan ulang {counts['retry']}, dead {counts['dead']}")
+
+    @wa_queue.command('retry-dead')
+    @click.argument('message_ids', nargs=-1, type=int)
+    def wa_queue_retry_dead(message_ids):
+        """Masukkan kembali pesan 'dead' ke antrian (semua, atau ID tertentu)."""
+        from app.services.outbound_messages import retry_dead_messages
+
+        count = retry_dead_messages(list(message_ids) or None)
+        click.echo(f'{count} pesan dimasukkan kembali ke antrian.')
+
+    @app.cli.group('reminders')
+    def reminders():
+        """Job pengingat WA (tanpa menunggu scheduler)."""
+
+    @reminders.command('run')
+    @click.argument('job', type=click.Choice(['student-h1', 'student-hday', 'teacher-h1', 'teacher-weekly']))
+    @click.option('--date', 'target_date', type=click.DateTime(formats=['%Y-%m-%d']),
+                  help='Tanggal jadwal (H-1: besok, H-day: hari ini, weekly: awal minggu)')
+    @click.option('--dry-run', is_flag=True, help='Render pesan tanpa memasukkan ke antrian')
+    @click.option('--quiet', is_flag=True, help='Dry run: tampilkan ringkasan saja, tanpa isi pesan')
+    def reminders_run(job, target_date, dry_run, quiet):
+        """Jalankan satu job pengingat sekarang."""
+        from app.services.notification_batch import REMINDER_JOBS
+
+        result = REMINDER_JOBS[job](target_date.date() if target_date else None, dry_run=dry_run)
+        if dry_run and not quiet:
+            for recipient, message in result['messages']:
+                click.echo(f'--- {recipient}\n{message}\n')
+        click.echo(f"{'[DRY RUN] ' if dry_run else ''}{job}: {result['recipients']} penerima, "
+                   f"{len(result['messages']) if dry_run else result['queued']} pesan, {result['skipped']} dilewati | "
+                   f"load {result['load_ms']}ms, render {result['render_ms']}ms, total {result['total_ms']}ms")
+
+    @app.cli.group('bookings')
+    def bookings():
+        """Booking dari jadwal rutin (rolling horizon)."""
+
+    @bookings.command('materialize')
+    @click.option('--weeks', type=int, help='Horizon dalam minggu (default BOOKING_HORIZON_WEEKS)')
+    @click.option('--enrollment', 'enrollment_ids', type=int, multiple=True, help='Hanya enrollment ini')
+    def bookings_materialize(weeks, enrollment_ids):
+        """Buat booking yang belum ada sampai horizon (aman dijalankan berulang)."""
+        from app.services.booking_materializer import materialize_bookings
+
+        result = materialize_bookings(horizon_weeks=weeks, enrollment_ids=list(enrollment_ids) or None)
+        db.session.commit()
+        click.echo(f"{result['schedules']} jadwal, {result['candidates']} sesi belum ada: "
+                   f"{result['booked']} booking + {result['rescheduled']} marker reschedule dibuat "
+                   f"({result['elapsed_ms']}ms)")
@@ -187,6 +187,11 @@ class ClassEnrollment(db.Model):
 
 class StudentSchedule(db.Model):
     __tablename__ = 'student_schedules'
+    __table_args__ = (
+        # Jadwal pengajar per hari/sesi (kalender, master schedule, reminder)
+        db.Index('ix_student_schedules_teacher_day_slot', 'teacher_id', 'day_of_week', 'timeslot_id'),
+        db.Index('ix_student_schedules_enrollment_id', 'enrollment_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'))
     class_enrollment_id = db.Column(db.Integer, db.ForeignKey('class_enrollments.id'), nullable=True)  # NEW
@@ -203,6 +208,13 @@ class StudentSchedule(db.Model):
 # 5. OPERATION (BOOKING & ATTENDANCE)
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # Satu booking per siswa per tanggal/sesi (juga dipakai untuk cek booking di dashboard, izin, onboarding)
+        db.UniqueConstraint('enrollment_id', 'date', 'timeslot_id', name='uq_bookings_enrollment_date_slot'),
+        # Sesi pengajar per rentang tanggal (kalender, absensi, reminder)
+        db.Index('ix_bookings_teacher_date_status', 'teacher_id', 'date', 'status'),
+        db.Index('ix_bookings_class_enrollment_id', 'class_enrollment_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'))
     class_enrollment_id = db.Column(db.Integer, db.ForeignKey('class_enrollments.id'), nullable=True)  # NEW
@@ -223,6 +235,12 @@ class Booking(db.Model):
 
 class Attendance(db.Model):
     __tablename__ = 'attendances'
+    __table_args__ = (
+        # Satu absensi per booking
+        db.UniqueConstraint('booking_id', name='uq_attendances_booking_id'),
+        # Rekap sesi pengajar per bulan
+        db.Index('ix_attendances_teacher_date', 'teacher_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'))
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -233,6 +251,21 @@ class Attendance(db.Model):
     # Tambahan: Agar tau siapa guru yang mengabsen
     teacher = db.relationship('User', foreign_keys=[teacher_id])
 
+# Rekap sesi pengajar per bulan (diupdate setiap absensi baru masuk)
+class TeacherSessionRollup(db.Model):
+    __tablename__ = 'teacher_session_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('teacher_id', 'year', 'month', name='uq_teacher_session_rollup_teacher_month'),
+        db.Index('ix_teacher_session_rollup_year_month', 'year', 'month'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)  # 1-12
+    sessions = db.Column(db.Integer, nullable=False, default=0)  # Jumlah booking yang diabsen
+
+    teacher = db.relationship('User', foreign_keys=[teacher_id])
+
 # 7. TOOLS MODEL
 class Tool(db.Model):
     __tablename__ = 'tools'
@@ -267,6 +300,10 @@ class Syllabus(db.Model):
 # 9. PORTFOLIO MODEL - Portfolio siswa (Google Drive)
 class Portfolio(db.Model):
     __tablename__ = 'portfolios'
+    __table_args__ = (
+        # Portfolio per siswa-kelas per topik (tab portfolio siswa/pengajar/admin)
+        db.Index('ix_portfolios_class_enrollment_syllabus', 'class_enrollment_id', 'syllabus_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     class_enrollment_id = db.Column(db.Integer, db.ForeignKey('class_enrollments.id'), nullable=False)
     syllabus_id = db.Column(db.Integer, db.ForeignKey('syllabus.id'), nullable=False)  # Wajib terhubung ke silabus
@@ -278,9 +315,30 @@ class Portfolio(db.Model):
     class_enrollment = db.relationship('ClassEnrollment', backref='portfolios')
     syllabus = db.relationship('Syllabus', backref='portfolios')
 
+    @classmethod
+    def load_map(cls, class_enrollment_ids):
+        """{(class_enrollment_id, syllabus_id): Portfolio} for all given class enrollments, one query"""
+        class_enrollment_ids = set(class_enrollment_ids)
+        portfolios = {}
+        if not class_enrollment_ids:
+            return portfolios
+        for portfolio in cls.query.filter(
+            cls.class_enrollment_id.in_(class_enrollment_ids)
+        ).order_by(cls.id):
+            # First upload per topic, as the per-topic .first() lookups returned
+            portfolios.setdefault((portfolio.class_enrollment_id, portfolio.syllabus_id), portfolio)
+        return portfolios
+
 # 10. ATTENDANCE REQUEST MODEL - Request absen yang sudah lewat
 class AttendanceRequest(db.Model):
     __tablename__ = 'attendance_requests'
+    __table_args__ = (
+        db.Index('ix_attendance_requests_booking_status', 'booking_id', 'approval_status'),
+        # Partial index untuk badge counter & daftar pending
+        db.Index('ix_attendance_requests_pending', 'request_date',
+                 postgresql_where=db.text("approval_status = 'pending'"),
+                 sqlite_where=db.text("approval_status = 'pending'")),
+    )
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -308,6 +366,11 @@ class AttendanceRequest(db.Model):
 # 12. TEACHER SESSION OVERRIDE - untuk penggantian pengajar
 class TeacherSessionOverride(db.Model):
     __tablename__ = 'teacher_session_overrides'
+    __table_args__ = (
+        # Satu penggantian per pengajar asli per tanggal/sesi
+        db.UniqueConstraint('original_teacher_id', 'date', 'timeslot_id', name='uq_session_overrides_original_date_slot'),
+        db.Index('ix_session_overrides_substitute_date', 'substitute_teacher_id', 'date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False)
     timeslot_id = db.Column(db.Integer, db.ForeignKey('timeslots.id'), nullable=False)
@@ -326,6 +389,12 @@ class TeacherSessionOverride(db.Model):
 # 13. RESCHEDULE REQUEST MODEL - Request pindah jadwal
 class RescheduleRequest(db.Model):
     __tablename__ = 'reschedule_requests'
+    __table_args__ = (
+        # Partial index untuk badge counter & daftar pending
+        db.Index('ix_reschedule_requests_pending', 'request_date',
+                 postgresql_where=db.text("status = 'pending'"),
+                 sqlite_where=db.text("status = 'pending'")),
+    )
     id = db.Column(db.Integer, primary_key=True)
     
     # Source - jadwal yang ingin di-reschedule (one of these should be set)
@@ -492,3 +561,99 @@ class VendorPayment(db.Model):
     
     # Relationships
     creator = db.relationship('User', foreign_keys=[created_by])
+
+
+# ============================================
+# 15. BACKGROUND REPORTS
+# ============================================
+
+class ReportJob(db.Model):
+    """Export laporan (Excel/PDF) yang dibuat di background"""
+    __tablename__ = 'report_jobs'
+    __table_args__ = (
+        # Dedupe request identik (report + params) selama TTL
+        db.Index('ix_report_jobs_report_params', 'report', 'params_hash'),
+        # Maksimal satu job aktif per request identik, dijaga database
+        db.Index('ux_report_jobs_active', 'report', 'params_hash', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'running')"),
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    report = db.Column(db.String(50), nullable=False)  # key di app.services.reports.REPORTS
+    params = db.Column(db.Text, nullable=False)  # JSON
+    params_hash = db.Column(db.String(64), nullable=False)  # sha256 dari params
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    progress = db.Column(db.Integer, default=0)  # 0-100
+    
+    file_path = db.Column(db.String(500))
+    filename = db.Column(db.String(200))  # Nama file untuk download
+    mimetype = db.Column(db.String(100))
+    error = db.Column(db.Text)
+    
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)  # Artifact dihapus setelah ini
+    
+    requester = db.relationship('User', foreign_keys=[requested_by])
+
+
+# ============================================
+# 16. OUTBOUND WHATSAPP QUEUE
+# ============================================
+
+class OutboundMessage(db.Model):
+    """Antrian pesan WA keluar (dikirim oleh dispatcher di background)"""
+    __tablename__ = 'outbound_messages'
+    __table_args__ = (
+        # Dispatcher: pesan yang siap dikirim
+        db.Index('ix_outbound_messages_status_next_attempt', 'status', 'next_attempt_at'),
+        # Urutan per penerima
+        db.Index('ix_outbound_messages_recipient_status', 'recipient', 'status'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(100), nullable=False)  # 628xxx@s.whatsapp.net / xxx@g.us
+    message = db.Column(db.Text, nullable=False)
+    source = db.Column(db.String(50))  # Asal pesan, mis. 'izin', 'reminder_h1'
+    
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)  # Saat diambil dispatcher (status sending)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+
+# ============================================
+# 17. SCHEDULER RUNS
+# ============================================
+
+class SchedulerRun(db.Model):
+    """Riwayat eksekusi job scheduler (durasi, baris diproses, pesan dikirim)"""
+    __tablename__ = 'scheduler_runs'
+    __table_args__ = (
+        # Halaman admin: riwayat per job, terbaru dulu
+        db.Index('ix_scheduler_runs_job_started', 'job_id', 'started_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False)  # Nama job, mis. 'student_reminder_h1'
+    status = db.Column(db.String(20), default='running')  # running, success, failed
+    
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    
+    rows_scanned = db.Column(db.Integer, nullable=True)
+    messages_sent = db.Column(db.Integer, nullable=True)  # Pesan diantrikan / terkirim
+    error = db.Column(db.Text, nullable=True)
+    pid = db.Column(db.Integer, nullable=True)  # Proses leader yang menjalankan
+
+
+class CacheVersion(db.Model):
+    """Versi data ter-cache yang dibagi semua worker/container (naik di transaksi yang mengubah datanya)"""
+    __tablename__ = 'cache_versions'
+    namespace = db.Column(db.String(100), primary_key=True)  # Mis. 'teacher_calendar:12'
+    version = db.Column(db.Integer, nullable=False, default=0)
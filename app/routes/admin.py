@@ -1,8 +1,21 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+import tempfile
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, send_file
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app import db
-from app.models import User, Enrollment, StudentSchedule, Subject, TimeSlot, TeacherAvailability, Program, Batch, ProgramSubject, TeacherSkill, Booking, Attendance, Tool, ProgramTool, ProgramClass, ClassEnrollment, MasterClass, AttendanceRequest, TeacherSessionOverride, RescheduleRequest
-from datetime import date, datetime
+from app.models import User, Enrollment, StudentSchedule, Subject, TimeSlot, TeacherAvailability, Program, Batch, ProgramSubject, TeacherSkill, Booking, Attendance, Tool, ProgramTool, ProgramClass, ClassEnrollment, MasterClass, AttendanceRequest, TeacherSessionOverride, RescheduleRequest, ReportJob, SchedulerRun
+from app.security import csrf_protect
+from app.utils.db import insert_or_ignore
+from app.services.booking_materializer import (
+    mark_rescheduled, materialize_bookings, release_enrollment_bookings, release_schedule_bookings
+)
+from app.services.master_schedule import load_schedule_grid, load_schedule_occupancy
+from app.services.exports import export_students_progress
+from app.services.recap import delete_teacher_rollup, forget_teacher_sessions, record_teacher_sessions, teacher_recap_rows
+from app.services.reports import ReportParamError, build_report, parse_report_params
+from app.services.report_jobs import is_downloadable, submit_report_job
+from app.services.syllabus_index import get_syllabus_indexes, invalidate_syllabus_index
+from datetime import date, datetime, timedelta
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -24,6 +37,14 @@ def student_list():
     students = db.session.query(User).filter(User.role == 'student').all()
     return render_template('admin/student_list.html', students=students)
 
+@bp.route('/students/export-excel')
+@login_required
+@admin_required
+def export_students_excel():
+    """Export all students with per-class progress to Excel (streamed)"""
+    export = export_students_progress()
+    return export.send(f"data_siswa_progress_{date.today().strftime('%Y%m%d')}.xlsx")
+
 @bp.route('/student/<int:user_id>', methods=['GET', 'POST'])
 @bp.route('/student/<int:user_id>/<int:enrollment_id>', methods=['GET', 'POST'])
 @login_required
@@ -85,6 +106,11 @@ def student_detail(user_id, enrollment_id=None):
         elif enrollment:  # Only process if enrollment exists
             if 'update_info' in request.form:
                 enrollment.status = request.form['status']
+                if enrollment.status == 'active':
+                    materialize_bookings(enrollment_ids=[enrollment.id])
+                else:
+                    # Jadwal mendatang dilepas: tidak muncul lagi di reminder/kalender guru
+                    release_enrollment_bookings(enrollment.id)
                 db.session.commit()
                 flash('Info siswa diperbarui.')
             elif 'add_schedule' in request.form:
@@ -96,6 +122,8 @@ def student_detail(user_id, enrollment_id=None):
                     teacher_id=int(request.form['teacher_id'])
                 )
                 db.session.add(new_sched)
+                db.session.flush()
+                materialize_bookings(enrollment_ids=[enrollment.id])
                 db.session.commit()
                 flash('Jadwal manual ditambahkan.')
             
@@ -111,25 +139,19 @@ def student_detail(user_id, enrollment_id=None):
                 if teacher_id: teacher_id = int(teacher_id)
                 if subject_id: subject_id = int(subject_id)
                 
-                # Check duplicate
-                existing = Booking.query.filter_by(
-                    enrollment_id=enrollment.id, 
-                    date=booking_date, 
-                    timeslot_id=timeslot_id
-                ).first()
+                # Duplicate (enrollment, tanggal, jam) ditolak oleh unique constraint
+                inserted = insert_or_ignore(Booking, {
+                    'enrollment_id': enrollment.id,
+                    'date': booking_date,
+                    'timeslot_id': timeslot_id,
+                    'teacher_id': teacher_id,
+                    'subject_id': subject_id,
+                    'status': 'booked'
+                }, ['enrollment_id', 'date', 'timeslot_id'])
                 
-                if existing:
+                if not inserted:
                     flash('Booking untuk tanggal dan jam tersebut sudah ada!', 'error')
                 else:
-                    new_booking = Booking(
-                        enrollment_id=enrollment.id,
-                        date=booking_date,
-                        timeslot_id=timeslot_id,
-                        teacher_id=teacher_id,
-                        subject_id=subject_id,
-                        status='booked'
-                    )
-                    db.session.add(new_booking)
                     db.session.commit()
                     flash('Override jadwal (Sesi Tambahan) berhasil dibuat.')
 
@@ -166,13 +188,18 @@ def student_detail(user_id, enrollment_id=None):
         progress_pct = int((completed_sessions_count / total_sessions) * 100) if total_sessions > 0 else 0
         
         # Session History
-        attendance_records = Attendance.query.filter(
+        # Booking (+ subject, timeslot) dan guru ikut di-load dalam query yang sama
+        attendance_records = Attendance.query.options(
+            joinedload(Attendance.booking).joinedload(Booking.subject),
+            joinedload(Attendance.booking).joinedload(Booking.timeslot),
+            joinedload(Attendance.teacher)
+        ).filter(
             Attendance.booking_id.in_(booking_ids)
         ).order_by(Attendance.date.desc()).limit(10).all() if booking_ids else []
         
         session_history = []
         for att in attendance_records:
-            booking = Booking.query.get(att.booking_id)
+            booking = att.booking
             if booking:
                 session_history.append({
                     'date': att.date,
@@ -201,51 +228,31 @@ def student_detail(user_id, enrollment_id=None):
     days = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
     
     # === PORTFOLIO DATA FOR TAB ===
-    from app.models import Syllabus, Portfolio
+    from app.models import Portfolio
     portfolio_data = []
     
     if enrollment:
+        syllabus_indexes = get_syllabus_indexes(ce.program_class_id for ce in enrollment.class_enrollments)
+        portfolios = Portfolio.load_map(ce.id for ce in enrollment.class_enrollments)
         for ce in enrollment.class_enrollments:
-            syllabus_items = Syllabus.query.filter_by(
-                program_class_id=ce.program_class_id
-            ).order_by(Syllabus.order).all()
+            syllabus_index = syllabus_indexes[ce.program_class_id]
             
             # Calculate completion based on sessions
             total = ce.program_class.total_sessions
             remaining = ce.sessions_remaining or 0
             sessions_completed = total - remaining
-            cumulative = 0
-            completed_topics = 0
             
-            syllabus_with_status = []
-            for s in syllabus_items:
-                cumulative += s.sessions
-                is_complete = sessions_completed >= cumulative
-                is_current = not is_complete and sessions_completed >= (cumulative - s.sessions)
-                
+            syllabus_with_status = syllabus_index.statuses(sessions_completed)
+            for item in syllabus_with_status:
                 # Get portfolio for this syllabus item
-                portfolio = Portfolio.query.filter_by(
-                    class_enrollment_id=ce.id,
-                    syllabus_id=s.id
-                ).first()
-                
-                syllabus_with_status.append({
-                    'syllabus': s,
-                    'is_complete': is_complete,
-                    'is_current': is_current,
-                    'portfolio': portfolio,
-                    'cumulative_end': cumulative
-                })
-                
-                if is_complete:
-                    completed_topics += 1
+                item['portfolio'] = portfolios.get((ce.id, item['syllabus'].id))
             
             portfolio_data.append({
                 'class_enrollment': ce,
                 'program_class': ce.program_class,
                 'syllabus_items': syllabus_with_status,
-                'completed_topics': completed_topics,
-                'total_topics': len(syllabus_items),
+                'completed_topics': syllabus_index.completed_topics(sessions_completed),
+                'total_topics': len(syllabus_index),
                 'sessions_completed': sessions_completed
             })
 
@@ -293,29 +300,8 @@ def student_detail(user_id, enrollment_id=None):
                 })
             
             # Get current topic from syllabus
-            current_topic = None
             next_topic = None
-            from app.models import Syllabus
-            syllabus_items = Syllabus.query.filter_by(
-                program_class_id=ce.program_class_id
-            ).order_by(Syllabus.order).all()
-            
-            cumulative = 0
-            for s in syllabus_items:
-                prev_cumulative = cumulative
-                cumulative += s.sessions
-                if completed < cumulative:
-                    # Calculate which session within this topic (1-indexed)
-                    session_in_topic = completed - prev_cumulative + 1
-                    if s.sessions > 1:
-                        current_topic = f"{s.topic_name} - {session_in_topic}"
-                    else:
-                        current_topic = s.topic_name
-                    break
-            else:
-                # All topics completed
-                if syllabus_items:
-                    current_topic = syllabus_items[-1].topic_name + " (Selesai)"
+            current_topic = syllabus_indexes[ce.program_class_id].current_topic(completed)
             
             class_progress.append({
                 'class_enrollment_id': ce.id,
@@ -359,6 +345,9 @@ def student_detail(user_id, enrollment_id=None):
 def delete_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     uid = booking.enrollment.student_id
+    if booking.attendance:
+        # Absensi tetap disimpan (booking_id jadi NULL), tapi sesinya keluar dari rekap
+        forget_teacher_sessions([(booking.attendance.teacher_id, booking.attendance.date)])
     db.session.delete(booking)
     db.session.commit()
     flash('Booking manual dihapus.')
@@ -370,9 +359,10 @@ def delete_booking(booking_id):
 def delete_schedule(sched_id):
     sched = StudentSchedule.query.get_or_404(sched_id)
     uid = sched.enrollment.student_id
+    released = release_schedule_bookings(sched)
     db.session.delete(sched)
     db.session.commit()
-    flash('Jadwal dihapus.')
+    flash(f'Jadwal dihapus ({released} booking mendatang dibatalkan).' if released else 'Jadwal dihapus.')
     return redirect(url_for('admin.student_detail', user_id=uid))
 
 @bp.route('/master-schedule')
@@ -383,30 +373,28 @@ def master_schedule():
     days = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
     timeslots = TimeSlot.query.all()
     
-    # Initialize aggregated stats
+    # 'detail' = kartu siswa per slot, 'summary' = hanya jumlah (tanpa load data siswa)
+    view = request.args.get('view', 'detail')
+    if view not in ('detail', 'summary'):
+        view = 'detail'
+    
+    # Aggregated stats (pure SQL GROUP BY day/slot/teacher)
     total_students = db.session.query(User).filter(User.role == 'student').count()
-    total_schedules = 0
-    day_totals = {i: 0 for i in range(7)}
-    
-    schedule_map = {i: {slot.id: [] for slot in timeslots} for i in range(7)}
-    
-    # Query all schedules is heavier, better filter per slot via loop or join
-    # Simple loop approach:
-    for i in range(7):
-        for slot in timeslots:
-            schedules = StudentSchedule.query.filter_by(day_of_week=i, timeslot_id=slot.id).all()
-            schedule_map[i][slot.id] = schedules
-            count = len(schedules)
-            total_schedules += count
-            day_totals[i] += count
+    occupancy = load_schedule_occupancy(timeslots)
+    
+    # All schedules in one eager-loaded query, bucketed per day/slot
+    schedule_map = load_schedule_grid(timeslots) if view == 'detail' else None
             
     return render_template('admin/master_schedule.html', 
                            days=days, 
                            timeslots=timeslots, 
                            schedule_map=schedule_map,
+                           view=view,
+                           slot_counts=occupancy['slot_counts'],
+                           slot_teachers=occupancy['slot_teachers'],
                            total_students=total_students,
-                           total_schedules=total_schedules,
-                           day_totals=day_totals)
+                           total_schedules=occupancy['total_schedules'],
+                           day_totals=occupancy['day_totals'])
 
 # --- PROGRAM ---
 @bp.route('/programs', methods=['GET', 'POST'])
@@ -508,6 +496,7 @@ def delete_class(class_id):
     
     db.session.delete(cls)
     db.session.commit()
+    invalidate_syllabus_index(class_id)
     flash(f'Kelas "{class_name}" dihapus.')
     return redirect(url_for('admin.program_edit', prog_id=program_id))
 
@@ -767,6 +756,7 @@ def delete_teacher(user_id):
         return redirect(url_for('admin.teacher_list'))
         
     try:
+        delete_teacher_rollup(teacher.id)
         db.session.delete(teacher)
         db.session.commit()
         flash('Guru dihapus.')
@@ -792,25 +782,8 @@ def teacher_recap():
     if selected_teacher_id:
         selected_teacher = User.query.get(selected_teacher_id)
         if selected_teacher:
-            # Get all attendance records where this teacher conducted the session
-            recap_data = []
-            for month in range(1, 13):
-                # Count unique bookings (sessions) for this teacher in this month
-                # A session is counted once regardless of how many students attended
-                from sqlalchemy import extract, func
-                
-                session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-                    Attendance.teacher_id == selected_teacher_id,
-                    extract('year', Attendance.date) == selected_year,
-                    extract('month', Attendance.date) == month
-                ).scalar() or 0
-                
-                recap_data.append({
-                    'month': month,
-                    'month_name': ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-                                  'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember'][month-1],
-                    'sessions': session_count
-                })
+            # Session counts per month (one grouped query)
+            recap_data = teacher_recap_rows(selected_year, selected_teacher_id)
     
     # Available years for filter
     years = list(range(2024, date.today().year + 2))
@@ -827,182 +800,21 @@ def teacher_recap():
 @admin_required
 def export_recap_excel():
     """Export teacher recap to Excel"""
-    from io import BytesIO
-    from flask import send_file
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    
-    teacher_id = request.args.get('teacher_id', type=int)
-    year = request.args.get('year', type=int, default=date.today().year)
-    
-    if not teacher_id:
-        flash('Pilih pengajar terlebih dahulu.')
-        return redirect(url_for('admin.teacher_recap'))
-    
-    teacher = User.query.get(teacher_id)
-    if not teacher:
-        flash('Pengajar tidak ditemukan.')
-        return redirect(url_for('admin.teacher_recap'))
-    
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Rekap {year}"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="D32F2F", end_color="D32F2F", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    # Title
-    ws.merge_cells('A1:C1')
-    ws['A1'] = f"Rekap Sesi Pengajar: {teacher.name}"
-    ws['A1'].font = Font(bold=True, size=14)
-    
-    ws.merge_cells('A2:C2')
-    ws['A2'] = f"Tahun: {year}"
-    ws['A2'].font = Font(size=12)
-    
-    # Headers
-    headers = ['Bulan', 'Jumlah Sesi', 'Keterangan']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=4, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    
-    # Data
-    months = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-              'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
-    
-    total_sessions = 0
-    from sqlalchemy import extract, func
-    
-    for row, (month_num, month_name) in enumerate(enumerate(months, 1), 5):
-        session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-            Attendance.teacher_id == teacher_id,
-            extract('year', Attendance.date) == year,
-            extract('month', Attendance.date) == month_num
-        ).scalar() or 0
-        
-        total_sessions += session_count
-        
-        ws.cell(row=row, column=1, value=month_name).border = thin_border
-        ws.cell(row=row, column=2, value=session_count).border = thin_border
-        ws.cell(row=row, column=2).alignment = Alignment(horizontal='center')
-        ws.cell(row=row, column=3, value='-').border = thin_border
-    
-    # Total row
-    total_row = 17
-    ws.cell(row=total_row, column=1, value='TOTAL').font = Font(bold=True)
-    ws.cell(row=total_row, column=1).border = thin_border
-    ws.cell(row=total_row, column=2, value=total_sessions).font = Font(bold=True)
-    ws.cell(row=total_row, column=2).border = thin_border
-    ws.cell(row=total_row, column=2).alignment = Alignment(horizontal='center')
-    ws.cell(row=total_row, column=3, value='').border = thin_border
-    
-    # Column widths
-    ws.column_dimensions['A'].width = 15
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 20
-    
-    # Save to BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    filename = f"rekap_{teacher.name.replace(' ', '_')}_{year}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return _send_report('teacher_recap_excel')
 
 @bp.route('/teacher-recap/export-pdf')
 @login_required
 @admin_required
 def export_recap_pdf():
     """Export teacher recap to PDF"""
-    from io import BytesIO
-    from flask import send_file
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.units import inch
-    
-    teacher_id = request.args.get('teacher_id', type=int)
-    year = request.args.get('year', type=int, default=date.today().year)
-    
-    if not teacher_id:
-        flash('Pilih pengajar terlebih dahulu.')
-        return redirect(url_for('admin.teacher_recap'))
-    
-    teacher = User.query.get(teacher_id)
-    if not teacher:
-        flash('Pengajar tidak ditemukan.')
-        return redirect(url_for('admin.teacher_recap'))
-    
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Title
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=20)
-    elements.append(Paragraph(f"Rekap Sesi Pengajar", title_style))
-    elements.append(Paragraph(f"<b>Nama:</b> {teacher.name}", styles['Normal']))
-    elements.append(Paragraph(f"<b>Tahun:</b> {year}", styles['Normal']))
-    elements.append(Spacer(1, 20))
-    
-    # Table data
-    data = [['Bulan', 'Jumlah Sesi']]
-    months = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-              'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
-    
-    total_sessions = 0
-    from sqlalchemy import extract, func
-    
-    for month_num, month_name in enumerate(months, 1):
-        session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-            Attendance.teacher_id == teacher_id,
-            extract('year', Attendance.date) == year,
-            extract('month', Attendance.date) == month_num
-        ).scalar() or 0
-        
-        total_sessions += session_count
-        data.append([month_name, str(session_count)])
-    
-    data.append(['TOTAL', str(total_sessions)])
-    
-    # Create table
-    table = Table(data, colWidths=[3*inch, 2*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D32F2F')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#FFEBEE')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    
-    elements.append(table)
-    
-    # Build PDF
-    doc.build(elements)
-    buffer.seek(0)
-    
-    filename = f"rekap_{teacher.name.replace(' ', '_')}_{year}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return _send_report('teacher_recap_pdf')
+
+@bp.route('/attendance/export-excel')
+@login_required
+@admin_required
+def export_attendance_excel():
+    """Export all attendance in a date range (inclusive) to Excel"""
+    return _send_report('attendance_excel')
 
 # --- EXPORT ALL TEACHERS ---
 @bp.route('/teacher-recap/export-all-monthly-excel')
@@ -1010,301 +822,90 @@ def export_recap_pdf():
 @admin_required
 def export_all_monthly_excel():
     """Export all teachers monthly recap to Excel"""
-    from io import BytesIO
-    from flask import send_file
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    from sqlalchemy import extract, func
-    
-    year = request.args.get('year', type=int, default=date.today().year)
-    month = request.args.get('month', type=int, default=date.today().month)
-    
-    teachers = User.query.filter_by(role='teacher').all()
-    months = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-              'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
-    
-    # Create workbook
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Rekap {months[month-1]} {year}"
-    
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="D32F2F", end_color="D32F2F", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'), right=Side(style='thin'),
-        top=Side(style='thin'), bottom=Side(style='thin')
-    )
-    
-    # Title
-    ws.merge_cells('A1:C1')
-    ws['A1'] = f"Rekap Sesi Semua Pengajar - {months[month-1]} {year}"
-    ws['A1'].font = Font(bold=True, size=14)
-    
-    # Headers
-    headers = ['No', 'Nama Pengajar', 'Jumlah Sesi']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    
-    # Data
-    total_all = 0
-    for idx, teacher in enumerate(teachers, 1):
-        session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-            Attendance.teacher_id == teacher.id,
-            extract('year', Attendance.date) == year,
-            extract('month', Attendance.date) == month
-        ).scalar() or 0
-        
-        total_all += session_count
-        row = idx + 3
-        ws.cell(row=row, column=1, value=idx).border = thin_border
-        ws.cell(row=row, column=1).alignment = Alignment(horizontal='center')
-        ws.cell(row=row, column=2, value=teacher.name).border = thin_border
-        ws.cell(row=row, column=3, value=session_count).border = thin_border
-        ws.cell(row=row, column=3).alignment = Alignment(horizontal='center')
-    
-    # Total row
-    total_row = len(teachers) + 4
-    ws.cell(row=total_row, column=1, value='').border = thin_border
-    ws.cell(row=total_row, column=2, value='TOTAL').font = Font(bold=True)
-    ws.cell(row=total_row, column=2).border = thin_border
-    ws.cell(row=total_row, column=3, value=total_all).font = Font(bold=True)
-    ws.cell(row=total_row, column=3).border = thin_border
-    ws.cell(row=total_row, column=3).alignment = Alignment(horizontal='center')
-    
-    # Column widths
-    ws.column_dimensions['A'].width = 8
-    ws.column_dimensions['B'].width = 30
-    ws.column_dimensions['C'].width = 15
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    filename = f"rekap_semua_pengajar_{months[month-1]}_{year}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return _send_report('all_monthly_excel')
 
 @bp.route('/teacher-recap/export-all-yearly-excel')
 @login_required
 @admin_required
 def export_all_yearly_excel():
     """Export all teachers yearly recap to Excel"""
-    from io import BytesIO
-    from flask import send_file
-    import openpyxl
-    from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-    from sqlalchemy import extract, func
-    
-    year = request.args.get('year', type=int, default=date.today().year)
-    teachers = User.query.filter_by(role='teacher').all()
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'Mei', 'Jun', 'Jul', 'Ags', 'Sep', 'Okt', 'Nov', 'Des']
-    
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = f"Rekap Tahunan {year}"
-    
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="D32F2F", end_color="D32F2F", fill_type="solid")
-    thin_border = Border(
-        left=Side(style='thin'), right=Side(style='thin'),
-        top=Side(style='thin'), bottom=Side(style='thin')
-    )
-    
-    # Title
-    ws.merge_cells('A1:O1')
-    ws['A1'] = f"Rekap Sesi Semua Pengajar - Tahun {year}"
-    ws['A1'].font = Font(bold=True, size=14)
-    
-    # Headers: No, Nama, Jan, Feb, ..., Des, Total
-    headers = ['No', 'Nama Pengajar'] + months + ['TOTAL']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=3, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = Alignment(horizontal='center')
-        cell.border = thin_border
-    
-    # Data rows
-    grand_total = 0
-    for idx, teacher in enumerate(teachers, 1):
-        row = idx + 3
-        ws.cell(row=row, column=1, value=idx).border = thin_border
-        ws.cell(row=row, column=1).alignment = Alignment(horizontal='center')
-        ws.cell(row=row, column=2, value=teacher.name).border = thin_border
-        
-        teacher_total = 0
-        for m in range(1, 13):
-            session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-                Attendance.teacher_id == teacher.id,
-                extract('year', Attendance.date) == year,
-                extract('month', Attendance.date) == m
-            ).scalar() or 0
-            
-            teacher_total += session_count
-            cell = ws.cell(row=row, column=m+2, value=session_count)
-            cell.border = thin_border
-            cell.alignment = Alignment(horizontal='center')
-        
-        grand_total += teacher_total
-        ws.cell(row=row, column=15, value=teacher_total).border = thin_border
-        ws.cell(row=row, column=15).font = Font(bold=True)
-        ws.cell(row=row, column=15).alignment = Alignment(horizontal='center')
-    
-    # Column widths
-    ws.column_dimensions['A'].width = 5
-    ws.column_dimensions['B'].width = 25
-    for col in range(3, 16):
-        ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 7
-    
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
-    filename = f"rekap_semua_pengajar_tahunan_{year}.xlsx"
-    return send_file(output, as_attachment=True, download_name=filename,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    return _send_report('all_yearly_excel')
 
 @bp.route('/teacher-recap/export-all-monthly-pdf')
 @login_required
 @admin_required
 def export_all_monthly_pdf():
     """Export all teachers monthly recap to PDF"""
-    from io import BytesIO
-    from flask import send_file
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.units import inch
-    from sqlalchemy import extract, func
-    
-    year = request.args.get('year', type=int, default=date.today().year)
-    month = request.args.get('month', type=int, default=date.today().month)
-    
-    teachers = User.query.filter_by(role='teacher').all()
-    months = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
-              'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=20)
-    elements.append(Paragraph(f"Rekap Sesi Semua Pengajar", title_style))
-    elements.append(Paragraph(f"<b>Periode:</b> {months[month-1]} {year}", styles['Normal']))
-    elements.append(Spacer(1, 20))
-    
-    # Table data
-    data = [['No', 'Nama Pengajar', 'Jumlah Sesi']]
-    total_all = 0
-    
-    for idx, teacher in enumerate(teachers, 1):
-        session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-            Attendance.teacher_id == teacher.id,
-            extract('year', Attendance.date) == year,
-            extract('month', Attendance.date) == month
-        ).scalar() or 0
-        
-        total_all += session_count
-        data.append([str(idx), teacher.name, str(session_count)])
-    
-    data.append(['', 'TOTAL', str(total_all)])
-    
-    table = Table(data, colWidths=[0.5*inch, 3*inch, 1.5*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D32F2F')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#FFEBEE')),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    
-    filename = f"rekap_semua_pengajar_{months[month-1]}_{year}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return _send_report('all_monthly_pdf')
 
 @bp.route('/teacher-recap/export-all-yearly-pdf')
 @login_required
 @admin_required
 def export_all_yearly_pdf():
     """Export all teachers yearly recap to PDF"""
-    from io import BytesIO
-    from flask import send_file
-    from reportlab.lib.pagesizes import A4, landscape
-    from reportlab.lib import colors
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.units import inch
-    from sqlalchemy import extract, func
-    
-    year = request.args.get('year', type=int, default=date.today().year)
-    teachers = User.query.filter_by(role='teacher').all()
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'Mei', 'Jun', 'Jul', 'Ags', 'Sep', 'Okt', 'Nov', 'Des']
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=14, spaceAfter=15)
-    elements.append(Paragraph(f"Rekap Sesi Semua Pengajar - Tahun {year}", title_style))
-    elements.append(Spacer(1, 10))
-    
-    # Table data
-    headers = ['No', 'Nama'] + months + ['Total']
-    data = [headers]
-    
-    for idx, teacher in enumerate(teachers, 1):
-        row = [str(idx), teacher.name]
-        teacher_total = 0
-        for m in range(1, 13):
-            session_count = db.session.query(func.count(func.distinct(Attendance.booking_id))).filter(
-                Attendance.teacher_id == teacher.id,
-                extract('year', Attendance.date) == year,
-                extract('month', Attendance.date) == m
-            ).scalar() or 0
-            teacher_total += session_count
-            row.append(str(session_count))
-        row.append(str(teacher_total))
-        data.append(row)
-    
-    # Column widths for landscape
-    col_widths = [0.4*inch, 1.8*inch] + [0.5*inch]*12 + [0.6*inch]
-    
-    table = Table(data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D32F2F')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('ALIGN', (1, 1), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-    ]))
-    
-    elements.append(table)
-    doc.build(elements)
-    buffer.seek(0)
-    
-    filename = f"rekap_semua_pengajar_tahunan_{year}.pdf"
-    return send_file(buffer, as_attachment=True, download_name=filename, mimetype='application/pdf')
+    return _send_report('all_yearly_pdf')
+
+def _send_report(report):
+    """Build a report inside the request (direct download links)"""
+    try:
+        params = parse_report_params(report, request.args)
+    except ReportParamError as e:
+        flash(str(e))
+        return redirect(url_for('admin.teacher_recap'))
+    
+    output = tempfile.TemporaryFile()  # removed automatically when closed
+    filename, mimetype = build_report(report, params, output)
+    output.seek(0)
+    return send_file(output, as_attachment=True, download_name=filename, mimetype=mimetype)
+
+# --- BACKGROUND REPORTS ---
+def _report_job_json(job):
+    data = {
+        'id': job.id,
+        'report': job.report,
+        'status': job.status,
+        'progress': job.progress or 0,
+        'error': job.error,
+        'status_url': url_for('admin.report_job_status', job_id=job.id),
+    }
+    if is_downloadable(job):
+        data['filename'] = job.filename
+        data['download_url'] = url_for('admin.report_job_download', job_id=job.id)
+    return data
+
+@bp.route('/reports', methods=['POST'])
+@login_required
+@admin_required
+@csrf_protect
+def report_job_create():
+    """Queue a report export; identical requests reuse the running/finished job"""
+    report = request.form.get('report', '')
+    try:
+        params = parse_report_params(report, request.form)
+    except ReportParamError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    job = submit_report_job(report, params, user_id=current_user.id)
+    return jsonify(_report_job_json(job)), 202
+
+@bp.route('/reports/<int:job_id>')
+@login_required
+@admin_required
+def report_job_status(job_id):
+    """Polling endpoint for a report job"""
+    job = ReportJob.query.get_or_404(job_id)
+    return jsonify(_report_job_json(job))
+
+@bp.route('/reports/<int:job_id>/download')
+@login_required
+@admin_required
+def report_job_download(job_id):
+    """Download a finished report artifact"""
+    job = ReportJob.query.get_or_404(job_id)
+    if not is_downloadable(job):
+        flash('File laporan sudah kadaluarsa atau belum selesai. Silakan export ulang.', 'warning')
+        return redirect(url_for('admin.teacher_recap'))
+    return send_file(job.file_path, as_attachment=True, download_name=job.filename, mimetype=job.mimetype)
 
 # --- DATA TOOLS ---
 @bp.route('/tools')
@@ -1490,15 +1091,20 @@ def approve_attendance_request(req_id):
     
     booking = att_req.booking
     
-    # Create attendance record
-    attendance = Attendance(
-        booking_id=booking.id,
-        teacher_id=att_req.teacher_id,
-        date=booking.date,
-        status=att_req.status_request,
-        notes=att_req.notes
-    )
-    db.session.add(attendance)
+    # Create attendance record (unique per booking)
+    inserted = insert_or_ignore(Attendance, {
+        'booking_id': booking.id,
+        'teacher_id': att_req.teacher_id,
+        'date': booking.date,
+        'status': att_req.status_request,
+        'notes': att_req.notes
+    }, ['booking_id'])
+    
+    if not inserted:
+        flash('Absensi untuk sesi ini sudah tercatat. Silakan tolak request ini.', 'warning')
+        return redirect(url_for('admin.attendance_requests'))
+    
+    record_teacher_sessions([(att_req.teacher_id, booking.date)])
     
     # Update booking status
     booking.status = 'completed'
@@ -1519,10 +1125,11 @@ def approve_attendance_request(req_id):
     
     # Send WA notification to teacher
     try:
-        from app.utils.whatsapp import send_wa_message
+        from app.services.notifications import format_phone_for_wa
+        from app.services.outbound_messages import enqueue_wa_message
         if att_req.teacher and att_req.teacher.phone_number:
             message = f"✅ Request absen Anda untuk sesi tanggal {booking.date.strftime('%d %B %Y')} ({booking.timeslot.name}) telah di-APPROVE oleh admin."
-            send_wa_message(att_req.teacher.phone_number, message)
+            enqueue_wa_message(format_phone_for_wa(att_req.teacher.phone_number), message, source='attendance_request')
     except Exception as e:
         pass  # Don't fail if WA fails
     
@@ -1553,11 +1160,12 @@ def reject_attendance_request(req_id):
     
     # Send WA notification to teacher
     try:
-        from app.utils.whatsapp import send_wa_message
+        from app.services.notifications import format_phone_for_wa
+        from app.services.outbound_messages import enqueue_wa_message
         booking = att_req.booking
         if att_req.teacher and att_req.teacher.phone_number:
             message = f"❌ Request absen Anda untuk sesi tanggal {booking.date.strftime('%d %B %Y')} ({booking.timeslot.name}) telah DITOLAK.\n\nAlasan: {rejection_reason}"
-            send_wa_message(att_req.teacher.phone_number, message)
+            enqueue_wa_message(format_phone_for_wa(att_req.teacher.phone_number), message, source='attendance_request')
     except Exception as e:
         pass  # Don't fail if WA fails
     
@@ -1577,6 +1185,8 @@ def approve_session_requests():
         return redirect(url_for('admin.attendance_requests'))
     
     approved_count = 0
+    conflict_count = 0
+    approved_sessions = []
     teacher = None
     timeslot_name = ''
     booking_date = None
@@ -1587,20 +1197,29 @@ def approve_session_requests():
             continue
         
         booking = att_req.booking
+        
+        # Create attendance record (skip if booking already has attendance)
+        inserted = insert_or_ignore(Attendance, {
+            'booking_id': booking.id,
+            'teacher_id': att_req.teacher_id,
+            'date': booking.date,
+            'status': att_req.status_request,
+            'notes': att_req.notes
+        }, ['booking_id'])
+        if not inserted:
+            # Absensi sudah tercatat (oleh guru/admin lain): tolak agar tidak menggantung di pending
+            att_req.approval_status = 'rejected'
+            att_req.approved_by = current_user.id
+            att_req.approved_at = datetime.now()
+            att_req.rejection_reason = 'Absensi untuk sesi ini sudah tercatat.'
+            conflict_count += 1
+            continue
+        approved_sessions.append((att_req.teacher_id, booking.date))
+        
         teacher = att_req.teacher
         timeslot_name = booking.timeslot.name if booking.timeslot else ''
         booking_date = booking.date
         
-        # Create attendance record
-        attendance = Attendance(
-            booking_id=booking.id,
-            teacher_id=att_req.teacher_id,
-            date=booking.date,
-            status=att_req.status_request,
-            notes=att_req.notes
-        )
-        db.session.add(attendance)
-        
         # Update booking status
         booking.status = 'completed'
         
@@ -1619,18 +1238,22 @@ def approve_session_requests():
         
         approved_count += 1
     
+    record_teacher_sessions(approved_sessions)
     db.session.commit()
     
     # Send WA notification
     if teacher and teacher.phone_number and booking_date:
         try:
-            from app.utils.whatsapp import send_wa_message
+            from app.services.notifications import format_phone_for_wa
+            from app.services.outbound_messages import enqueue_wa_message
             message = f"✅ Request absen Anda untuk sesi tanggal {booking_date.strftime('%d %B %Y')} ({timeslot_name}) telah DISETUJUI untuk {approved_count} siswa."
-            send_wa_message(teacher.phone_number, message)
+            enqueue_wa_message(format_phone_for_wa(teacher.phone_number), message, source='attendance_request')
         except:
             pass
     
     flash(f'✅ {approved_count} request berhasil di-approve.', 'success')
+    if conflict_count:
+        flash(f'{conflict_count} request ditolak otomatis karena absensinya sudah tercatat.', 'warning')
     return redirect(url_for('admin.attendance_requests'))
 
 
@@ -1677,9 +1300,10 @@ def reject_session_requests():
     # Send WA notification
     if teacher and teacher.phone_number and booking_date:
         try:
-            from app.utils.whatsapp import send_wa_message
+            from app.services.notifications import format_phone_for_wa
+            from app.services.outbound_messages import enqueue_wa_message
             message = f"❌ Request absen Anda untuk sesi tanggal {booking_date.strftime('%d %B %Y')} ({timeslot_name}) telah DITOLAK untuk {rejected_count} siswa.\n\nAlasan: {rejection_reason}"
-            send_wa_message(teacher.phone_number, message)
+            enqueue_wa_message(format_phone_for_wa(teacher.phone_number), message, source='attendance_request')
         except:
             pass
     
@@ -1741,26 +1365,20 @@ def session_override_add():
             return render_template('admin/session_override_form.html', 
                                    teachers=teachers, timeslots=timeslots)
         
-        # Check if override already exists for same date + timeslot + original teacher
-        existing = TeacherSessionOverride.query.filter_by(
-            date=override_date,
-            timeslot_id=timeslot_id,
-            original_teacher_id=original_teacher_id
-        ).first()
+        # Override untuk date + timeslot + original teacher yang sama ditolak oleh unique constraint
+        inserted = insert_or_ignore(TeacherSessionOverride, {
+            'date': override_date,
+            'timeslot_id': timeslot_id,
+            'original_teacher_id': original_teacher_id,
+            'substitute_teacher_id': substitute_teacher_id,
+            'created_by': current_user.id
+        }, ['original_teacher_id', 'date', 'timeslot_id'])
         
-        if existing:
+        if not inserted:
             flash('Override untuk sesi ini sudah ada!', 'danger')
             return render_template('admin/session_override_form.html', 
                                    teachers=teachers, timeslots=timeslots)
         
-        override = TeacherSessionOverride(
-            date=override_date,
-            timeslot_id=timeslot_id,
-            original_teacher_id=original_teacher_id,
-            substitute_teacher_id=substitute_teacher_id,
-            created_by=current_user.id
-        )
-        db.session.add(override)
         db.session.commit()
         
         flash('Penggantian pengajar berhasil ditambahkan!', 'success')
@@ -1783,6 +1401,40 @@ def session_override_delete(override_id):
     return redirect(url_for('admin.session_overrides'))
 
 
+# --- SCHEDULER RUN HISTORY ---
+@bp.route('/scheduler-runs')
+@login_required
+@admin_required
+def scheduler_runs():
+    """Scheduler job runs: per-job duration summary and recent runs"""
+    job_id = request.args.get('job_id') or None
+    days = request.args.get('days', 7, type=int)
+    since = datetime.utcnow() - timedelta(days=days)
+    
+    summary = db.session.query(
+        SchedulerRun.job_id,
+        db.func.count(SchedulerRun.id).label('runs'),
+        db.func.avg(SchedulerRun.duration_ms).label('avg_ms'),
+        db.func.max(SchedulerRun.duration_ms).label('max_ms'),
+        db.func.sum(db.case((SchedulerRun.status == 'failed', 1), else_=0)).label('failures'),
+        db.func.sum(SchedulerRun.messages_sent).label('messages_sent'),
+        db.func.max(SchedulerRun.started_at).label('last_run'),
+    ).filter(
+        SchedulerRun.started_at >= since
+    ).group_by(SchedulerRun.job_id).order_by(db.func.max(SchedulerRun.duration_ms).desc()).all()
+    
+    query = SchedulerRun.query.filter(SchedulerRun.started_at >= since)
+    if job_id:
+        query = query.filter(SchedulerRun.job_id == job_id)
+    runs = query.order_by(SchedulerRun.started_at.desc()).limit(200).all()
+    
+    return render_template('admin/scheduler_runs.html',
+                           summary=summary,
+                           runs=runs,
+                           selected_job_id=job_id,
+                           days=days)
+
+
 # --- RESCHEDULE REQUESTS MANAGEMENT ---
 
 @bp.route('/reschedule-requests')
@@ -1822,44 +1474,31 @@ def approve_reschedule(req_id):
         return redirect(url_for('admin.reschedule_requests'))
     
     # Create booking for the new date
-    new_booking = Booking(
-        enrollment_id=req.student_schedule.enrollment_id if req.student_schedule else req.class_enrollment.enrollment_id,
-        class_enrollment_id=req.class_enrollment_id,
-        date=req.new_date,
-        timeslot_id=req.new_timeslot_id,
-        teacher_id=req.new_teacher_id,
-        status='booked'
-    )
-    db.session.add(new_booking)
-    db.session.flush()  # Get the new booking ID
-    
-    # Also create a cancelled booking for the original date to mark it as rescheduled
-    # This prevents the original session from appearing
+    new_booking_ids = insert_or_ignore(Booking, {
+        'enrollment_id': req.student_schedule.enrollment_id if req.student_schedule else req.class_enrollment.enrollment_id,
+        'class_enrollment_id': req.class_enrollment_id,
+        'date': req.new_date,
+        'timeslot_id': req.new_timeslot_id,
+        'teacher_id': req.new_teacher_id,
+        'status': 'booked'
+    }, ['enrollment_id', 'date', 'timeslot_id'])
+    
+    if not new_booking_ids:
+        db.session.rollback()
+        flash('Siswa sudah memiliki booking pada tanggal dan sesi baru tersebut.', 'error')
+        return redirect(url_for('admin.reschedule_requests'))
+    
+    # Mark the original date as rescheduled so the original session no longer appears
+    # (also when it was already materialized as a 'booked' row)
     if req.student_schedule:
-        # Check if there's already a booking for original date
-        existing_original = Booking.query.filter_by(
-            enrollment_id=req.student_schedule.enrollment_id,
-            date=req.original_date,
-            timeslot_id=req.original_timeslot_id
-        ).first()
-        
-        if not existing_original:
-            # Create a booking to mark original date as rescheduled
-            cancelled_booking = Booking(
-                enrollment_id=req.student_schedule.enrollment_id,
-                class_enrollment_id=req.class_enrollment_id,
-                date=req.original_date,
-                timeslot_id=req.original_timeslot_id,
-                teacher_id=req.original_teacher_id,
-                status='rescheduled'
-            )
-            db.session.add(cancelled_booking)
+        mark_rescheduled(req.student_schedule.enrollment_id, req.class_enrollment_id,
+                         req.original_date, req.original_timeslot_id, req.original_teacher_id)
     
     # Update request status
     req.status = 'approved'
     req.approved_by = current_user.id
     req.approved_at = datetime.now()
-    req.new_booking_id = new_booking.id
+    req.new_booking_id = new_booking_ids[0]
     
     db.session.commit()
     
@@ -1921,34 +1560,23 @@ def admin_create_reschedule(student_id):
         schedule = StudentSchedule.query.get_or_404(schedule_id)
         
         # Create new booking directly (auto-approved)
-        new_booking = Booking(
-            enrollment_id=schedule.enrollment_id,
-            class_enrollment_id=schedule.class_enrollment_id,
-            date=new_date,
-            timeslot_id=new_timeslot_id,
-            teacher_id=new_teacher_id,
-            status='booked'
-        )
-        db.session.add(new_booking)
-        db.session.flush()
+        new_booking_ids = insert_or_ignore(Booking, {
+            'enrollment_id': schedule.enrollment_id,
+            'class_enrollment_id': schedule.class_enrollment_id,
+            'date': new_date,
+            'timeslot_id': new_timeslot_id,
+            'teacher_id': new_teacher_id,
+            'status': 'booked'
+        }, ['enrollment_id', 'date', 'timeslot_id'])
         
-        # Mark original date as rescheduled
-        existing_original = Booking.query.filter_by(
-            enrollment_id=schedule.enrollment_id,
-            date=original_date,
-            timeslot_id=schedule.timeslot_id
-        ).first()
+        if not new_booking_ids:
+            db.session.rollback()
+            flash('Siswa sudah memiliki booking pada tanggal dan sesi baru tersebut.', 'error')
+            return redirect(url_for('admin.admin_create_reschedule', student_id=student_id))
         
-        if not existing_original:
-            cancelled_booking = Booking(
-                enrollment_id=schedule.enrollment_id,
-                class_enrollment_id=schedule.class_enrollment_id,
-                date=original_date,
-                timeslot_id=schedule.timeslot_id,
-                teacher_id=schedule.teacher_id,
-                status='rescheduled'
-            )
-            db.session.add(cancelled_booking)
+        # Mark original date as rescheduled (turns a materialized 'booked' row into the marker)
+        mark_rescheduled(schedule.enrollment_id, schedule.class_enrollment_id,
+                         original_date, schedule.timeslot_id, schedule.teacher_id)
         
         # Create reschedule record for history
         reschedule = RescheduleRequest(
@@ -1966,7 +1594,7 @@ def admin_create_reschedule(student_id):
             status='approved',
             approved_by=current_user.id,
             approved_at=datetime.now(),
-            new_booking_id=new_booking.id
+            new_booking_id=new_booking_ids[0]
         )
         db.session.add(reschedule)
         db.session.commit()
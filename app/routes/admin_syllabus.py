@@ -6,6 +6,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app import db
 from app.models import ProgramClass, Syllabus
+from app.services.syllabus_index import invalidate_syllabus_index
 
 bp = Blueprint('admin_syllabus', __name__, url_prefix='/admin/syllabus')
 
@@ -100,6 +101,7 @@ def add(class_id):
     )
     db.session.add(syllabus)
     db.session.commit()
+    invalidate_syllabus_index(class_id)
     
     flash(f'Topik "{topic_name}" berhasil ditambahkan.', 'success')
     return redirect(url_for('admin_syllabus.manage', class_id=class_id))
@@ -129,6 +131,7 @@ def edit(class_id, syllabus_id):
     syllabus.topic_name = topic_name
     syllabus.sessions = sessions
     db.session.commit()
+    invalidate_syllabus_index(syllabus.program_class_id)
     
     flash(f'Topik "{topic_name}" berhasil diperbarui.', 'success')
     return redirect(url_for('admin_syllabus.manage', class_id=class_id))
@@ -141,9 +144,11 @@ def delete(class_id, syllabus_id):
     """Delete a syllabus item"""
     syllabus = Syllabus.query.get_or_404(syllabus_id)
     topic_name = syllabus.topic_name
+    program_class_id = syllabus.program_class_id
     
     db.session.delete(syllabus)
     db.session.commit()
+    invalidate_syllabus_index(program_class_id)
     
     flash(f'Topik "{topic_name}" berhasil dihapus.', 'success')
     return redirect(url_for('admin_syllabus.manage', class_id=class_id))
@@ -6,6 +6,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from app import db
 from app.models import Vendor, VoucherType, Voucher, VendorPayment, User
+from app.services.exports import export_vouchers
 from datetime import datetime, date
 import random
 
@@ -198,6 +199,18 @@ def voucher_list():
                           type_filter=voucher_type_filter)
 
 
+@bp.route('/vouchers/export-excel')
+@login_required
+@admin_required
+def voucher_export_excel():
+    """Export vouchers (same filters as the list) to Excel (streamed)"""
+    status_filter = request.args.get('status', '')
+    voucher_type_filter = request.args.get('type', type=int)
+    
+    export = export_vouchers(status=status_filter or None, voucher_type_id=voucher_type_filter)
+    return export.send(f"data_voucher_{date.today().strftime('%Y%m%d')}.xlsx")
+
+
 @bp.route('/vouchers/generate', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -5,6 +5,13 @@ from app import db
 from app.models import TimeSlot
 from app.models import Attendance, Enrollment, User, Booking, AttendanceRequest
 from app.security import csrf_protect
+from app.utils.db import insert_or_ignore
+from app.services.attendance import apply_class_enrollment_usage
+from app.services.recap import record_teacher_sessions
+from app.services.schedule_expansion import expand_schedules, weekday_dates
+from app.services.syllabus_index import get_syllabus_indexes
+from sqlalchemy.orm import joinedload
+from collections import Counter
 from datetime import date, datetime, timedelta
 
 bp = Blueprint('attendance', __name__, url_prefix='/attendance')
@@ -43,49 +50,47 @@ def submit_attendance():
     if current_user.role != 'teacher':
         abort(403)
     
-    # Validasi: Cek timeslot dari booking pertama dan pastikan dalam waktu yang tepat
-    booking_ids = request.form.getlist('booking_ids')
-    if booking_ids:
-        first_booking = Booking.query.get(booking_ids[0])
-        if first_booking and first_booking.timeslot:
-            session_status = get_session_status(first_booking.timeslot, first_booking.date)
-            if session_status == 'passed':
-                flash(f'⛔ Sesi {first_booking.timeslot.name} sudah lewat. Hubungi admin jika Anda lupa absen.', 'danger')
-                return redirect(url_for('attendance.view_form', timeslot_id=first_booking.timeslot_id))
-            elif session_status == 'not_yet':
-                flash(f'⏰ Belum waktunya absen! Sesi {first_booking.timeslot.name} dimulai pukul {first_booking.timeslot.start_time.strftime("%H:%M")}', 'warning')
-                return redirect(url_for('attendance.view_form', timeslot_id=first_booking.timeslot_id))
-
     # Data dari Form HTML Absensi
-    booking_ids = request.form.getlist('booking_ids')
-    program_name = request.form.get('program_name', 'Sesi Harian')
+    booking_ids = list(dict.fromkeys(int(b) for b in request.form.getlist('booking_ids') if b.isdigit()))
+    
+    # Prefetch semua booking sesi ini (1 query)
+    bookings = {}
+    if booking_ids:
+        bookings = {b.id: b for b in Booking.query.options(
+            joinedload(Booking.timeslot)
+        ).filter(Booking.id.in_(booking_ids)).all()}
+    
+    # Validasi: Cek timeslot dari booking pertama dan pastikan dalam waktu yang tepat
+    first_booking = bookings.get(booking_ids[0]) if booking_ids else None
+    if first_booking and first_booking.timeslot:
+        session_status = get_session_status(first_booking.timeslot, first_booking.date)
+        if session_status == 'passed':
+            flash(f'⛔ Sesi {first_booking.timeslot.name} sudah lewat. Hubungi admin jika Anda lupa absen.', 'danger')
+            return redirect(url_for('attendance.view_form', timeslot_id=first_booking.timeslot_id))
+        elif session_status == 'not_yet':
+            flash(f'⏰ Belum waktunya absen! Sesi {first_booking.timeslot.name} dimulai pukul {first_booking.timeslot.start_time.strftime("%H:%M")}', 'warning')
+            return redirect(url_for('attendance.view_form', timeslot_id=first_booking.timeslot_id))
+    
+    # Prefetch attendance yang sudah ada untuk booking tsb (1 query)
+    existing_attendance = set()
+    if bookings:
+        existing_attendance = {row[0] for row in db.session.query(Attendance.booking_id).filter(
+            Attendance.booking_id.in_(list(bookings))
+        )}
     
     hadir_count = 0
     izin_count = 0
     alpha_count = 0
-    list_nama_hadir = []
     skipped_count = 0
-
+    
+    new_attendance = []
+    status_by_booking = {}
     for b_id in booking_ids:
-        # Validasi 1: Cek booking exists
-        booking = Booking.query.get(b_id)
-        if not booking:
-            skipped_count += 1
-            continue
-        
-        # Validasi 2: Cek ownership - hanya booking milik teacher ini
-        if booking.teacher_id != current_user.id:
-            skipped_count += 1
-            continue
+        booking = bookings.get(b_id)
         
-        # Validasi 3: Cek status booking - hanya yang belum completed
-        if booking.status == 'completed':
-            skipped_count += 1
-            continue
-        
-        # Validasi 4: Cek duplicate attendance
-        existing_attendance = Attendance.query.filter_by(booking_id=booking.id).first()
-        if existing_attendance:
+        # Validasi 1: booking exists, 2: milik teacher ini, 3: belum completed, 4: belum ada absensi
+        if (not booking or booking.teacher_id != current_user.id
+                or booking.status == 'completed' or b_id in existing_attendance):
             skipped_count += 1
             continue
         
@@ -96,34 +101,46 @@ def submit_attendance():
         if status not in ['Hadir', 'Izin', 'Alpha']:
             status = 'Alpha'  # Default jika tidak valid
         
-        # 1. Simpan ke Database
-        attendance = Attendance(
-            booking_id=booking.id,
-            teacher_id=current_user.id,
-            date=date.today(),
-            status=status,
-            notes=notes
-        )
-        db.session.add(attendance)
-        
-        # 2. Update Sisa Sesi Siswa (Jika Hadir) - gunakan ClassEnrollment
+        status_by_booking[b_id] = status
+        new_attendance.append({
+            'booking_id': b_id,
+            'teacher_id': current_user.id,
+            'date': date.today(),
+            'status': status,
+            'notes': notes
+        })
+    
+    # 1. Simpan ke Database - satu INSERT untuk semua siswa
+    # (unique constraint booking_id menahan submit ganda yang berjalan bersamaan)
+    inserted = insert_or_ignore(Attendance, new_attendance, ['booking_id'], returning=Attendance.booking_id)
+    skipped_count += len(new_attendance) - len(inserted)
+    
+    # Rekap sesi pengajar bulanan (hanya yang benar-benar ter-insert)
+    inserted_ids = set(inserted)
+    record_teacher_sessions((row['teacher_id'], row['date']) for row in new_attendance
+                            if row['booking_id'] in inserted_ids)
+    
+    # 2. Update Sisa Sesi / Izin per ClassEnrollment - satu UPDATE untuk semua
+    sessions_used = Counter()
+    izin_used = Counter()
+    for b_id in inserted:
+        booking = bookings[b_id]
+        status = status_by_booking[b_id]
         if status == 'Hadir':
-            # Update via ClassEnrollment jika ada
-            if booking.class_enrollment:
-                booking.class_enrollment.sessions_remaining -= 1
+            if booking.class_enrollment_id:
+                sessions_used[booking.class_enrollment_id] += 1
             hadir_count += 1
-            list_nama_hadir.append(booking.enrollment.student.name)
         elif status == 'Izin':
-            # Track izin usage di ClassEnrollment
-            if booking.class_enrollment:
-                booking.class_enrollment.izin_used += 1
+            if booking.class_enrollment_id:
+                izin_used[booking.class_enrollment_id] += 1
             izin_count += 1
         else:
             alpha_count += 1
-            
+        
         # Tandai booking selesai
         booking.status = 'completed'
-
+    
+    apply_class_enrollment_usage(sessions_used, izin_used)
     db.session.commit()
 
     # Rekap WA akan dikirim otomatis oleh scheduler H+2 jam setelah sesi selesai
@@ -137,17 +154,34 @@ def view_form(timeslot_id):
         abort(403)
     
     from datetime import timedelta
-    from app.models import StudentSchedule, TeacherSessionOverride
+    from collections import defaultdict
+    from sqlalchemy import or_
+    from sqlalchemy.orm import joinedload
+    from app.models import ClassEnrollment, StudentSchedule, TeacherSessionOverride
     
     today = date.today()
     timeslot = TimeSlot.query.get_or_404(timeslot_id)
+    window_start, window_end = today + timedelta(days=1), today + timedelta(days=7)
+    days_name = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
+    
+    # --- PREFETCH: semua data sesi ini untuk hari ini + 7 hari ke depan, masing-masing sekali ---
+    # Overrides in the window where this teacher is substituted out or substituting
+    overrides = TeacherSessionOverride.query.options(
+        joinedload(TeacherSessionOverride.original_teacher)
+    ).filter(
+        TeacherSessionOverride.timeslot_id == timeslot_id,
+        TeacherSessionOverride.date >= today,
+        TeacherSessionOverride.date <= window_end,
+        or_(
+            TeacherSessionOverride.original_teacher_id == current_user.id,
+            TeacherSessionOverride.substitute_teacher_id == current_user.id
+        )
+    ).all()
+    override_dates_to_exclude = {o.date for o in overrides if o.original_teacher_id == current_user.id}
+    substitute_for = {o.date: o for o in overrides if o.substitute_teacher_id == current_user.id}
     
     # Check if current teacher is substituting for someone today
-    override = TeacherSessionOverride.query.filter_by(
-        date=today,
-        timeslot_id=timeslot_id,
-        substitute_teacher_id=current_user.id
-    ).first()
+    override = substitute_for.get(today)
     
     # Determine which teacher's bookings to show
     if override:
@@ -161,171 +195,80 @@ def view_form(timeslot_id):
         is_substitute = False
         original_teacher_name = None
     
-    # Ambil booking hari ini yang status 'booked' (siswa yang hadir) - default Hadir
-    bookings_hadir = Booking.query.filter_by(
-        date=today, 
-        timeslot_id=timeslot_id,
-        teacher_id=effective_teacher_id,
-        status='booked'
-    ).all()
+    # Bookings (not completed) of this teacher and of the substituted teachers, by (teacher, date)
+    teacher_ids = {current_user.id, effective_teacher_id} | {o.original_teacher_id for o in substitute_for.values()}
+    bookings_by_teacher_date = defaultdict(list)
+    for b in Booking.query.options(
+        joinedload(Booking.enrollment).joinedload(Enrollment.student),
+        joinedload(Booking.enrollment).joinedload(Enrollment.program),
+        joinedload(Booking.class_enrollment).joinedload(ClassEnrollment.program_class),
+        joinedload(Booking.subject),
+        joinedload(Booking.timeslot),
+    ).filter(
+        Booking.timeslot_id == timeslot_id,
+        Booking.teacher_id.in_(teacher_ids),
+        Booking.date >= today,
+        Booking.date <= window_end,
+        Booking.status != 'completed'
+    ).order_by(Booking.id).all():
+        bookings_by_teacher_date[(b.teacher_id, b.date)].append(b)
+    
+    # Jadwal mingguan di sesi ini: booking yang cocok ditandai 'regular' (R), sisanya booking manual (B)
+    regular_schedules = db.session.query(
+        StudentSchedule.enrollment_id, StudentSchedule.day_of_week
+    ).filter_by(teacher_id=current_user.id, timeslot_id=timeslot_id).all()
+    regular_keys = {
+        (sched.enrollment_id, session_date)
+        for session_date, sched in expand_schedules(regular_schedules, window_start, window_end)
+    }
     
-    # Ambil booking hari ini yang status 'izin' (siswa yang sudah request izin) - default Izin tapi bisa diganti Hadir
-    bookings_izin = Booking.query.filter_by(
-        date=today, 
-        timeslot_id=timeslot_id,
-        teacher_id=effective_teacher_id,
-        status='izin'
-    ).all()
+    # Ambil booking hari ini yang status 'booked' (siswa yang hadir) - default Hadir
+    # dan 'izin' (siswa yang sudah request izin) - default Izin tapi bisa diganti Hadir
+    todays_bookings = bookings_by_teacher_date.get((effective_teacher_id, today), [])
+    bookings_hadir = [b for b in todays_bookings if b.status == 'booked']
+    bookings_izin = [b for b in todays_bookings if b.status == 'izin']
     
     # Gabungkan semua booking untuk backward compatibility (total count, dll)
     bookings = bookings_hadir + bookings_izin
     
     # --- UPCOMING SCHEDULES (7 hari ke depan) ---
-    upcoming = []
-    days_name = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
-    
-    # Preload overrides for efficiency
-    overrides_as_original = TeacherSessionOverride.query.filter_by(
-        original_teacher_id=current_user.id
-    ).all()
-    override_keys_to_exclude = {(o.date, o.timeslot_id) for o in overrides_as_original}
-    
-    overrides_as_substitute = TeacherSessionOverride.query.filter_by(
-        substitute_teacher_id=current_user.id
-    ).all()
-    override_keys_as_substitute = {(o.date, o.timeslot_id): o.original_teacher_id for o in overrides_as_substitute}
+    def upcoming_item(booking, session_type):
+        return {
+            'date': booking.date,
+            'day_name': days_name[booking.date.weekday()],
+            'student_name': booking.enrollment.student.name,
+            'program_name': booking.enrollment.program.name,
+            'subject_name': booking.subject.name if booking.subject else '-',
+            'timeslot_name': booking.timeslot.name if booking.timeslot else '-',
+            'timeslot_id': booking.timeslot_id,
+            'type': session_type,
+            'enrollment': booking.enrollment,
+            'class_enrollment': booking.class_enrollment
+        }
     
-    for i in range(1, 8):  # Next 7 days
-        future_date = today + timedelta(days=i)
-        day_of_week = future_date.weekday()  # 0=Monday
-        
+    upcoming = []
+    for future_date in weekday_dates(window_start, window_end, range(7)):  # Next 7 days
         # Check if this date+timeslot is overridden for current teacher
-        if (future_date, timeslot_id) in override_keys_to_exclude:
+        if future_date in override_dates_to_exclude:
             continue  # Skip - someone else is substituting
         
-        # 1. Cari dari regular schedules yang diajar oleh teacher ini DAN sesuai timeslot
-        regular_schedules = StudentSchedule.query.filter_by(
-            day_of_week=day_of_week,
-            teacher_id=current_user.id,
-            timeslot_id=timeslot_id  # Filter by current session
-        ).all()
-        
-        for sched in regular_schedules:
-            # Cek apakah sudah ada booking untuk jadwal ini
-            existing_booking = Booking.query.filter_by(
-                enrollment_id=sched.enrollment_id,
-                date=future_date,
-                timeslot_id=sched.timeslot_id
-            ).first()
-            
-            if not existing_booking:
-                # Get class enrollment for regular schedule
-                class_enrollment = None
-                if sched.class_enrollment_id:
-                    from app.models import ClassEnrollment
-                    class_enrollment = ClassEnrollment.query.get(sched.class_enrollment_id)
-                
-                upcoming.append({
-                    'date': future_date,
-                    'day_name': days_name[day_of_week],
-                    'student_name': sched.enrollment.student.name,
-                    'program_name': sched.enrollment.program.name,
-                    'subject_name': sched.subject.name if sched.subject else '-',
-                    'timeslot_name': sched.timeslot.name if sched.timeslot else '-',
-                    'timeslot_id': sched.timeslot_id,
-                    'type': 'regular',
-                    'enrollment': sched.enrollment,
-                    'class_enrollment': class_enrollment
-                })
-        
-        # 2. Cari dari future bookings yang diajar oleh teacher ini DAN sesuai timeslot
-        future_bookings = Booking.query.filter_by(
-            date=future_date,
-            teacher_id=current_user.id,
-            timeslot_id=timeslot_id  # Filter by current session
-        ).filter(Booking.status != 'completed').all()
-        
-        for booking in future_bookings:
-            upcoming.append({
-                'date': future_date,
-                'day_name': days_name[day_of_week],
-                'student_name': booking.enrollment.student.name,
-                'program_name': booking.enrollment.program.name,
-                'subject_name': booking.subject.name if booking.subject else '-',
-                'timeslot_name': booking.timeslot.name if booking.timeslot else '-',
-                'timeslot_id': booking.timeslot_id,
-                'type': 'booking',
-                'enrollment': booking.enrollment,
-                'class_enrollment': booking.class_enrollment
-            })
+        # 1. Booking (hasil materializer jadwal mingguan) yang diajar oleh teacher ini
+        for booking in bookings_by_teacher_date.get((current_user.id, future_date), []):
+            is_regular = (booking.enrollment_id, future_date) in regular_keys
+            upcoming.append(upcoming_item(booking, 'regular' if is_regular else 'booking'))
         
-        # 3. Check if current user is a substitute for this date+timeslot
-        if (future_date, timeslot_id) in override_keys_as_substitute:
-            original_teacher_id = override_keys_as_substitute[(future_date, timeslot_id)]
-            
-            # Get bookings from original teacher for this date+timeslot
-            substitute_bookings = Booking.query.filter_by(
-                date=future_date,
-                teacher_id=original_teacher_id,
-                timeslot_id=timeslot_id
-            ).filter(Booking.status != 'completed').all()
-            
-            for booking in substitute_bookings:
-                upcoming.append({
-                    'date': future_date,
-                    'day_name': days_name[day_of_week],
-                    'student_name': booking.enrollment.student.name,
-                    'program_name': booking.enrollment.program.name,
-                    'subject_name': booking.subject.name if booking.subject else '-',
-                    'timeslot_name': booking.timeslot.name if booking.timeslot else '-',
-                    'timeslot_id': booking.timeslot_id,
-                    'type': 'substitute',
-                    'enrollment': booking.enrollment,
-                    'class_enrollment': booking.class_enrollment
-                })
-            
-            # If no bookings found, check StudentSchedule from original teacher
-            if not substitute_bookings:
-                # Get override to access timeslot info
-                from app.models import ClassEnrollment
-                override = TeacherSessionOverride.query.filter_by(
-                    date=future_date,
-                    timeslot_id=timeslot_id,
-                    substitute_teacher_id=current_user.id
-                ).first()
-                
-                if override:
-                    schedules = StudentSchedule.query.filter_by(
-                        teacher_id=original_teacher_id,
-                        timeslot_id=timeslot_id,
-                        day_of_week=day_of_week
-                    ).all()
-                    
-                    for sched in schedules:
-                        class_enrollment = None
-                        if sched.class_enrollment_id:
-                            class_enrollment = ClassEnrollment.query.get(sched.class_enrollment_id)
-                        
-                        upcoming.append({
-                            'date': future_date,
-                            'day_name': days_name[day_of_week],
-                            'student_name': sched.enrollment.student.name,
-                            'program_name': sched.enrollment.program.name,
-                            'subject_name': sched.subject.name if sched.subject else '-',
-                            'timeslot_name': override.timeslot.name if override.timeslot else '-',
-                            'timeslot_id': timeslot_id,
-                            'type': 'substitute',
-                            'enrollment': sched.enrollment,
-                            'class_enrollment': class_enrollment
-                        })
-    
-    # Sort by date
-    upcoming.sort(key=lambda x: x['date'])
+        # 2. Bookings of the original teacher when current user substitutes on this date
+        if future_date in substitute_for:
+            original_teacher_id = substitute_for[future_date].original_teacher_id
+            for booking in bookings_by_teacher_date.get((original_teacher_id, future_date), []):
+                upcoming.append(upcoming_item(booking, 'substitute'))
+    
+    # Syllabus index of every class in the upcoming sessions (cached, missing ones in one query)
+    syllabus_indexes = get_syllabus_indexes(
+        item['class_enrollment'].program_class_id for item in upcoming if item['class_enrollment']
+    )
     
     # === GROUP UPCOMING BY SESSION (date + timeslot) ===
-    from collections import defaultdict
-    from app.models import Syllabus
-    
     grouped = defaultdict(list)
     for item in upcoming:
         key = (item['date'], item['timeslot_id'], item['timeslot_name'])
@@ -351,24 +294,7 @@ def view_form(timeslot_id):
                 remaining = ce.sessions_remaining or 0
                 completed = total - remaining
                 
-                syllabus_items = Syllabus.query.filter_by(
-                    program_class_id=ce.program_class_id
-                ).order_by(Syllabus.order).all()
-                
-                cumulative = 0
-                for syl in syllabus_items:
-                    prev_cumulative = cumulative
-                    cumulative += syl.sessions
-                    if completed < cumulative:
-                        session_in_topic = completed - prev_cumulative + 1
-                        if syl.sessions > 1:
-                            current_topic = f"{syl.topic_name} - {session_in_topic}"
-                        else:
-                            current_topic = syl.topic_name
-                        break
-                else:
-                    if syllabus_items:
-                        current_topic = syllabus_items[-1].topic_name + " (Selesai)"
+                current_topic = syllabus_indexes[ce.program_class_id].current_topic(completed)
             elif s['enrollment']:
                 class_name = s['enrollment'].program.name
             
@@ -388,9 +314,6 @@ def view_form(timeslot_id):
             'student_count': len(student_details)
         })
     
-    # Sort by date
-    upcoming_sessions.sort(key=lambda x: x['date'])
-    
     # Cek status sesi: 'active', 'not_yet', atau 'passed'
     session_status = get_session_status(timeslot, today)
     is_session_active = session_status == 'active'
@@ -1,4 +1,4 @@
-from app.utils.whatsapp import send_wa_message, check_wa_status
+from app.utils.whatsapp import get_wa_client
 from flask import Blueprint, render_template, request, flash, url_for, redirect, jsonify
 from flask_login import login_required, current_user
 from app.models import (
@@ -7,7 +7,15 @@ from app.models import (
     TimeSlot, MasterClass
 )
 from app import db
+from app.services.overrides import apply_display_teacher, load_override_index
+from app.services.progress import load_student_enrollments, build_enrollments_progress
+from app.services.schedule_expansion import expand_schedules
+from app.utils.db import insert_or_ignore, update_returning
+from app.services.teacher_calendar import get_teacher_calendar_events, MAX_RANGE_DAYS as MAX_CALENDAR_RANGE_DAYS
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
 import uuid
+from collections import defaultdict
 from datetime import date, datetime, timedelta
 
 bp = Blueprint('main', __name__)
@@ -17,67 +25,76 @@ def generate_upcoming_sessions_from_schedule(schedules, weeks_ahead=4):
     """
     Generate upcoming session dates from weekly schedule patterns.
     Returns list of sessions with specific dates for the next N weeks.
+    
+    Existing bookings and teacher overrides for the whole window are fetched
+    with two range queries and looked up by (date, timeslot_id).
     """
-    from app.models import TeacherSessionOverride
+    schedules = list(schedules)
+    if not schedules:
+        return []
     
     upcoming = []
     today = date.today()
     end_date = today + timedelta(weeks=weeks_ahead)
     
-    for sched in schedules:
-        # Find all dates matching this day_of_week in the range
-        current_date = today
-        while current_date <= end_date:
-            if current_date.weekday() == sched.day_of_week:
-                # Check if booking already exists for this date/timeslot/enrollment
-                existing_booking = Booking.query.filter_by(
-                    enrollment_id=sched.enrollment_id,
-                    date=current_date,
-                    timeslot_id=sched.timeslot_id
-                ).first()
-                
-                # Check if there's a teacher override for this date/timeslot
-                teacher = sched.teacher
-                is_substitute = False
-                override = TeacherSessionOverride.query.filter_by(
-                    original_teacher_id=sched.teacher_id,
-                    date=current_date,
-                    timeslot_id=sched.timeslot_id
-                ).first()
-                
-                if override:
-                    teacher = override.substitute_teacher
-                    is_substitute = True
-                
-                upcoming.append({
-                    'schedule_id': sched.id,
-                    'date': current_date,
-                    'day_of_week': sched.day_of_week,
-                    'timeslot': sched.timeslot,
-                    'teacher': teacher,
-                    'is_substitute': is_substitute,
-                    'class_enrollment_id': sched.class_enrollment_id,
-                    'class_enrollment': sched.class_enrollment,
-                    'enrollment_id': sched.enrollment_id,
-                    'existing_booking': existing_booking,
-                    'can_izin': (
-                        existing_booking is None and  # No existing booking
-                        sched.class_enrollment and
-                        sched.class_enrollment.program_class.max_izin > 0 and
-                        sched.class_enrollment.izin_remaining > 0
-                    )
-                })
-            current_date += timedelta(days=1)
+    # Prefetch bookings in the window: {enrollment_id: {(date, timeslot_id): booking}}
+    enrollment_ids = {s.enrollment_id for s in schedules}
+    window_bookings = Booking.query.filter(
+        Booking.enrollment_id.in_(enrollment_ids),
+        Booking.date >= today,
+        Booking.date <= end_date
+    ).order_by(Booking.id).all()
+    bookings_by_enrollment = defaultdict(dict)
+    for b in window_bookings:
+        bookings_by_enrollment[b.enrollment_id].setdefault((b.date, b.timeslot_id), b)
+    
+    # Prefetch teacher overrides in the window: {(original_teacher_id, date, timeslot_id): override}
+    overrides = load_override_index({s.teacher_id for s in schedules}, today, end_date)
+    
+    # All occurrence dates of all schedules at once, in date order
+    for current_date, sched in expand_schedules(schedules, today, end_date):
+        enrollment_bookings = bookings_by_enrollment.get(sched.enrollment_id, {})
+        
+        # Check if booking already exists for this date/timeslot/enrollment
+        existing_booking = enrollment_bookings.get((current_date, sched.timeslot_id))
+        
+        # Check if there's a teacher override for this date/timeslot
+        teacher = sched.teacher
+        is_substitute = False
+        override = overrides.get((sched.teacher_id, current_date, sched.timeslot_id))
+        
+        if override:
+            teacher = override.substitute_teacher
+            is_substitute = True
+        
+        upcoming.append({
+            'schedule_id': sched.id,
+            'date': current_date,
+            'day_of_week': sched.day_of_week,
+            'timeslot': sched.timeslot,
+            'teacher': teacher,
+            'is_substitute': is_substitute,
+            'class_enrollment_id': sched.class_enrollment_id,
+            'class_enrollment': sched.class_enrollment,
+            'enrollment_id': sched.enrollment_id,
+            'existing_booking': existing_booking,
+            'can_izin': (
+                existing_booking is None and  # No existing booking
+                sched.class_enrollment and
+                sched.class_enrollment.program_class.max_izin > 0 and
+                sched.class_enrollment.izin_remaining > 0
+            )
+        })
     
-    # Sort by date
+    # Already in date order; sessions on the same date by start time
     upcoming.sort(key=lambda x: (x['date'], x['timeslot'].start_time))
     return upcoming
 
 @bp.route('/')
 @login_required
 def dashboard():
-    # Fetch ALL enrollments for multi-program support
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
+    # Fetch ALL enrollments for multi-program support (eager loaded for progress data)
+    enrollments = load_student_enrollments(current_user.id)
     
     # For backward compatibility, keep single enrollment reference
     enrollment = enrollments[0] if enrollments else None
@@ -91,324 +108,50 @@ def dashboard():
     
     if enrollments:
         # Gather bookings from ALL enrollments
-        from app.models import TeacherSessionOverride
-        
         enrollment_ids = [e.id for e in enrollments]
-        raw_bookings = Booking.query.filter(
+        raw_bookings = Booking.query.options(
+            joinedload(Booking.teacher),
+            joinedload(Booking.timeslot),
+            joinedload(Booking.subject),
+            joinedload(Booking.class_enrollment).joinedload(ClassEnrollment.program_class)
+        ).filter(
             Booking.enrollment_id.in_(enrollment_ids),
             Booking.status != 'completed',
             Booking.date >= date.today()
         ).order_by(Booking.date).all()
         
-        # Add override info to each booking
-        for booking in raw_bookings:
-            # Check if there's a teacher override for this booking
-            override = TeacherSessionOverride.query.filter_by(
-                original_teacher_id=booking.teacher_id,
-                date=booking.date,
-                timeslot_id=booking.timeslot_id
-            ).first()
-            
-            if override:
-                booking.display_teacher = override.substitute_teacher
-                booking.is_substitute = True
-            else:
-                booking.display_teacher = booking.teacher
-                booking.is_substitute = False
-        
-        manual_bookings = raw_bookings
+        # Add override info to each booking (single override query)
+        manual_bookings = apply_display_teacher(raw_bookings)
         
-        # Build progress data for EACH enrollment
-        for enroll in enrollments:
-            # Get all completed bookings for this enrollment
-            completed_bookings = Booking.query.filter(
-                Booking.enrollment_id == enroll.id,
-                Booking.status == 'completed'
-            ).all()
-            
-            # Get attendance records for completed bookings
-            booking_ids = [b.id for b in completed_bookings]
-            attendance_records = Attendance.query.filter(
-                Attendance.booking_id.in_(booking_ids)
-            ).order_by(Attendance.date.desc()).limit(10).all() if booking_ids else []
-            
-            # Calculate attendance stats
-            hadir_count = Attendance.query.filter(
-                Attendance.booking_id.in_(booking_ids),
-                Attendance.status == 'Hadir'
-            ).count() if booking_ids else 0
-            
-            # Izin count from class_enrollments.izin_used (not from Attendance status)
-            izin_count = sum(ce.izin_used for ce in enroll.class_enrollments)
-            
-            alpha_count = Attendance.query.filter(
-                Attendance.booking_id.in_(booking_ids),
-                Attendance.status == 'Alpha'
-            ).count() if booking_ids else 0
-            
-            # Calculate progress percentage
-            total_sessions = enroll.program.total_sessions
-            completed_sessions = total_sessions - enroll.sessions_remaining
-            progress_pct = int((completed_sessions / total_sessions) * 100) if total_sessions > 0 else 0
-            
-            # Build session history with details
-            session_history = []
-            for att in attendance_records:
-                booking = Booking.query.get(att.booking_id)
-                if booking:
-                    session_history.append({
-                        'date': att.date,
-                        'subject': booking.subject.name if booking.subject else '-',
-                        'timeslot': booking.timeslot.name if booking.timeslot else '-',
-                        'status': att.status,
-                        'notes': att.notes,
-                        'teacher': booking.teacher.name if booking.teacher else '-'
-                    })
-            
-            # Build class enrollments data with detailed stats
-            class_enrollments_data = []
-            for ce in enroll.class_enrollments:
-                # Calculate per-class attendance
-                class_hadir = Attendance.query.join(Booking).filter(
-                    Booking.class_enrollment_id == ce.id,
-                    Attendance.status == 'Hadir'
-                ).count()
-                
-                class_alpha = Attendance.query.join(Booking).filter(
-                    Booking.class_enrollment_id == ce.id,
-                    Attendance.status == 'Alpha'
-                ).count()
-                
-                class_enrollments_data.append({
-                    'id': ce.id,
-                    'class_name': ce.program_class.name,
-                    'sessions_remaining': ce.sessions_remaining,
-                    'total_sessions': ce.program_class.total_sessions,
-                    'max_izin': ce.program_class.max_izin,
-                    'izin_used': ce.izin_used,
-                    'izin_remaining': ce.izin_remaining,
-                    'status': ce.status,
-                    'is_batch': ce.program_class.is_batch_based,
-                    'hadir': class_hadir,
-                    'alpha': class_alpha
-                })
-            
-            # Generate upcoming sessions from schedule for izin feature
-            upcoming_schedule_sessions = generate_upcoming_sessions_from_schedule(
-                enroll.schedules, 
-                weeks_ahead=4
-            )
-            
-            enroll_progress = {
-                'enrollment_id': enroll.id,
-                'program_name': enroll.program.name,
-                'program_id': enroll.program.id,
-                'status': enroll.status,
-                'completed_sessions': completed_sessions,
-                'total_sessions': total_sessions,
-                'remaining_sessions': enroll.sessions_remaining,
-                'progress_pct': progress_pct,
-                'hadir': hadir_count,
-                'izin': izin_count,
-                'alpha': alpha_count,
-                'session_history': session_history,
-                'class_enrollments': class_enrollments_data,
-                'upcoming_schedule_sessions': upcoming_schedule_sessions
-            }
-            enrollments_data.append(enroll_progress)
+        # Weekly schedule behind each materialized booking (Reschedule posts its schedule_id)
+        schedule_by_slot = {
+            (s.enrollment_id, s.day_of_week, s.timeslot_id): s
+            for e in enrollments for s in e.schedules
+        }
+        for booking in raw_bookings:
+            sched = schedule_by_slot.get((booking.enrollment_id, booking.date.weekday(), booking.timeslot_id))
+            booking.student_schedule_id = sched.id if sched else None
+        
+        # Build progress data for ALL enrollments with grouped queries
+        enrollments_data = build_enrollments_progress(enrollments)
+        
+        # Sessions derived from the weekly schedule, only for enrollments that have no
+        # bookings yet (active ones are materialized as Booking rows by the booking job)
+        booked_enrollment_ids = {b.enrollment_id for b in raw_bookings}
+        upcoming_sessions = generate_upcoming_sessions_from_schedule(
+            [s for e in enrollments if e.id not in booked_enrollment_ids for s in e.schedules],
+            weeks_ahead=4
+        )
+        for enroll_progress in enrollments_data:
+            enroll_progress['upcoming_schedule_sessions'] = [
+                s for s in upcoming_sessions
+                if s['enrollment_id'] == enroll_progress['enrollment_id']
+            ]
         
         # For backward compatibility - use first enrollment's progress
         if enrollments_data:
             student_progress = enrollments_data[0]
     
-    # Teacher Calendar Data
-    teacher_calendar_events = []
-    if current_user.role == 'teacher':
-        from app.models import TeacherSessionOverride
-        from collections import defaultdict
-        
-        # Get all bookings for this teacher
-        teacher_bookings = Booking.query.filter(
-            Booking.teacher_id == current_user.id
-        ).order_by(Booking.date).all()
-        
-        # Get overrides where this teacher is being substituted (exclude these)
-        overrides_as_original = TeacherSessionOverride.query.filter_by(
-            original_teacher_id=current_user.id
-        ).all()
-        override_keys_to_exclude = {(o.date, o.timeslot_id) for o in overrides_as_original}
-        
-        # Get overrides where this teacher is the substitute (include these bookings)
-        overrides_as_substitute = TeacherSessionOverride.query.filter_by(
-            substitute_teacher_id=current_user.id
-        ).all()
-        
-        # Get bookings from original teachers that this user is substituting
-        substitute_bookings = []
-        for override in overrides_as_substitute:
-            bookings_from_original = Booking.query.filter(
-                Booking.teacher_id == override.original_teacher_id,
-                Booking.date == override.date,
-                Booking.timeslot_id == override.timeslot_id
-            ).all()
-            substitute_bookings.extend(bookings_from_original)
-            
-            # If no bookings found, check StudentSchedule for the override date
-            if not bookings_from_original:
-                day_of_week = override.date.weekday()
-                schedules = StudentSchedule.query.filter_by(
-                    teacher_id=override.original_teacher_id,
-                    timeslot_id=override.timeslot_id,
-                    day_of_week=day_of_week
-                ).all()
-                
-                # Create pseudo-bookings for calendar display
-                for sched in schedules:
-                    # Create a virtual booking-like object
-                    class PseudoBooking:
-                        def __init__(self, date, timeslot_id, timeslot, enrollment, class_enrollment, status='booked'):
-                            self.date = date
-                            self.timeslot_id = timeslot_id
-                            self.timeslot = timeslot
-                            self.enrollment = enrollment
-                            self.class_enrollment = class_enrollment
-                            self.status = status
-                    
-                    pseudo = PseudoBooking(
-                        date=override.date,
-                        timeslot_id=override.timeslot_id,
-                        timeslot=override.timeslot,
-                        enrollment=sched.enrollment,
-                        class_enrollment=ClassEnrollment.query.get(sched.class_enrollment_id) if sched.class_enrollment_id else None
-                    )
-                    substitute_bookings.append(pseudo)
-        
-        # Generate upcoming sessions from StudentSchedule for this teacher (4 weeks ahead)
-        # This ensures scheduled sessions appear even without existing Booking records
-        schedule_generated_bookings = []
-        teacher_schedules = StudentSchedule.query.filter_by(
-            teacher_id=current_user.id
-        ).all()
-        
-        today = date.today()
-        end_date = today + timedelta(weeks=4)
-        
-        for sched in teacher_schedules:
-            # Generate dates for this schedule pattern
-            current_date = today
-            while current_date <= end_date:
-                if current_date.weekday() == sched.day_of_week:
-                    key = (current_date, sched.timeslot_id)
-                    # Skip if this date is overridden (teacher substituted out)
-                    if key not in override_keys_to_exclude:
-                        # Check if booking already exists for this slot
-                        existing_booking = None
-                        for b in teacher_bookings:
-                            if b.date == current_date and b.timeslot_id == sched.timeslot_id:
-                                existing_booking = b
-                                break
-                        
-                        # Only create pseudo-booking if no real booking exists
-                        if not existing_booking:
-                            class PseudoBooking:
-                                def __init__(self, date, timeslot_id, timeslot, enrollment, class_enrollment, status='booked'):
-                                    self.date = date
-                                    self.timeslot_id = timeslot_id
-                                    self.timeslot = timeslot
-                                    self.enrollment = enrollment
-                                    self.class_enrollment = class_enrollment
-                                    self.status = status
-                            
-                            pseudo = PseudoBooking(
-                                date=current_date,
-                                timeslot_id=sched.timeslot_id,
-                                timeslot=sched.timeslot,
-                                enrollment=sched.enrollment,
-                                class_enrollment=ClassEnrollment.query.get(sched.class_enrollment_id) if sched.class_enrollment_id else None
-                            )
-                            schedule_generated_bookings.append(pseudo)
-                current_date += timedelta(days=1)
-        
-        # Combine: own bookings (excluding overridden) + substitute bookings + schedule-generated
-        all_bookings = []
-        for booking in teacher_bookings:
-            key = (booking.date, booking.timeslot_id)
-            if key not in override_keys_to_exclude:
-                all_bookings.append(booking)
-        all_bookings.extend(substitute_bookings)
-        all_bookings.extend(schedule_generated_bookings)
-        
-        # Group bookings by date + timeslot
-        grouped = defaultdict(list)
-        for booking in all_bookings:
-            key = (booking.date, booking.timeslot_id)
-            grouped[key].append(booking)
-        
-        today = date.today()
-        
-        for (booking_date, timeslot_id), bookings_in_slot in grouped.items():
-            # Get timeslot info from first booking
-            first_booking = bookings_in_slot[0]
-            timeslot = first_booking.timeslot
-            
-            # Exclude izin students from count
-            active_bookings = [b for b in bookings_in_slot if b.status != 'izin']
-            total_students = len(active_bookings)
-            
-            # Skip if no active students (all izin)
-            if total_students == 0:
-                continue
-            
-            completed_count = sum(1 for b in active_bookings if b.status == 'completed')
-            booked_count = sum(1 for b in active_bookings if b.status == 'booked')
-            
-            # Get class name (from first booking with class_enrollment)
-            class_name = '-'
-            for b in bookings_in_slot:
-                if b.class_enrollment:
-                    class_name = b.class_enrollment.program_class.name
-                    break
-                elif b.enrollment and b.enrollment.program:
-                    class_name = b.enrollment.program.name
-                    break
-            
-            # Check if this is a substitute session
-            is_substitute = (booking_date, timeslot_id) in {(o.date, o.timeslot_id) for o in overrides_as_substitute}
-            
-            # Determine global status and color
-            if completed_count == total_students:
-                color = '#28a745'  # Green - selesai
-                status = 'Selesai'
-            elif booking_date < today:
-                color = '#dc3545'  # Red - terlewat (tanggal sudah lewat tapi belum diabsen)
-                status = 'Terlewat'
-            else:
-                color = '#007bff'  # Blue - mendatang
-                status = 'Mendatang'
-            
-            # Build event title with substitute indicator
-            title = f"{timeslot.name} ({total_students} siswa)"
-            if is_substitute:
-                title = f"🔄 {title}"
-            
-            event = {
-                'id': f"{booking_date}_{timeslot_id}",
-                'title': title,
-                'start': f"{booking_date}T{timeslot.start_time.strftime('%H:%M:%S')}",
-                'end': f"{booking_date}T{timeslot.end_time.strftime('%H:%M:%S')}",
-                'color': color,
-                'extendedProps': {
-                    'class_name': class_name,
-                    'timeslot': timeslot.name,
-                    'total_students': total_students,
-                    'status': status,
-                    'date': booking_date.strftime('%d %b %Y'),
-                    'is_substitute': is_substitute
-                }
-            }
-            teacher_calendar_events.append(event)
-
-    
     # Admin Stats
     stats = None
     if current_user.role == 'admin':
@@ -423,8 +166,9 @@ def dashboard():
             Attendance.date == date.today()
         ).count()
         
-        # Check WhatsApp status
-        wa_status = check_wa_status()
+        # WhatsApp status from the health cache (refreshed in the background)
+        from app.services.wa_health import get_wa_status
+        wa_status = get_wa_status()
         
         stats = {
             'total_students': total_students,
@@ -440,24 +184,42 @@ def dashboard():
                            enrollments_data=enrollments_data,
                            days=days,
                            manual_bookings=manual_bookings,
-                           teacher_calendar_events=teacher_calendar_events,
                            student_progress=student_progress,
                            stats=stats)
 
 
+# --- API: TEACHER CALENDAR EVENTS (FullCalendar event source) ---
+@bp.route('/api/teacher/calendar')
+@login_required
+def teacher_calendar_events():
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # FullCalendar sends ISO datetimes (e.g. 2025-01-27T00:00:00+07:00); end is exclusive
+    try:
+        start = date.fromisoformat(request.args.get('start', '')[:10])
+        end = date.fromisoformat(request.args.get('end', '')[:10])
+    except ValueError:
+        return jsonify({'error': 'start and end are required (YYYY-MM-DD)'}), 400
+    
+    if end <= start or (end - start).days > MAX_CALENDAR_RANGE_DAYS:
+        return jsonify({'error': f'Invalid range (max {MAX_CALENDAR_RANGE_DAYS} days)'}), 400
+    
+    return jsonify(get_teacher_calendar_events(current_user.id, start, end))
+
+
 # --- API: GET WA QR CODE ---
 @bp.route('/api/wa-qr')
 @login_required
 def api_wa_qr():
     from flask import jsonify
-    from app.utils.whatsapp import get_wa_qr
     import re
     import os
     
     if current_user.role != 'admin':
         return jsonify({'error': 'Access denied'}), 403
     
-    result = get_wa_qr()
+    result = get_wa_client().get_qr()
     
     # Rewrite to use our proxy endpoint instead of direct wabot URL
     if result.get('success') and result.get('qr_link'):
@@ -476,21 +238,16 @@ def api_wa_qr():
 @bp.route('/api/wa-qr-image/<filename>')
 @login_required
 def proxy_wa_qr(filename):
-    import requests
     from flask import Response
-    import os
     
     if current_user.role != 'admin':
         return "Access denied", 403
     
     # Fetch image from wabot internal URL
-    wa_url = os.environ.get('WA_API_URL', 'http://wabot:3000')
-    image_url = f"{wa_url}/statics/qrcode/{filename}"
-    
     try:
-        resp = requests.get(image_url, timeout=10)
-        if resp.status_code == 200:
-            return Response(resp.content, mimetype='image/png')
+        content = get_wa_client().get_qr_image(filename)
+        if content is not None:
+            return Response(content, mimetype='image/png')
         else:
             return "Image not found", 404
     except Exception as e:
@@ -534,7 +291,7 @@ def admin_invite():
         target_wa = f"{clean_phone}@s.whatsapp.net"
         
         # 4. KIRIM WHATSAPP DULUAN (ATOMIC CHECK)
-        if send_wa_message(target_wa, pesan):
+        if get_wa_client().try_send_message(target_wa, pesan):
             # Jika SUKSES kirim, baru simpan ke DB
             try:
                 new_user = User(
@@ -651,7 +408,7 @@ def batch_invite():
             target_wa = f"{clean_phone}@s.whatsapp.net"
             
             # Kirim WA
-            if send_wa_message(target_wa, pesan):
+            if get_wa_client().try_send_message(target_wa, pesan):
                 try:
                     new_user = User(
                         email=email,
@@ -687,6 +444,28 @@ def batch_invite():
     return render_template('admin_batch_invite.html', programs=programs, batches=batches, results=results)
 
 # --- ROUTE UNTUK STUDENT REQUEST IZIN ---
+def _booked_to_izin(*criteria):
+    """
+    Guarded UPDATE ... SET status='izin' WHERE criteria AND status='booked'.
+    Of two concurrent requests for the same session only one matches the row;
+    True when this request did.
+    """
+    return len(update_returning(
+        Booking, [*criteria, Booking.status == 'booked'], {'status': 'izin'},
+        returning=[Booking.id, Booking.teacher_id]
+    )) == 1
+
+
+def _use_izin_quota(ce):
+    """izin_used + 1 computed by the database (no lost increment between requests)"""
+    db.session.execute(
+        update(ClassEnrollment)
+        .where(ClassEnrollment.id == ce.id)
+        .values(izin_used=ClassEnrollment.izin_used + 1)
+        .execution_options(synchronize_session='fetch')
+    )
+
+
 @bp.route('/request-izin/<int:booking_id>', methods=['POST'])
 @login_required
 def request_izin(booking_id):
@@ -727,12 +506,16 @@ def request_izin(booking_id):
         if ce.izin_remaining <= 0:
             flash(f'Kuota izin untuk kelas {ce.program_class.name} sudah habis.', 'error')
             return redirect(url_for('main.dashboard'))
-        
-        # Update izin used
-        ce.izin_used += 1
     
     # Change booking status to 'izin' (session NOT consumed, will shift to next schedule)
-    booking.status = 'izin'
+    if not _booked_to_izin(Booking.id == booking.id):
+        db.session.rollback()
+        flash('Booking ini sudah diproses oleh request lain, tidak bisa diizinkan.', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    # Update izin used
+    if ce:
+        _use_izin_quota(ce)
     db.session.commit()
     
     # Send WhatsApp notification to teacher
@@ -797,17 +580,6 @@ def request_izin_schedule():
         flash('Izin harus diajukan minimal 1 jam sebelum jadwal dimulai.', 'error')
         return redirect(url_for('main.dashboard'))
     
-    # Check if booking already exists
-    existing_booking = Booking.query.filter_by(
-        enrollment_id=schedule.enrollment_id,
-        date=izin_date,
-        timeslot_id=schedule.timeslot_id
-    ).first()
-    
-    if existing_booking:
-        flash(f'Sudah ada booking untuk tanggal ini dengan status: {existing_booking.status}', 'error')
-        return redirect(url_for('main.dashboard'))
-    
     # Check izin quota
     ce = schedule.class_enrollment
     if ce:
@@ -818,20 +590,35 @@ def request_izin_schedule():
         if ce.izin_remaining <= 0:
             flash(f'Kuota izin untuk kelas {ce.program_class.name} sudah habis.', 'error')
             return redirect(url_for('main.dashboard'))
-        
-        # Update izin used
-        ce.izin_used += 1
     
-    # Create booking with status='izin'
-    new_booking = Booking(
-        enrollment_id=schedule.enrollment_id,
-        class_enrollment_id=schedule.class_enrollment_id,
-        date=izin_date,
-        timeslot_id=schedule.timeslot_id,
-        teacher_id=schedule.teacher_id,
-        status='izin'
-    )
-    db.session.add(new_booking)
+    # Create booking with status='izin' (skipped by unique constraint if a booking already exists)
+    inserted = insert_or_ignore(Booking, {
+        'enrollment_id': schedule.enrollment_id,
+        'class_enrollment_id': schedule.class_enrollment_id,
+        'date': izin_date,
+        'timeslot_id': schedule.timeslot_id,
+        'teacher_id': schedule.teacher_id,
+        'status': 'izin'
+    }, ['enrollment_id', 'date', 'timeslot_id'])
+    
+    # Session already materialized by the booking job: izin on that row, if still 'booked'
+    if not inserted and not _booked_to_izin(
+        Booking.enrollment_id == schedule.enrollment_id,
+        Booking.date == izin_date,
+        Booking.timeslot_id == schedule.timeslot_id
+    ):
+        db.session.rollback()
+        existing_booking = Booking.query.filter_by(
+            enrollment_id=schedule.enrollment_id,
+            date=izin_date,
+            timeslot_id=schedule.timeslot_id
+        ).first()
+        flash(f'Sudah ada booking untuk tanggal ini dengan status: {existing_booking.status if existing_booking else "-"}', 'error')
+        return redirect(url_for('main.dashboard'))
+    
+    # Update izin used
+    if ce:
+        _use_izin_quota(ce)
     db.session.commit()
     
     # Send WhatsApp notification to teacher
@@ -5,6 +5,8 @@ from app.models import (
     Enrollment, MasterClass, TeacherAvailability, TeacherSkill, 
     StudentSchedule, User, TimeSlot, ClassEnrollment
 )
+from app.services.booking_materializer import materialize_bookings
+from app.services.schedule_expansion import weekday_dates
 
 bp = Blueprint('onboarding', __name__, url_prefix='/onboarding')
 
@@ -184,7 +186,6 @@ def schedule_wizard(enrollment_id=None):
 @login_required
 def first_class_date(enrollment_id):
     from datetime import date, timedelta
-    from app.models import Booking
     
     enrollment = Enrollment.query.filter_by(
         id=enrollment_id, 
@@ -223,18 +224,13 @@ def first_class_date(enrollment_id):
         schedule_summary.append(summary)
     
     # Generate available start dates (next 4 weeks of valid dates based on schedule days)
-    available_dates = []
     schedule_days = set(s.day_of_week for s in schedules)
     today = date.today()
-    
-    for i in range(28):  # Next 4 weeks
-        check_date = today + timedelta(days=i)
-        if check_date.weekday() in schedule_days:
-            available_dates.append({
-                'date': check_date,
-                'date_str': check_date.strftime('%Y-%m-%d'),
-                'display': f"{days[check_date.weekday()]}, {check_date.strftime('%d %b %Y')}"
-            })
+    available_dates = [{
+        'date': check_date,
+        'date_str': check_date.strftime('%Y-%m-%d'),
+        'display': f"{days[check_date.weekday()]}, {check_date.strftime('%d %b %Y')}"
+    } for check_date in weekday_dates(today, today + timedelta(days=27), schedule_days)]
     
     if request.method == 'POST':
         selected_date_str = request.form.get('first_class_date')
@@ -255,40 +251,13 @@ def first_class_date(enrollment_id):
             flash('Tanggal yang dipilih tidak sesuai dengan jadwal.')
             return redirect(url_for('onboarding.first_class_date', enrollment_id=enrollment.id))
         
-        # Save first class date
+        # Save first class date and activate enrollment
         enrollment.first_class_date = selected_date
-        
-        # Generate bookings for next 4 weeks
-        bookings_created = 0
-        end_date = selected_date + timedelta(weeks=4)
-        
-        for sched in schedules:
-            current_date = selected_date
-            while current_date <= end_date:
-                if current_date.weekday() == sched.day_of_week:
-                    # Check if booking already exists
-                    existing = Booking.query.filter_by(
-                        enrollment_id=enrollment.id,
-                        date=current_date,
-                        timeslot_id=sched.timeslot_id
-                    ).first()
-                    
-                    if not existing:
-                        new_booking = Booking(
-                            enrollment_id=enrollment.id,
-                            class_enrollment_id=sched.class_enrollment_id,
-                            date=current_date,
-                            timeslot_id=sched.timeslot_id,
-                            teacher_id=sched.teacher_id,
-                            status='booked'
-                        )
-                        db.session.add(new_booking)
-                        bookings_created += 1
-                
-                current_date += timedelta(days=1)
-        
-        # Activate enrollment
         enrollment.status = 'active'
+        
+        # Book the schedule up to the rolling horizon (extended nightly by the scheduler)
+        result = materialize_bookings(enrollment_ids=[enrollment.id])
+        bookings_created = result['booked']
         db.session.commit()
         
         flash(f'Selamat! Jadwal berhasil diatur mulai {selected_date.strftime("%d %b %Y")}. {bookings_created} sesi terjadwal.')
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from flask_login import login_required, current_user
 from app import db
 from app.models import ClassEnrollment, Syllabus, Portfolio
+from app.services.syllabus_index import get_syllabus_indexes
 from werkzeug.utils import secure_filename
 import io
 
@@ -31,47 +32,27 @@ def index():
     
     # Get all class enrollments with syllabus data
     class_data = []
+    syllabus_indexes = get_syllabus_indexes(ce.program_class_id for ce in enrollment.class_enrollments)
+    portfolios = Portfolio.load_map(ce.id for ce in enrollment.class_enrollments)
     for ce in enrollment.class_enrollments:
-        syllabus_items = Syllabus.query.filter_by(
-            program_class_id=ce.program_class_id
-        ).order_by(Syllabus.order).all()
+        syllabus_index = syllabus_indexes[ce.program_class_id]
         
         # Calculate completion based on sessions
         total = ce.program_class.total_sessions
         remaining = ce.sessions_remaining or 0
         sessions_completed = total - remaining
-        cumulative = 0
-        completed_topics = 0
         
-        syllabus_with_status = []
-        for s in syllabus_items:
-            cumulative += s.sessions
-            is_complete = sessions_completed >= cumulative
-            is_current = not is_complete and sessions_completed >= (cumulative - s.sessions)
-            
+        syllabus_with_status = syllabus_index.statuses(sessions_completed)
+        for item in syllabus_with_status:
             # Get portfolio for this syllabus item
-            portfolio = Portfolio.query.filter_by(
-                class_enrollment_id=ce.id,
-                syllabus_id=s.id
-            ).first()
-            
-            syllabus_with_status.append({
-                'syllabus': s,
-                'is_complete': is_complete,
-                'is_current': is_current,
-                'portfolio': portfolio,
-                'cumulative_end': cumulative
-            })
-            
-            if is_complete:
-                completed_topics += 1
+            item['portfolio'] = portfolios.get((ce.id, item['syllabus'].id))
         
         class_data.append({
             'class_enrollment': ce,
             'program_class': ce.program_class,
             'syllabus_items': syllabus_with_status,
-            'completed_topics': completed_topics,
-            'total_topics': len(syllabus_items),
+            'completed_topics': syllabus_index.completed_topics(sessions_completed),
+            'total_topics': len(syllabus_index),
             'sessions_completed': sessions_completed
         })
     
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, abort
 from flask_login import login_required, current_user
 from app.models import User, Enrollment, Booking, Attendance, StudentSchedule
+from app.services.syllabus_index import get_syllabus_indexes
 from sqlalchemy import func
 from datetime import date
 
@@ -148,50 +149,30 @@ def student_progress(student_id):
     days = ['Senin', 'Selasa', 'Rabu', 'Kamis', 'Jumat', 'Sabtu', 'Minggu']
     
     # === PORTFOLIO DATA FOR TAB ===
-    from app.models import Syllabus, Portfolio
+    from app.models import Portfolio
     portfolio_data = []
     
+    syllabus_indexes = get_syllabus_indexes(ce.program_class_id for ce in enrollment.class_enrollments)
+    portfolios = Portfolio.load_map(ce.id for ce in enrollment.class_enrollments)
     for ce in enrollment.class_enrollments:
-        syllabus_items = Syllabus.query.filter_by(
-            program_class_id=ce.program_class_id
-        ).order_by(Syllabus.order).all()
+        syllabus_index = syllabus_indexes[ce.program_class_id]
         
         # Calculate completion based on sessions
         total = ce.program_class.total_sessions
         remaining = ce.sessions_remaining or 0
         sessions_completed = total - remaining
-        cumulative = 0
-        completed_topics = 0
         
-        syllabus_with_status = []
-        for s in syllabus_items:
-            cumulative += s.sessions
-            is_complete = sessions_completed >= cumulative
-            is_current = not is_complete and sessions_completed >= (cumulative - s.sessions)
-            
+        syllabus_with_status = syllabus_index.statuses(sessions_completed)
+        for item in syllabus_with_status:
             # Get portfolio for this syllabus item
-            portfolio = Portfolio.query.filter_by(
-                class_enrollment_id=ce.id,
-                syllabus_id=s.id
-            ).first()
-            
-            syllabus_with_status.append({
-                'syllabus': s,
-                'is_complete': is_complete,
-                'is_current': is_current,
-                'portfolio': portfolio,
-                'cumulative_end': cumulative
-            })
-            
-            if is_complete:
-                completed_topics += 1
+            item['portfolio'] = portfolios.get((ce.id, item['syllabus'].id))
         
         portfolio_data.append({
             'class_enrollment': ce,
             'program_class': ce.program_class,
             'syllabus_items': syllabus_with_status,
-            'completed_topics': completed_topics,
-            'total_topics': len(syllabus_items),
+            'completed_topics': syllabus_index.completed_topics(sessions_completed),
+            'total_topics': len(syllabus_index),
             'sessions_completed': sessions_completed
         })
     
@@ -238,27 +219,7 @@ def student_progress(student_id):
             })
         
         # Get current topic from syllabus
-        current_topic = None
-        syllabus_items = Syllabus.query.filter_by(
-            program_class_id=ce.program_class_id
-        ).order_by(Syllabus.order).all()
-        
-        cumulative = 0
-        for s in syllabus_items:
-            prev_cumulative = cumulative
-            cumulative += s.sessions
-            if completed < cumulative:
-                # Calculate which session within this topic (1-indexed)
-                session_in_topic = completed - prev_cumulative + 1
-                if s.sessions > 1:
-                    current_topic = f"{s.topic_name} - {session_in_topic}"
-                else:
-                    current_topic = s.topic_name
-                break
-        else:
-            # All topics completed
-            if syllabus_items:
-                current_topic = syllabus_items[-1].topic_name + " (Selesai)"
+        current_topic = syllabus_indexes[ce.program_class_id].current_topic(completed)
         
         class_progress.append({
             'class_enrollment_id': ce.id,
@@ -1,12 +1,33 @@
 """
 APScheduler Jobs for WhatsApp Notifications
 Runs background jobs for scheduled notifications.
+
+Jobs run inside the app passed to init_scheduler (see with_app_context),
+so they share its config and database engine/pool instead of building a
+new app per run.
+
+Daily jobs live in a SQLAlchemy job store ('persistent', table
+apscheduler_jobs), so a run that falls inside a deploy/restart is still
+executed when the scheduler comes back, within SCHEDULER_MISFIRE_GRACE
+seconds. High-frequency interval jobs stay in memory. Every recorded run is
+written to scheduler_runs (admin page: /admin/scheduler-runs).
+
+Attendance recap jobs are generated from the timeslots table (one per
+TimeSlot, see _recap_job_specs) and re-synced periodically, so adding or
+moving a session needs no code change.
 """
+import atexit
+import functools
 import os
 import logging
-from datetime import date, timedelta
+import time
+from datetime import date, datetime, timedelta
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.util import obj_to_ref
 import pytz
 
 # Configure logging
@@ -20,409 +41,577 @@ TIMEZONE = pytz.timezone('Asia/Jakarta')
 # Scheduler instance (singleton)
 scheduler = None
 
+# Flask app the jobs run in (set by init_scheduler)
+_app = None
+
+# Leader election for this process (set by init_scheduler)
+_elector = None
+
+
+# Table used by the persistent APScheduler job store (created by migration)
+JOBSTORE_TABLE = 'apscheduler_jobs'
+
+
+def _job_defaults():
+    """misfire_grace_time / coalesce / max_instances for jobs that do not set their own"""
+    return dict(_app.config['SCHEDULER_JOB_DEFAULTS'])
+
 
 def get_scheduler():
-    """Get or create scheduler instance."""
+    """Get or create scheduler instance (needs the scheduler app, see init_scheduler)."""
     global scheduler
     if scheduler is None:
-        scheduler = BackgroundScheduler(timezone=TIMEZONE)
+        from app import db
+        
+        with _app.app_context():
+            engine = db.engine
+        scheduler = BackgroundScheduler(
+            timezone=TIMEZONE,
+            jobstores={
+                'default': MemoryJobStore(),
+                'persistent': SQLAlchemyJobStore(engine=engine, tablename=JOBSTORE_TABLE),
+            },
+            job_defaults=_job_defaults(),
+        )
     return scheduler
 
 
+def _record_run_start(job_name):
+    """Insert a 'running' row; own connection so the job's session is untouched"""
+    from app import db
+    from app.models import SchedulerRun
+    
+    try:
+        with db.engine.begin() as conn:
+            return conn.execute(SchedulerRun.__table__.insert().values(
+                job_id=job_name, status='running', started_at=datetime.utcnow(), pid=os.getpid()
+            )).inserted_primary_key[0]
+    except Exception as e:
+        logger.warning(f"[Scheduler] Gagal mencatat run {job_name}: {e}")
+        return None
+
+
+def _record_run_end(run_id, started, status, stats=None, error=None):
+    from app import db
+    from app.models import SchedulerRun
+    
+    if run_id is None:
+        return
+    stats = stats if isinstance(stats, dict) else {}
+    values = {
+        'status': status,
+        'finished_at': datetime.utcnow(),
+        'duration_ms': int((time.perf_counter() - started) * 1000),
+        'rows_scanned': stats.get('rows_scanned'),
+        'messages_sent': stats.get('messages_sent'),
+        'error': error[:2000] if error else None,
+    }
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(SchedulerRun.__table__.update().where(SchedulerRun.id == run_id).values(**values))
+    except Exception as e:
+        logger.warning(f"[Scheduler] Gagal menyimpan hasil run {run_id}: {e}")
+
+
+def _is_idle(stats):
+    return not (isinstance(stats, dict) and (stats.get('rows_scanned') or stats.get('messages_sent')))
+
+
+def with_app_context(func=None, *, record=True, record_idle=True):
+    """
+    Run a job inside the scheduler's app context.
+    Pushing a context on the existing app takes well under a millisecond;
+    create_app() per run took ~75ms and built a new engine/pool each time.
+    
+    With `record`, each run is stored in scheduler_runs (status, duration
+    and the 'rows_scanned' / 'messages_sent' of the dict the job returns).
+    `record_idle=False` drops runs that did no work (frequent interval jobs).
+    """
+    if func is None:
+        return functools.partial(with_app_context, record=record, record_idle=record_idle)
+    
+    job_name = func.__name__.removeprefix('job_')
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _app is None:
+            raise RuntimeError('Scheduler app not set; call init_scheduler(app) first')
+        started = time.perf_counter()
+        with _app.app_context():
+            logger.debug(f"[Scheduler] {func.__name__}: app context ready in "
+                         f"{(time.perf_counter() - started) * 1000:.2f}ms")
+            if not record:
+                return func(*args, **kwargs)
+            
+            params = [str(a) for a in args] + [f"{k}={v}" for k, v in kwargs.items()]
+            name = f"{job_name}({', '.join(params)})" if params else job_name
+            run_id = _record_run_start(name) if record_idle else None
+            try:
+                stats = func(*args, **kwargs)
+            except Exception as e:
+                if run_id is None:
+                    run_id = _record_run_start(name)
+                _record_run_end(run_id, started, 'failed', error=f"{type(e).__name__}: {e}")
+                raise
+            if run_id is None and not _is_idle(stats):
+                run_id = _record_run_start(name)
+            if run_id is not None:
+                _record_run_end(run_id, started, 'success', stats)
+            return stats
+    return wrapper
+
+
+def purge_scheduler_runs(days=None):
+    """Delete run history older than SCHEDULER_RUN_RETENTION_DAYS"""
+    from app import db
+    from app.models import SchedulerRun
+    
+    days = days or _app.config.get('SCHEDULER_RUN_RETENTION_DAYS', 30)
+    deleted = SchedulerRun.query.filter(
+        SchedulerRun.started_at < datetime.utcnow() - timedelta(days=days)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+@with_app_context
 def job_student_reminder_h1():
     """
     Send H-1 reminders to all students who have bookings tomorrow.
     Runs daily at 18:00 WIB.
     """
-    from app import create_app, db
-    from app.models import Booking, User
-    from app.services.notifications import send_student_reminder_h1
+    from app.services.notification_batch import queue_student_reminders_h1
     
-    app = create_app()
-    with app.app_context():
-        tomorrow = date.today() + timedelta(days=1)
-        
-        # Find all bookings for tomorrow
-        bookings = Booking.query.filter_by(
-            date=tomorrow,
-            status='booked'
-        ).all()
-        
-        # Group bookings by student
-        student_bookings = {}
-        for booking in bookings:
-            student_id = booking.enrollment.student_id
-            if student_id not in student_bookings:
-                student_bookings[student_id] = []
-            student_bookings[student_id].append(booking)
-        
-        # Send reminders
-        sent_count = 0
-        for student_id, bookings_list in student_bookings.items():
-            student = User.query.get(student_id)
-            if student and send_student_reminder_h1(student, bookings_list):
-                sent_count += 1
-        
-        logger.info(f"[H-1 Student] Sent {sent_count} reminders for {tomorrow}")
+    result = queue_student_reminders_h1()
+    logger.info(f"[H-1 Student] Queued {result['queued']} reminders in {result['total_ms']}ms")
+    return {'rows_scanned': result['bookings'], 'messages_sent': result['queued']}
 
 
+@with_app_context
 def job_student_reminder_hday():
     """
     Send same-day morning reminders to all students who have bookings today.
     Runs daily at 07:00 WIB.
     """
-    from app import create_app, db
-    from app.models import Booking, User
-    from app.services.notifications import send_student_reminder_hday
+    from app.services.notification_batch import queue_student_reminders_hday
     
-    app = create_app()
-    with app.app_context():
-        today = date.today()
-        
-        # Find all bookings for today
-        bookings = Booking.query.filter_by(
-            date=today,
-            status='booked'
-        ).all()
-        
-        # Group bookings by student
-        student_bookings = {}
-        for booking in bookings:
-            student_id = booking.enrollment.student_id
-            if student_id not in student_bookings:
-                student_bookings[student_id] = []
-            student_bookings[student_id].append(booking)
-        
-        # Send reminders
-        sent_count = 0
-        for student_id, bookings_list in student_bookings.items():
-            student = User.query.get(student_id)
-            if student and send_student_reminder_hday(student, bookings_list):
-                sent_count += 1
-        
-        logger.info(f"[H-Day Student] Sent {sent_count} reminders for {today}")
+    result = queue_student_reminders_hday()
+    logger.info(f"[H-Day Student] Queued {result['queued']} reminders in {result['total_ms']}ms")
+    return {'rows_scanned': result['bookings'], 'messages_sent': result['queued']}
 
 
+@with_app_context
 def job_teacher_reminder_h1():
     """
     Send H-1 reminders to all teachers who have teaching sessions tomorrow.
     Runs daily at 18:00 WIB.
     """
-    from app import create_app, db
-    from app.models import Booking, User
-    from app.services.notifications import send_teacher_reminder_h1
+    from app.services.notification_batch import queue_teacher_reminders_h1
     
-    app = create_app()
-    with app.app_context():
-        tomorrow = date.today() + timedelta(days=1)
-        
-        # Find all bookings for tomorrow
-        bookings = Booking.query.filter_by(
-            date=tomorrow,
-            status='booked'
-        ).all()
-        
-        # Group bookings by teacher
-        teacher_bookings = {}
-        for booking in bookings:
-            teacher_id = booking.teacher_id
-            if teacher_id:
-                if teacher_id not in teacher_bookings:
-                    teacher_bookings[teacher_id] = []
-                teacher_bookings[teacher_id].append(booking)
-        
-        # Send reminders
-        sent_count = 0
-        for teacher_id, bookings_list in teacher_bookings.items():
-            teacher = User.query.get(teacher_id)
-            if teacher and send_teacher_reminder_h1(teacher, bookings_list):
-                sent_count += 1
-        
-        logger.info(f"[H-1 Teacher] Sent {sent_count} reminders for {tomorrow}")
+    result = queue_teacher_reminders_h1()
+    logger.info(f"[H-1 Teacher] Queued {result['queued']} reminders in {result['total_ms']}ms")
+    return {'rows_scanned': result['bookings'], 'messages_sent': result['queued']}
 
 
+@with_app_context
 def job_teacher_weekly_summary():
     """
     Send weekly schedule summary to all teachers.
     Runs every Sunday at 07:00 WIB.
     """
-    from app import create_app, db
-    from app.models import Booking, User
-    from app.services.notifications import send_teacher_weekly_summary
+    from app.services.notification_batch import queue_teacher_weekly_summaries
     
-    app = create_app()
-    with app.app_context():
-        today = date.today()
-        week_start = today
-        week_end = today + timedelta(days=7)
-        
-        # Find all teachers
-        teachers = User.query.filter_by(role='teacher', is_active=True).all()
-        
-        sent_count = 0
-        for teacher in teachers:
-            # Get all bookings for this teacher in the coming week
-            bookings = Booking.query.filter(
-                Booking.teacher_id == teacher.id,
-                Booking.date >= week_start,
-                Booking.date < week_end,
-                Booking.status == 'booked'
-            ).order_by(Booking.date, Booking.timeslot_id).all()
-            
-            if not bookings:
-                continue
-            
-            # Group by date
-            weekly_bookings = {}
-            for booking in bookings:
-                if booking.date not in weekly_bookings:
-                    weekly_bookings[booking.date] = []
-                weekly_bookings[booking.date].append(booking)
-            
-            if send_teacher_weekly_summary(teacher, weekly_bookings):
-                sent_count += 1
-        
-        logger.info(f"[Weekly Teacher] Sent {sent_count} weekly summaries")
+    result = queue_teacher_weekly_summaries()
+    logger.info(f"[Weekly Teacher] Queued {result['queued']} weekly summaries in {result['total_ms']}ms")
+    return {'rows_scanned': result['bookings'], 'messages_sent': result['queued']}
 
 
+@with_app_context
 def job_attendance_recap(timeslot_id):
     """
     Send attendance recap for a specific timeslot.
     Groups attendance by MasterClass/ProgramClass with teacher details.
+    Scheduled per TimeSlot, ATTENDANCE_RECAP_DELAY_MINUTES after it ends.
     """
     import os
-    from app import create_app, db
-    from app.models import Attendance, Booking, TimeSlot, User
-    from app.utils.whatsapp import send_wa_message
+    from sqlalchemy import select
+    from sqlalchemy.orm import configure_mappers, contains_eager, joinedload
+    from app import db
+    from app.models import Attendance, Booking, ClassEnrollment, Enrollment, ProgramClass, TimeSlot
+    from app.services.outbound_messages import enqueue_wa_message
     
-    app = create_app()
-    with app.app_context():
-        today = date.today()
-        timeslot = TimeSlot.query.get(timeslot_id)
-        
-        if not timeslot:
-            logger.warning(f"[Attendance Recap] Timeslot {timeslot_id} not found")
-            return
-        
-        # Get all attendance records for today's timeslot
-        attendances = Attendance.query.join(
-            Booking, Attendance.booking_id == Booking.id
-        ).filter(
+    # The session this run reports on (a recap past midnight covers yesterday)
+    today = (datetime.now() - timedelta(minutes=_app.config.get('ATTENDANCE_RECAP_DELAY_MINUTES', 90))).date()
+    timeslot = db.session.get(TimeSlot, timeslot_id)
+    
+    if not timeslot:
+        logger.warning(f"[Attendance Recap] Timeslot {timeslot_id} not found")
+        return {'rows_scanned': 0}
+    
+    # All attendance records for today's timeslot with everything the message
+    # reads, in one query (Attendance.booking is a backref: configure mappers first)
+    configure_mappers()
+    attendances = db.session.scalars(
+        select(Attendance).join(Attendance.booking).options(
+            contains_eager(Attendance.booking).options(
+                joinedload(Booking.class_enrollment).joinedload(ClassEnrollment.program_class)
+                .joinedload(ProgramClass.master_class),
+                joinedload(Booking.teacher),
+                joinedload(Booking.enrollment).joinedload(Enrollment.student),
+            )
+        ).where(
             Booking.date == today,
             Booking.timeslot_id == timeslot_id
-        ).all()
+        ).order_by(Attendance.id)
+    ).unique().all()
+    
+    if not attendances:
+        logger.info(f"[Attendance Recap] No attendance for {timeslot.name} today")
+        return {'rows_scanned': 0}
+    
+    # Group by class (via ClassEnrollment -> ProgramClass)
+    class_data = {}
+    for att in attendances:
+        booking = att.booking
+        
+        # Get class name from ClassEnrollment or fallback
+        class_name = "Kelas Umum"
+        if booking.class_enrollment and booking.class_enrollment.program_class:
+            class_name = booking.class_enrollment.program_class.display_name
+        
+        # Get teacher name
+        teacher_name = booking.teacher.name if booking.teacher else "Unknown"
+        
+        # Create class key combining class and teacher
+        class_key = f"{class_name}|{teacher_name}"
+        
+        if class_key not in class_data:
+            class_data[class_key] = {
+                'class_name': class_name,
+                'teacher_name': teacher_name,
+                'hadir': [],
+                'izin': [],
+                'alpha': []
+            }
+        
+        # Get student name and notes
+        student_name = booking.enrollment.student.name if booking.enrollment and booking.enrollment.student else "Unknown"
+        notes = att.notes or ""
+        
+        if att.status == 'Hadir':
+            class_data[class_key]['hadir'].append(student_name)
+        elif att.status == 'Izin':
+            class_data[class_key]['izin'].append({'name': student_name, 'notes': notes})
+        else:
+            class_data[class_key]['alpha'].append(student_name)
+    
+    # Build message
+    today_str = today.strftime("%A, %d %B %Y")
+    days_indo = {
+        'Monday': 'Senin', 'Tuesday': 'Selasa', 'Wednesday': 'Rabu',
+        'Thursday': 'Kamis', 'Friday': 'Jumat', 'Saturday': 'Sabtu', 'Sunday': 'Minggu'
+    }
+    day_name = today.strftime("%A")
+    today_str_indo = f"{days_indo.get(day_name, day_name)}, {today.strftime('%d %B %Y')}"
+    
+    message_lines = [
+        f"📋 *REKAP {timeslot.name.upper()}*",
+        f"📅 {today_str_indo}",
+        f"🕐 {timeslot.start_time.strftime('%H:%M')} - {timeslot.end_time.strftime('%H:%M')}",
+        "",
+        "━━━━━━━━━━━━━━━━━━━━━"
+    ]
+    
+    total_hadir = 0
+    total_izin = 0
+    total_alpha = 0
+    
+    # Add each class section
+    for class_key, data in class_data.items():
+        hadir_count = len(data['hadir'])
+        izin_count = len(data['izin'])
+        alpha_count = len(data['alpha'])
         
-        if not attendances:
-            logger.info(f"[Attendance Recap] No attendance for {timeslot.name} today")
-            return
+        total_hadir += hadir_count
+        total_izin += izin_count
+        total_alpha += alpha_count
         
-        # Group by class (via ClassEnrollment -> ProgramClass)
-        class_data = {}
-        for att in attendances:
-            booking = att.booking
-            
-            # Get class name from ClassEnrollment or fallback
-            class_name = "Kelas Umum"
-            if booking.class_enrollment and booking.class_enrollment.program_class:
-                class_name = booking.class_enrollment.program_class.display_name
-            
-            # Get teacher name
-            teacher_name = booking.teacher.name if booking.teacher else "Unknown"
-            
-            # Create class key combining class and teacher
-            class_key = f"{class_name}|{teacher_name}"
-            
-            if class_key not in class_data:
-                class_data[class_key] = {
-                    'class_name': class_name,
-                    'teacher_name': teacher_name,
-                    'hadir': [],
-                    'izin': [],
-                    'alpha': []
-                }
-            
-            # Get student name and notes
-            student_name = booking.enrollment.student.name if booking.enrollment and booking.enrollment.student else "Unknown"
-            notes = att.notes or ""
-            
-            if att.status == 'Hadir':
-                class_data[class_key]['hadir'].append(student_name)
-            elif att.status == 'Izin':
-                class_data[class_key]['izin'].append({'name': student_name, 'notes': notes})
-            else:
-                class_data[class_key]['alpha'].append(student_name)
+        message_lines.append("")
+        message_lines.append(f"👗 *{data['class_name'].upper()}*")
+        message_lines.append(f"👩‍🏫 Pengajar: {data['teacher_name']}")
+        message_lines.append(f"✅ Hadir: {hadir_count} | ⚠️ Izin: {izin_count} | ❌ Alpha: {alpha_count}")
+        message_lines.append("")
+        message_lines.append("📝 Detail:")
         
-        # Build message
-        today_str = today.strftime("%A, %d %B %Y")
-        days_indo = {
-            'Monday': 'Senin', 'Tuesday': 'Selasa', 'Wednesday': 'Rabu',
-            'Thursday': 'Kamis', 'Friday': 'Jumat', 'Saturday': 'Sabtu', 'Sunday': 'Minggu'
-        }
-        day_name = today.strftime("%A")
-        today_str_indo = f"{days_indo.get(day_name, day_name)}, {today.strftime('%d %B %Y')}"
+        # List hadir
+        for name in data['hadir']:
+            message_lines.append(f"• {name} ✅")
         
-        message_lines = [
-            f"📋 *REKAP {timeslot.name.upper()}*",
-            f"📅 {today_str_indo}",
-            f"🕐 {timeslot.start_time.strftime('%H:%M')} - {timeslot.end_time.strftime('%H:%M')}",
-            "",
-            "━━━━━━━━━━━━━━━━━━━━━"
-        ]
+        # List izin with notes
+        for item in data['izin']:
+            if item['notes']:
+                message_lines.append(f"• {item['name']} ⚠️ ({item['notes']})")
+            else:
+                message_lines.append(f"• {item['name']} ⚠️")
         
-        total_hadir = 0
-        total_izin = 0
-        total_alpha = 0
+        # List alpha
+        for name in data['alpha']:
+            message_lines.append(f"• {name} ❌")
         
-        # Add each class section
-        for class_key, data in class_data.items():
-            hadir_count = len(data['hadir'])
-            izin_count = len(data['izin'])
-            alpha_count = len(data['alpha'])
-            
-            total_hadir += hadir_count
-            total_izin += izin_count
-            total_alpha += alpha_count
-            
-            message_lines.append("")
-            message_lines.append(f"👗 *{data['class_name'].upper()}*")
-            message_lines.append(f"👩‍🏫 Pengajar: {data['teacher_name']}")
-            message_lines.append(f"✅ Hadir: {hadir_count} | ⚠️ Izin: {izin_count} | ❌ Alpha: {alpha_count}")
-            message_lines.append("")
-            message_lines.append("📝 Detail:")
-            
-            # List hadir
-            for name in data['hadir']:
-                message_lines.append(f"• {name} ✅")
-            
-            # List izin with notes
-            for item in data['izin']:
-                if item['notes']:
-                    message_lines.append(f"• {item['name']} ⚠️ ({item['notes']})")
-                else:
-                    message_lines.append(f"• {item['name']} ⚠️")
-            
-            # List alpha
-            for name in data['alpha']:
-                message_lines.append(f"• {name} ❌")
-            
-            message_lines.append("")
-            message_lines.append("━━━━━━━━━━━━━━━━━━━━━")
+        message_lines.append("")
+        message_lines.append("━━━━━━━━━━━━━━━━━━━━━")
+    
+    # Total summary
+    total = total_hadir + total_izin + total_alpha
+    hadir_pct = round(total_hadir / total * 100) if total > 0 else 0
+    izin_pct = round(total_izin / total * 100) if total > 0 else 0
+    alpha_pct = round(total_alpha / total * 100) if total > 0 else 0
+    
+    message_lines.append("")
+    message_lines.append(f"📊 *TOTAL {timeslot.name.upper()}:*")
+    message_lines.append(f"👥 Total Siswa: {total}")
+    message_lines.append(f"✅ Hadir: {total_hadir} ({hadir_pct}%)")
+    message_lines.append(f"⚠️ Izin: {total_izin} ({izin_pct}%)")
+    message_lines.append(f"❌ Alpha: {total_alpha} ({alpha_pct}%)")
+    
+    # Send to WA Group
+    wa_group_id = os.environ.get('WA_GROUP_ID', '')
+    if wa_group_id:
+        message = "\n".join(message_lines)
+        enqueue_wa_message(wa_group_id, message, source='attendance_recap')
+        logger.info(f"[Attendance Recap] Queued recap for {timeslot.name}: {total} students")
+    else:
+        logger.warning("[Attendance Recap] WA_GROUP_ID not set")
+    return {'rows_scanned': len(attendances), 'messages_sent': 1 if wa_group_id else 0}
+
+
+@with_app_context(record_idle=False)
+def job_dispatch_outbound_messages():
+    """
+    Send queued WA messages (outbound_messages).
+    Runs every WA_DISPATCH_INTERVAL seconds.
+    """
+    from app.services.outbound_messages import dispatch_outbound_messages
+    
+    counts = dispatch_outbound_messages()
+    return {'rows_scanned': sum(counts.values()), 'messages_sent': counts['sent']}
+
+
+@with_app_context(record=False)
+def job_refresh_wa_status():
+    """
+    Probe the WA bot and update the status cache shown on the admin dashboard.
+    Runs every WA_STATUS_REFRESH_INTERVAL seconds.
+    """
+    from app.services.wa_health import refresh_wa_status
+    
+    refresh_wa_status()
+
+
+@with_app_context
+def job_purge_scheduler_runs():
+    """
+    Delete scheduler run history older than SCHEDULER_RUN_RETENTION_DAYS.
+    Runs daily at 03:00 WIB.
+    """
+    return {'rows_scanned': purge_scheduler_runs()}
+
+
+@with_app_context
+def job_materialize_bookings():
+    """
+    Extend Booking rows of every active schedule to BOOKING_HORIZON_WEEKS ahead.
+    Runs daily at 01:00 WIB (before the 07:00 / 18:00 reminders read them).
+    """
+    from app import db
+    from app.services.booking_materializer import materialize_bookings
+    
+    result = materialize_bookings()
+    db.session.commit()
+    return {'rows_scanned': result['schedules']}
+
+
+@with_app_context(record=False)
+def job_sync_attendance_recap_jobs():
+    """
+    Re-sync the per-TimeSlot recap jobs with the timeslots table.
+    Runs every ATTENDANCE_RECAP_SYNC_INTERVAL seconds.
+    """
+    sync_attendance_recap_jobs()
+
+
+def sync_attendance_recap_jobs():
+    """Add/reschedule/remove recap jobs after timeslots changed (leader only)"""
+    if scheduler is None or not scheduler.running:
+        return False
+    _sync_jobs(scheduler, _recap_job_specs(_app), prefix=RECAP_JOB_PREFIX)
+    return True
+
+
+def _job_specs(app):
+    """All scheduled jobs as add_job() keyword arguments"""
+    return [
+        # H-1 reminders at 18:00 WIB
+        dict(func=job_student_reminder_h1, trigger=CronTrigger(hour=18, minute=0, timezone=TIMEZONE),
+             id='student_reminder_h1', jobstore='persistent'),
+        dict(func=job_teacher_reminder_h1, trigger=CronTrigger(hour=18, minute=0, timezone=TIMEZONE),
+             id='teacher_reminder_h1', jobstore='persistent'),
         
-        # Total summary
-        total = total_hadir + total_izin + total_alpha
-        hadir_pct = round(total_hadir / total * 100) if total > 0 else 0
-        izin_pct = round(total_izin / total * 100) if total > 0 else 0
-        alpha_pct = round(total_alpha / total * 100) if total > 0 else 0
+        # H-Day reminders at 07:00 WIB
+        dict(func=job_student_reminder_hday, trigger=CronTrigger(hour=7, minute=0, timezone=TIMEZONE),
+             id='student_reminder_hday', jobstore='persistent'),
         
-        message_lines.append("")
-        message_lines.append(f"📊 *TOTAL {timeslot.name.upper()}:*")
-        message_lines.append(f"👥 Total Siswa: {total}")
-        message_lines.append(f"✅ Hadir: {total_hadir} ({hadir_pct}%)")
-        message_lines.append(f"⚠️ Izin: {total_izin} ({izin_pct}%)")
-        message_lines.append(f"❌ Alpha: {total_alpha} ({alpha_pct}%)")
+        # Weekly summary on Sunday at 07:00 WIB
+        dict(func=job_teacher_weekly_summary,
+             trigger=CronTrigger(day_of_week='sun', hour=7, minute=0, timezone=TIMEZONE),
+             id='teacher_weekly_summary', jobstore='persistent'),
+        
+        # Rolling booking horizon at 01:00 WIB
+        dict(func=job_materialize_bookings, trigger=CronTrigger(hour=1, minute=0, timezone=TIMEZONE),
+             id='materialize_bookings', jobstore='persistent'),
+        
+        # Run history cleanup at 03:00 WIB
+        dict(func=job_purge_scheduler_runs, trigger=CronTrigger(hour=3, minute=0, timezone=TIMEZONE),
+             id='purge_scheduler_runs', jobstore='persistent'),
+        
+        # === OUTBOUND WA QUEUE ===
+        # In memory: runs every few seconds, nothing to catch up after a restart.
+        # max_instances=1: a long run (burst at 18:00) just skips the next tick
+        dict(func=job_dispatch_outbound_messages,
+             trigger=IntervalTrigger(seconds=app.config.get('WA_DISPATCH_INTERVAL', 10), timezone=TIMEZONE),
+             id='dispatch_outbound_messages', max_instances=1, coalesce=True),
+        
+        # === WA BOT STATUS CACHE ===
+        dict(func=job_refresh_wa_status,
+             trigger=IntervalTrigger(seconds=app.config.get('WA_STATUS_REFRESH_INTERVAL', 30), timezone=TIMEZONE),
+             id='refresh_wa_status', max_instances=1, coalesce=True),
         
-        # Send to WA Group
-        wa_group_id = os.environ.get('WA_GROUP_ID', '')
-        if wa_group_id:
-            message = "\n".join(message_lines)
-            send_wa_message(wa_group_id, message)
-            logger.info(f"[Attendance Recap] Sent recap for {timeslot.name}: {total} students")
-        else:
-            logger.warning("[Attendance Recap] WA_GROUP_ID not set")
+        # === ATTENDANCE RECAP JOBS ===
+        # Picks up added/changed/removed timeslots
+        dict(func=job_sync_attendance_recap_jobs,
+             trigger=IntervalTrigger(seconds=app.config.get('ATTENDANCE_RECAP_SYNC_INTERVAL', 300), timezone=TIMEZONE),
+             id='sync_attendance_recap_jobs', max_instances=1, coalesce=True),
+    ] + _recap_job_specs(app)
 
 
-def job_attendance_recap_pagi():
-    """Rekap Sesi Pagi - runs at 14:30 (H+2 jam dari 12:30)"""
-    job_attendance_recap(timeslot_id=1)
+# Recap jobs are generated from TimeSlot rows: attendance_recap_<timeslot id>
+RECAP_JOB_PREFIX = 'attendance_recap_'
 
 
-def job_attendance_recap_siang():
-    """Rekap Sesi Siang - runs at 18:30 (H+2 jam dari 16:30)"""
-    job_attendance_recap(timeslot_id=2)
+def _recap_job_specs(app):
+    """
+    One recap job per TimeSlot, ATTENDANCE_RECAP_DELAY_MINUTES after its
+    end_time (e.g. Sesi Pagi ending 12:30 -> 14:00 with the default 90).
+    """
+    from app import db
+    from app.models import TimeSlot
+    
+    delay = timedelta(minutes=app.config.get('ATTENDANCE_RECAP_DELAY_MINUTES', 90))
+    with app.app_context():
+        timeslots = db.session.scalars(db.select(TimeSlot).order_by(TimeSlot.id)).all()
+        specs = []
+        for ts in timeslots:
+            run_at = datetime.combine(date.min, ts.end_time) + delay
+            specs.append(dict(func=job_attendance_recap, args=[ts.id],
+                              trigger=CronTrigger(hour=run_at.hour, minute=run_at.minute, timezone=TIMEZONE),
+                              id=f'{RECAP_JOB_PREFIX}{ts.id}', name=f'Rekap {ts.name}', jobstore='persistent'))
+    return specs
+
 
+def _sync_jobs(sched, specs, prefix=''):
+    """
+    Make the scheduler match `specs` without losing pending runs: a stored
+    job whose function, trigger and args are unchanged keeps its
+    next_run_time, so a run missed while no process was leader still fires
+    on resume (within the misfire grace). New or changed jobs are (re)added;
+    persistent jobs whose id starts with `prefix` and that are no longer
+    defined are removed.
+    """
+    wanted = {spec['id'] for spec in specs}
+    for job in sched.get_jobs(jobstore='persistent'):
+        if job.id not in wanted and job.id.startswith(prefix):
+            sched.remove_job(job.id, jobstore='persistent')
+            logger.info(f"[Scheduler] Job {job.id} dihapus dari job store (tidak didefinisikan lagi)")
+    
+    for spec in specs:
+        spec = dict(spec)
+        func, trigger, jobstore = spec.pop('func'), spec.pop('trigger'), spec.get('jobstore', 'default')
+        existing = sched.get_job(spec['id'], jobstore=jobstore)
+        if (existing is not None and existing.func_ref == obj_to_ref(func)
+                and str(existing.trigger) == str(trigger)
+                and tuple(existing.args) == tuple(spec.get('args', ()))):
+            # Keep the stored schedule; refresh settings that may have changed (config, timeslot name)
+            changes = {key: spec.get(key, default) for key, default in _job_defaults().items()}
+            if 'name' in spec:
+                changes['name'] = spec['name']
+            changes = {key: value for key, value in changes.items() if getattr(existing, key) != value}
+            if changes:
+                sched.modify_job(existing.id, jobstore, **changes)
+            continue
+        sched.add_job(func, trigger, replace_existing=True, **spec)
 
-def job_attendance_recap_malam():
-    """Rekap Sesi Malam - runs at 23:00 (H+2 jam dari 21:00)"""
-    job_attendance_recap(timeslot_id=3)
+
+def _start_scheduler():
+    """Leader elected: start a fresh scheduler with all jobs"""
+    sched = get_scheduler()
+    sched.start(paused=True)
+    _sync_jobs(sched, _job_specs(_app))
+    sched.resume()
+    logger.info(f"Scheduler started with all notification jobs (pid {os.getpid()})")
+
+
+def _stop_scheduler():
+    """Leadership lost: stop running jobs here, another process takes over"""
+    global scheduler
+    if scheduler is not None and scheduler.running:
+        # APScheduler 3 processes due jobs once more after shutdown() (executor already
+        # closed), which would advance their stored next_run_time without running them.
+        # Detach the persistent store first so the next leader still sees those runs.
+        scheduler.remove_jobstore('persistent', shutdown=False)
+        scheduler.shutdown(wait=False)
+        logger.info(f"Scheduler stopped (pid {os.getpid()})")
+    scheduler = None
 
 
 def init_scheduler(app):
     """
-    Initialize and start the scheduler with all jobs.
+    Join the scheduler leader election; the process that wins runs the jobs.
     Should be called from Flask app factory.
+    
+    Only server processes join: gunicorn workers started with
+    SCHEDULER_WORKER=true, and the dev server's reloader child. flask CLI
+    commands (db upgrade, reminders run, bookings materialize, ...) create
+    the app too but never compete for leadership or start jobs.
+    
+    Leadership is a database advisory lock (file lock on SQLite, see
+    app/utils/leader.py), so exactly one process runs the scheduler and a
+    standby takes over within SCHEDULER_LEADER_POLL seconds if it dies.
     """
+    global _app, _elector
+    from app import db
+    from app.utils.leader import LeaderElector, make_leader_lock
+    
     # Check if scheduler should run
     if not os.environ.get('SCHEDULER_ENABLED', 'false').lower() == 'true':
         logger.info("Scheduler is disabled (SCHEDULER_ENABLED != true)")
         return None
     
-    # Prevent duplicate schedulers in multi-worker setup
-    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true' or not app.debug:
-        sched = get_scheduler()
-        
-        if sched.running:
-            logger.info("Scheduler already running")
-            return sched
-        
-        # Add jobs
-        # H-1 reminders at 18:00 WIB
-        sched.add_job(
-            job_student_reminder_h1,
-            CronTrigger(hour=18, minute=0, timezone=TIMEZONE),
-            id='student_reminder_h1',
-            replace_existing=True
-        )
-        
-        sched.add_job(
-            job_teacher_reminder_h1,
-            CronTrigger(hour=18, minute=0, timezone=TIMEZONE),
-            id='teacher_reminder_h1',
-            replace_existing=True
-        )
-        
-        # H-Day reminders at 07:00 WIB
-        sched.add_job(
-            job_student_reminder_hday,
-            CronTrigger(hour=7, minute=0, timezone=TIMEZONE),
-            id='student_reminder_hday',
-            replace_existing=True
-        )
-        
-        # Weekly summary on Sunday at 07:00 WIB
-        sched.add_job(
-            job_teacher_weekly_summary,
-            CronTrigger(day_of_week='sun', hour=7, minute=0, timezone=TIMEZONE),
-            id='teacher_weekly_summary',
-            replace_existing=True
-        )
-        
-        # === ATTENDANCE RECAP JOBS ===
-        # Rekap Sesi Pagi at 14:00 WIB (H+1.5 jam dari 12:30)
-        sched.add_job(
-            job_attendance_recap_pagi,
-            CronTrigger(hour=14, minute=0, timezone=TIMEZONE),
-            id='attendance_recap_pagi',
-            replace_existing=True
-        )
-        
-        # Rekap Sesi Siang at 18:00 WIB (H+1.5 jam dari 16:30)
-        sched.add_job(
-            job_attendance_recap_siang,
-            CronTrigger(hour=18, minute=0, timezone=TIMEZONE),
-            id='attendance_recap_siang',
-            replace_existing=True
-        )
-        
-        # Rekap Sesi Malam at 22:30 WIB (H+1.5 jam dari 21:00)
-        sched.add_job(
-            job_attendance_recap_malam,
-            CronTrigger(hour=22, minute=30, timezone=TIMEZONE),
-            id='attendance_recap_malam',
-            replace_existing=True
-        )
-        
-        sched.start()
-        logger.info("Scheduler started with all notification jobs")
-        return sched
+    # Dev server: only the reloader's child process (the parent just watches files)
+    is_dev_server = app.debug and os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if not (app.config.get('SCHEDULER_WORKER') or is_dev_server):
+        logger.info("Scheduler not started in this process (not a server worker, SCHEDULER_WORKER != true)")
+        return None
     
-    return None
+    if _elector is not None:
+        logger.info("Scheduler leader election already running")
+        return _elector
+    
+    _app = app
+    with app.app_context():
+        lock = make_leader_lock(app, db.engine)
+    _elector = LeaderElector(lock, on_elected=_start_scheduler, on_demoted=_stop_scheduler,
+                             interval=app.config.get('SCHEDULER_LEADER_POLL', 5))
+    _elector.start()
+    # Release the lock on clean shutdown so a standby takes over right away
+    atexit.register(_elector.stop)
+    return _elector
@@ -0,0 +1,39 @@
+"""
+Attendance Write Helpers
+Set-based updates used when attendance is recorded for many bookings at once.
+"""
+from sqlalchemy import case, update
+
+from app import db
+from app.models import ClassEnrollment
+
+
+def apply_class_enrollment_usage(sessions_used, izin_used):
+    """
+    Decrement sessions_remaining / increment izin_used for many class
+    enrollments with a single UPDATE statement.
+
+    Args:
+        sessions_used: {class_enrollment_id: number of 'Hadir' sessions}
+        izin_used: {class_enrollment_id: number of 'Izin' sessions}
+    """
+    ce_ids = set(sessions_used) | set(izin_used)
+    if not ce_ids:
+        return
+
+    values = {}
+    if sessions_used:
+        values['sessions_remaining'] = ClassEnrollment.sessions_remaining - case(
+            sessions_used, value=ClassEnrollment.id, else_=0
+        )
+    if izin_used:
+        values['izin_used'] = ClassEnrollment.izin_used + case(
+            izin_used, value=ClassEnrollment.id, else_=0
+        )
+
+    db.session.execute(
+        update(ClassEnrollment)
+        .where(ClassEnrollment.id.in_(ce_ids))
+        .values(**values)
+        .execution_options(synchronize_session='fetch')
+    )
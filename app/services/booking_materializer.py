@@ -0,0 +1,223 @@
+"""
+Booking Materializer
+Keeps real Booking rows for every active weekly schedule up to a rolling horizon.
+
+Onboarding, admin schedule changes and the nightly scheduler job
+(`job_materialize_bookings`, or `flask bookings materialize`) all call
+`materialize_bookings`, which books every active StudentSchedule up to
+BOOKING_HORIZON_WEEKS ahead. Dashboard, attendance form, teacher calendar
+and reminders then read Booking rows only, with the booking indexes.
+
+- Idempotent: rows go in with INSERT ... ON CONFLICT DO NOTHING on
+  (enrollment_id, date, timeslot_id), so existing bookings - booked, izin,
+  rescheduled, completed - are never touched and reruns insert nothing.
+- Rescheduled dates: the original date of an approved RescheduleRequest
+  becomes a 'rescheduled' marker instead of a booked session.
+- Bounded by the course: a class enrollment never has more upcoming
+  'booked' rows than its sessions_remaining (izin rows don't count, the
+  session shifts to the next week).
+- Enrollments leaving 'active' give their upcoming 'booked' rows back
+  (release_enrollment_bookings); reactivation books them again.
+- Teacher overrides stay a read-time lookup (load_override_index), as for
+  every other booking: rows carry the schedule's own teacher.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.orm import configure_mappers, joinedload
+
+from app import db
+from app.models import Booking, ClassEnrollment, Enrollment, RescheduleRequest, StudentSchedule
+from app.services.schedule_expansion import expand_schedules, weekday_dates
+from app.utils.db import insert_or_ignore
+
+logger = logging.getLogger(__name__)
+
+BOOKING_KEY = ['enrollment_id', 'date', 'timeslot_id']
+
+# Rows per INSERT statement
+INSERT_CHUNK_SIZE = 1000
+
+
+def _active_schedules(enrollment_ids=None):
+    """Schedules of active, started enrollments whose class still has sessions left"""
+    # StudentSchedule.enrollment/.class_enrollment are backrefs: not there yet in a fresh CLI/job process
+    configure_mappers()
+    stmt = select(StudentSchedule).join(
+        Enrollment, StudentSchedule.enrollment_id == Enrollment.id
+    ).outerjoin(
+        ClassEnrollment, StudentSchedule.class_enrollment_id == ClassEnrollment.id
+    ).options(
+        joinedload(StudentSchedule.enrollment),
+        joinedload(StudentSchedule.class_enrollment),
+    ).where(
+        Enrollment.status == 'active',
+        Enrollment.first_class_date.isnot(None),
+        (StudentSchedule.class_enrollment_id.is_(None)) | (
+            (ClassEnrollment.status == 'active') & (ClassEnrollment.sessions_remaining > 0)
+        )
+    ).order_by(StudentSchedule.id)
+    if enrollment_ids is not None:
+        stmt = stmt.where(StudentSchedule.enrollment_id.in_(enrollment_ids))
+    return db.session.scalars(stmt).unique().all()
+
+
+def materialize_bookings(horizon_weeks=None, today=None, enrollment_ids=None):
+    """
+    Insert the missing Booking rows from each active schedule's start
+    (max(today, first_class_date)) to today + horizon_weeks. Does not commit.
+
+    Returns counts for the job log: schedules, candidates, inserted
+    (booked / rescheduled markers) and elapsed ms.
+    """
+    started = time.perf_counter()
+    today = today or date.today()
+    horizon_weeks = horizon_weeks or current_app.config.get('BOOKING_HORIZON_WEEKS', 8)
+    end_date = today + timedelta(weeks=horizon_weeks)
+
+    schedules = _active_schedules(enrollment_ids)
+    result = {'schedules': len(schedules), 'candidates': 0, 'booked': 0, 'rescheduled': 0}
+    if not schedules:
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    schedule_enrollment_ids = {s.enrollment_id for s in schedules}
+
+    # Existing rows in the window (any status) and upcoming booked sessions per class
+    existing = set()
+    booked_per_class = defaultdict(int)
+    for enrollment_id, booking_date, timeslot_id, class_enrollment_id, status in db.session.execute(
+        select(Booking.enrollment_id, Booking.date, Booking.timeslot_id,
+               Booking.class_enrollment_id, Booking.status).where(
+            Booking.enrollment_id.in_(schedule_enrollment_ids),
+            Booking.date >= today
+        )
+    ):
+        if booking_date <= end_date:
+            existing.add((enrollment_id, booking_date, timeslot_id))
+        if status == 'booked' and class_enrollment_id:
+            booked_per_class[class_enrollment_id] += 1
+
+    # Original dates of approved reschedules -> marker rows
+    rescheduled = {
+        (r.student_schedule_id, r.original_date, r.original_timeslot_id)
+        for r in RescheduleRequest.query.filter(
+            RescheduleRequest.student_schedule_id.in_([s.id for s in schedules]),
+            RescheduleRequest.status == 'approved',
+            RescheduleRequest.original_date >= today,
+            RescheduleRequest.original_date <= end_date
+        )
+    }
+
+    # Candidate sessions in date order, so a class with few sessions left gets the earliest ones
+    candidates = [
+        (session_date, sched)
+        for session_date, sched in expand_schedules(schedules, today, end_date)
+        if session_date >= sched.enrollment.first_class_date
+        and (sched.enrollment_id, session_date, sched.timeslot_id) not in existing
+    ]
+    result['candidates'] = len(candidates)
+
+    rows = []
+    for session_date, sched in candidates:
+        key = (sched.enrollment_id, session_date, sched.timeslot_id)
+        if key in existing:
+            continue  # Two schedules on the same day/slot
+        status = 'booked'
+        if (sched.id, session_date, sched.timeslot_id) in rescheduled:
+            status = 'rescheduled'
+        elif sched.class_enrollment is not None:
+            if booked_per_class[sched.class_enrollment_id] >= (sched.class_enrollment.sessions_remaining or 0):
+                continue
+            booked_per_class[sched.class_enrollment_id] += 1
+        existing.add(key)
+        rows.append({
+            'enrollment_id': sched.enrollment_id,
+            'class_enrollment_id': sched.class_enrollment_id,
+            'date': session_date,
+            'timeslot_id': sched.timeslot_id,
+            'teacher_id': sched.teacher_id,
+            'subject_id': sched.subject_id,
+            'status': status,
+        })
+
+    for status in ('booked', 'rescheduled'):
+        status_rows = [row for row in rows if row['status'] == status]
+        for i in range(0, len(status_rows), INSERT_CHUNK_SIZE):
+            result[status] += len(insert_or_ignore(Booking, status_rows[i:i + INSERT_CHUNK_SIZE], BOOKING_KEY))
+
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"[Bookings] {result['booked']} sesi + {result['rescheduled']} marker reschedule dibuat "
+                f"dari {result['schedules']} jadwal s/d {end_date} ({result['elapsed_ms']}ms)")
+    return result
+
+
+def mark_rescheduled(enrollment_id, class_enrollment_id, original_date, timeslot_id, teacher_id):
+    """
+    Mark a scheduled session as moved: insert a 'rescheduled' row, or turn
+    the already materialized 'booked' row into one. Does not commit.
+    """
+    inserted = insert_or_ignore(Booking, {
+        'enrollment_id': enrollment_id,
+        'class_enrollment_id': class_enrollment_id,
+        'date': original_date,
+        'timeslot_id': timeslot_id,
+        'teacher_id': teacher_id,
+        'status': 'rescheduled'
+    }, BOOKING_KEY)
+    if not inserted:
+        booking = Booking.query.filter_by(
+            enrollment_id=enrollment_id, date=original_date, timeslot_id=timeslot_id
+        ).first()
+        if booking and booking.status == 'booked':
+            booking.status = 'rescheduled'
+
+
+def release_schedule_bookings(sched, today=None):
+    """
+    Delete the upcoming 'booked' rows generated for a schedule that is being
+    removed (same enrollment, slot and weekday, no attendance yet). Does not commit.
+    """
+    today = today or date.today()
+    criteria = [
+        Booking.enrollment_id == sched.enrollment_id,
+        Booking.timeslot_id == sched.timeslot_id,
+        Booking.status == 'booked',
+        Booking.date > today,
+        ~Booking.attendance.has()
+    ]
+    last_date = db.session.scalar(select(func.max(Booking.date)).where(*criteria))
+    if last_date is None:
+        return 0
+    dates = weekday_dates(today + timedelta(days=1), last_date, [sched.day_of_week])
+    bookings = Booking.query.filter(*criteria, Booking.date.in_(dates)).all()
+    for booking in bookings:
+        db.session.delete(booking)
+    return len(bookings)
+
+
+def release_enrollment_bookings(enrollment_id, today=None):
+    """
+    Delete the upcoming 'booked' rows of an enrollment that is no longer
+    active (no attendance yet, not the source of a reschedule request), so
+    reminders, the teacher calendar and the attendance form stop showing
+    them. materialize_bookings books them again on reactivation. Does not commit.
+    """
+    today = today or date.today()
+    referenced = select(RescheduleRequest.original_booking_id).where(
+        RescheduleRequest.original_booking_id.isnot(None)
+    )
+    bookings = Booking.query.filter(
+        Booking.enrollment_id == enrollment_id,
+        Booking.status == 'booked',
+        Booking.date > today,
+        ~Booking.attendance.has(),
+        Booking.id.not_in(referenced)
+    ).all()
+    for booking in bookings:
+        db.session.delete(booking)
+    return len(bookings)
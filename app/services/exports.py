@@ -0,0 +1,247 @@
+"""
+Excel Export Service
+Streaming .xlsx exports built on openpyxl write-only workbooks.
+
+Rows are written straight to temporary files on disk (write-only mode keeps
+no cell objects in memory) and the finished file is sent to the client in
+chunks, so memory stays flat regardless of row count. Bulk exports read
+their rows with `yield_per` so the database side streams as well.
+"""
+import tempfile
+from datetime import timedelta
+
+from flask import send_file
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+from sqlalchemy import func, select
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import (
+    Attendance, Booking, ClassEnrollment, Enrollment, Program, ProgramClass, TimeSlot,
+    User, Vendor, Voucher, VoucherType
+)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Rows fetched per round-trip for bulk exports
+EXPORT_BATCH_SIZE = 500
+
+
+def _named_styles():
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    center = Alignment(horizontal='center')
+    return [
+        NamedStyle(name='sfa_title', font=Font(bold=True, size=14)),
+        NamedStyle(name='sfa_subtitle', font=Font(size=12)),
+        NamedStyle(name='sfa_header', font=Font(bold=True, color='FFFFFF'), border=border, alignment=center,
+                   fill=PatternFill(start_color='D32F2F', end_color='D32F2F', fill_type='solid')),
+        NamedStyle(name='sfa_cell', border=border),
+        NamedStyle(name='sfa_cell_center', border=border, alignment=center),
+        NamedStyle(name='sfa_date', border=border, alignment=center, number_format='DD/MM/YYYY'),
+        NamedStyle(name='sfa_datetime', border=border, alignment=center, number_format='DD/MM/YYYY HH:MM'),
+        NamedStyle(name='sfa_money', border=border, number_format='#,##0'),
+        NamedStyle(name='sfa_total', font=Font(bold=True), border=border),
+        NamedStyle(name='sfa_total_center', font=Font(bold=True), border=border, alignment=center),
+    ]
+
+
+class XlsxExport:
+    """
+    Write-only workbook with the shared SFA named styles.
+
+    Usage:
+        export = XlsxExport()
+        ws = export.sheet('Rekap 2025', widths=[8, 30, 15])
+        export.title(ws, 'Rekap ...')
+        export.header(ws, ['No', 'Nama', 'Jumlah'])
+        export.row(ws, [1, 'Budi', 4], styles=['sfa_cell_center', 'sfa_cell', 'sfa_cell_center'])
+        return export.send('rekap.xlsx')
+
+    Rows must be written top to bottom (write-only mode cannot go back), and
+    column widths must be given when the sheet is created.
+    """
+
+    def __init__(self):
+        self.wb = Workbook(write_only=True)
+        for style in _named_styles():
+            self.wb.add_named_style(style)
+
+    def sheet(self, title, widths=()):
+        ws = self.wb.create_sheet(title=title[:31])  # Excel limit
+        for col, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+        return ws
+
+    def _cell(self, ws, value, style):
+        cell = WriteOnlyCell(ws, value=value)
+        if style:
+            cell.style = style
+        return cell
+
+    def row(self, ws, values, style='sfa_cell', styles=None):
+        """Append one row; `styles` (per column) overrides `style`"""
+        styles = styles or [style] * len(values)
+        ws.append([self._cell(ws, value, s) for value, s in zip(values, styles)])
+
+    def blank(self, ws):
+        ws.append([])
+
+    def title(self, ws, text, style='sfa_title'):
+        self.row(ws, [text], style=style)
+
+    def header(self, ws, headers):
+        self.row(ws, headers, style='sfa_header')
+
+    def save(self, out):
+        """Write the workbook to a binary file object"""
+        self.wb.save(out)
+
+    def send(self, filename):
+        """Save to an anonymous temp file and stream it back in chunks"""
+        output = tempfile.TemporaryFile()  # removed automatically when closed
+        self.save(output)
+        output.seek(0)
+        return send_file(output, as_attachment=True, download_name=filename, mimetype=XLSX_MIMETYPE)
+
+
+def _stream(stmt):
+    """Execute a Core select, fetching EXPORT_BATCH_SIZE rows at a time"""
+    return db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+
+# ==========================================
+# BULK EXPORTS
+# ==========================================
+
+def export_students_progress():
+    """All students with per-class progress (one row per class enrollment)"""
+    stmt = select(
+        User.name, User.email, User.phone_number,
+        Program.name, ProgramClass.name, Enrollment.status, ClassEnrollment.status,
+        ProgramClass.total_sessions, ClassEnrollment.sessions_remaining,
+        ClassEnrollment.izin_used, ProgramClass.max_izin,
+    ).select_from(ClassEnrollment).join(
+        Enrollment, ClassEnrollment.enrollment_id == Enrollment.id
+    ).join(
+        User, Enrollment.student_id == User.id
+    ).join(
+        ProgramClass, ClassEnrollment.program_class_id == ProgramClass.id
+    ).outerjoin(
+        Program, Enrollment.program_id == Program.id
+    ).where(
+        User.role == 'student'
+    ).order_by(User.name, User.id, Enrollment.id, ProgramClass.order, ClassEnrollment.id)
+
+    headers = ['No', 'Nama Siswa', 'Email', 'No. HP', 'Program', 'Kelas', 'Status Enrollment',
+               'Status Kelas', 'Total Sesi', 'Sesi Selesai', 'Sisa Sesi', 'Izin Dipakai', 'Maks Izin',
+               'Progress (%)']
+    styles = ['sfa_cell_center', 'sfa_cell', 'sfa_cell', 'sfa_cell', 'sfa_cell', 'sfa_cell',
+              'sfa_cell_center', 'sfa_cell_center'] + ['sfa_cell_center'] * 6
+
+    export = XlsxExport()
+    ws = export.sheet('Progress Siswa', widths=[6, 28, 28, 16, 22, 22, 16, 12, 10, 12, 10, 12, 10, 12])
+    export.title(ws, 'Data Siswa & Progress Kelas')
+    export.blank(ws)
+    export.header(ws, headers)
+
+    for idx, (name, email, phone, program, class_name, enroll_status, class_status,
+              total, remaining, izin_used, max_izin) in enumerate(_stream(stmt), 1):
+        total = total or 0
+        remaining = remaining or 0
+        completed = total - remaining
+        progress_pct = int(completed / total * 100) if total > 0 else 0
+        export.row(ws, [idx, name, email, phone, program, class_name, enroll_status, class_status,
+                        total, completed, remaining, izin_used or 0, max_izin, progress_pct], styles=styles)
+    return export
+
+
+def export_attendance(start, end, progress=None):
+    """All attendance with start <= date < end; `progress(percent)` is called per batch"""
+    Student = aliased(User)
+    Teacher = aliased(User)
+    stmt = select(
+        Attendance.date, TimeSlot.name, Teacher.name, Student.name, Program.name, ProgramClass.name,
+        Attendance.status, Attendance.notes,
+    ).select_from(Attendance).join(
+        Booking, Attendance.booking_id == Booking.id
+    ).outerjoin(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).outerjoin(
+        Teacher, Attendance.teacher_id == Teacher.id
+    ).outerjoin(
+        Enrollment, Booking.enrollment_id == Enrollment.id
+    ).outerjoin(
+        Student, Enrollment.student_id == Student.id
+    ).outerjoin(
+        Program, Enrollment.program_id == Program.id
+    ).outerjoin(
+        ClassEnrollment, Booking.class_enrollment_id == ClassEnrollment.id
+    ).outerjoin(
+        ProgramClass, ClassEnrollment.program_class_id == ProgramClass.id
+    ).where(
+        Attendance.date >= start,
+        Attendance.date < end
+    ).order_by(Attendance.date, TimeSlot.start_time, Attendance.id)
+
+    styles = ['sfa_cell_center', 'sfa_date', 'sfa_cell', 'sfa_cell', 'sfa_cell', 'sfa_cell', 'sfa_cell',
+              'sfa_cell_center', 'sfa_cell']
+
+    export = XlsxExport()
+    ws = export.sheet('Absensi', widths=[6, 12, 14, 24, 24, 22, 22, 10, 40])
+    export.title(ws, 'Data Absensi')
+    last_day = end - timedelta(days=1)
+    export.title(ws, f"Periode: {start.strftime('%d/%m/%Y')} - {last_day.strftime('%d/%m/%Y')}",
+                 style='sfa_subtitle')
+    export.blank(ws)
+    export.header(ws, ['No', 'Tanggal', 'Sesi', 'Pengajar', 'Siswa', 'Program', 'Kelas', 'Status', 'Catatan'])
+
+    total = None
+    if progress:
+        total = db.session.scalar(select(func.count(Attendance.id)).where(
+            Attendance.date >= start, Attendance.date < end))
+
+    for idx, values in enumerate(_stream(stmt), 1):
+        export.row(ws, [idx, *values], styles=styles)
+        if total and idx % EXPORT_BATCH_SIZE == 0:
+            progress(int(idx * 100 / total))
+    return export
+
+
+def export_vouchers(status=None, voucher_type_id=None):
+    """All vouchers (optionally filtered like the voucher list page)"""
+    Student = aliased(User)
+    ClaimVendor = aliased(Vendor)
+    stmt = select(
+        Voucher.code, VoucherType.name, Vendor.name, VoucherType.value, Student.name, Voucher.status,
+        Voucher.issued_at, Voucher.expires_at, Voucher.claimed_at, ClaimVendor.name, Voucher.notes,
+    ).select_from(Voucher).join(
+        VoucherType, Voucher.voucher_type_id == VoucherType.id
+    ).outerjoin(
+        Vendor, VoucherType.vendor_id == Vendor.id
+    ).outerjoin(
+        Student, Voucher.student_id == Student.id
+    ).outerjoin(
+        ClaimVendor, Voucher.claimed_by_vendor_id == ClaimVendor.id
+    ).order_by(Voucher.issued_at.desc(), Voucher.id.desc())
+    if status:
+        stmt = stmt.where(Voucher.status == status)
+    if voucher_type_id:
+        stmt = stmt.where(Voucher.voucher_type_id == voucher_type_id)
+
+    styles = ['sfa_cell_center', 'sfa_cell', 'sfa_cell', 'sfa_cell', 'sfa_money', 'sfa_cell',
+              'sfa_cell_center', 'sfa_datetime', 'sfa_date', 'sfa_datetime', 'sfa_cell', 'sfa_cell']
+
+    export = XlsxExport()
+    ws = export.sheet('Voucher', widths=[6, 18, 20, 20, 14, 24, 10, 17, 12, 17, 20, 30])
+    export.title(ws, 'Data Voucher')
+    export.blank(ws)
+    export.header(ws, ['No', 'Kode', 'Jenis', 'Vendor', 'Nilai', 'Siswa', 'Status', 'Diterbitkan',
+                       'Kadaluarsa', 'Diklaim', 'Diklaim Oleh', 'Catatan'])
+
+    for idx, values in enumerate(_stream(stmt), 1):
+        export.row(ws, [idx, *values], styles=styles)
+    return export
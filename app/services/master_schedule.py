@@ -0,0 +1,79 @@
+"""
+Master Schedule Service
+Loads the weekly schedule grid (day x timeslot) for the admin master schedule
+with one eager-loaded query, plus occupancy aggregates computed in SQL.
+"""
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models import Enrollment, StudentSchedule
+
+
+def load_schedule_grid(timeslots):
+    """
+    Returns {day_of_week: {timeslot_id: [StudentSchedule, ...]}} for all 7 days,
+    with enrollment.student, enrollment.program, subject and teacher preloaded.
+    """
+    schedule_map = {i: {slot.id: [] for slot in timeslots} for i in range(7)}
+
+    schedules = StudentSchedule.query.options(
+        joinedload(StudentSchedule.enrollment).joinedload(Enrollment.student),
+        joinedload(StudentSchedule.enrollment).joinedload(Enrollment.program),
+        joinedload(StudentSchedule.subject),
+        joinedload(StudentSchedule.teacher),
+    ).order_by(StudentSchedule.id).all()
+
+    for sched in schedules:
+        cell = schedule_map.get(sched.day_of_week, {}).get(sched.timeslot_id)
+        if cell is not None:
+            cell.append(sched)
+    return schedule_map
+
+
+def load_schedule_occupancy(timeslots):
+    """
+    Occupancy counts straight from SQL (no ORM rows):
+    GROUP BY day_of_week, timeslot_id, teacher_id.
+
+    Returns dict with:
+        total_schedules: int
+        day_totals: {day_of_week: count}
+        slot_counts: {day_of_week: {timeslot_id: count}}
+        slot_teachers: {day_of_week: {timeslot_id: number of teachers}}
+    """
+    slot_ids = {slot.id for slot in timeslots}
+
+    rows = db.session.query(
+        StudentSchedule.day_of_week,
+        StudentSchedule.timeslot_id,
+        StudentSchedule.teacher_id,
+        func.count(StudentSchedule.id)
+    ).group_by(
+        StudentSchedule.day_of_week,
+        StudentSchedule.timeslot_id,
+        StudentSchedule.teacher_id
+    ).all()
+
+    day_totals = {i: 0 for i in range(7)}
+    slot_counts = {i: defaultdict(int) for i in range(7)}
+    slot_teachers = {i: defaultdict(int) for i in range(7)}
+    total_schedules = 0
+
+    for day_of_week, timeslot_id, teacher_id, count in rows:
+        if day_of_week not in day_totals or timeslot_id not in slot_ids:
+            continue
+        total_schedules += count
+        day_totals[day_of_week] += count
+        slot_counts[day_of_week][timeslot_id] += count
+        if teacher_id is not None:
+            slot_teachers[day_of_week][timeslot_id] += 1
+
+    return {
+        'total_schedules': total_schedules,
+        'day_totals': day_totals,
+        'slot_counts': slot_counts,
+        'slot_teachers': slot_teachers,
+    }
@@ -0,0 +1,173 @@
+"""
+Batch Notifications
+Scheduler reminder fan-out: load, render and queue a whole job at once.
+
+Each job prefetches every booking it needs in one eager-loaded query,
+groups them per recipient in memory, renders all messages up front and
+queues them with a single INSERT (enqueue_wa_messages). Delivery itself -
+the bounded worker pool, the WA_SEND_RATE limit, retries - is handled by
+the outbound queue dispatcher (app/services/outbound_messages.py), which
+logs sent/failed counts per source.
+
+Every job takes `dry_run=True` to render without queueing; the result then
+carries the messages, which `flask reminders run --dry-run` prints along
+with the timings (handy for benchmarking against a seeded DB).
+"""
+import logging
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import select
+from sqlalchemy.orm import configure_mappers, joinedload
+
+from app import db
+from app.models import Booking, ClassEnrollment, Enrollment
+from app.services.notifications import (
+    format_phone_for_wa, render_student_reminder_h1, render_student_reminder_hday,
+    render_teacher_reminder_h1, render_teacher_weekly_summary
+)
+from app.services.outbound_messages import enqueue_wa_messages
+
+logger = logging.getLogger(__name__)
+
+
+def load_bookings(start, end):
+    """'booked' bookings with start <= date < end, with everything the templates read"""
+    # Booking.enrollment is a backref; it only exists once mappers are configured,
+    # which may not have happened yet in a fresh scheduler/CLI process
+    configure_mappers()
+    stmt = select(Booking).options(
+        joinedload(Booking.enrollment).joinedload(Enrollment.student),
+        joinedload(Booking.enrollment).joinedload(Enrollment.program),
+        joinedload(Booking.class_enrollment).joinedload(ClassEnrollment.program_class),
+        joinedload(Booking.timeslot),
+        joinedload(Booking.teacher),
+    ).where(
+        Booking.date >= start,
+        Booking.date < end,
+        Booking.status == 'booked'
+    ).order_by(Booking.date, Booking.timeslot_id, Booking.id)
+    return db.session.scalars(stmt).unique().all()
+
+
+def group_by_student(bookings):
+    """[(student, [bookings])] in first-booking order"""
+    groups = {}
+    for booking in bookings:
+        student = booking.enrollment.student if booking.enrollment else None
+        if student:
+            groups.setdefault(student.id, (student, []))[1].append(booking)
+    return list(groups.values())
+
+
+def group_by_teacher(bookings):
+    """[(teacher, [bookings])] in first-booking order"""
+    groups = {}
+    for booking in bookings:
+        if booking.teacher:
+            groups.setdefault(booking.teacher.id, (booking.teacher, []))[1].append(booking)
+    return list(groups.values())
+
+
+def group_by_teacher_and_date(bookings):
+    """[(teacher, {date: [bookings]})] for bookings taught by a teacher account"""
+    groups = {}
+    for booking in bookings:
+        teacher = booking.teacher
+        if teacher and teacher.role == 'teacher':
+            by_date = groups.setdefault(teacher.id, (teacher, {}))[1]
+            by_date.setdefault(booking.date, []).append(booking)
+    return list(groups.values())
+
+
+def run_batch(source, recipients, render, dry_run=False):
+    """
+    Render one message per (user, payload) in `recipients` with
+    render(user, payload) -> text or None, then queue them all at once.
+    Returns counts and timings for the job log; with `dry_run` nothing is
+    queued and the rendered (recipient, message) pairs are returned as well.
+    """
+    started = time.perf_counter()
+    items = []
+    skipped = 0
+    for user, payload in recipients:
+        message = render(user, payload)
+        if not message:
+            skipped += 1  # No phone number / nothing to send
+            continue
+        items.append((format_phone_for_wa(user.phone_number), message))
+    rendered = time.perf_counter()
+
+    queued = 0 if dry_run else enqueue_wa_messages(items, source=source)
+    finished = time.perf_counter()
+
+    result = {
+        'recipients': len(items) + skipped,
+        'queued': queued,
+        'skipped': skipped,
+        'render_ms': round((rendered - started) * 1000, 1),
+        'total_ms': round((finished - started) * 1000, 1),
+    }
+    if dry_run:
+        result['messages'] = items
+        logger.info(f"[Batch {source}] Dry run: {len(items)} pesan dirender, {skipped} dilewati "
+                    f"(render {result['render_ms']}ms)")
+    else:
+        logger.info(f"[Batch {source}] {queued} pesan diantrikan, {skipped} dilewati "
+                    f"(render {result['render_ms']}ms, total {result['total_ms']}ms)")
+    return result
+
+
+# ============================================================
+# REMINDER JOBS
+# ============================================================
+
+def _run_job(source, start, end, group, render, dry_run):
+    """Load [start, end), group per recipient and run the batch; adds bookings/load_ms"""
+    started = time.perf_counter()
+    bookings = load_bookings(start, end)
+    recipients = group(bookings)
+    load_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    result = run_batch(source, recipients, render, dry_run=dry_run)
+    result['bookings'] = len(bookings)
+    result['load_ms'] = load_ms
+    result['total_ms'] = round(result['total_ms'] + load_ms, 1)
+    return result
+
+
+def queue_student_reminders_h1(tomorrow=None, dry_run=False):
+    """H-1 reminder for every student with a booking tomorrow"""
+    tomorrow = tomorrow or date.today() + timedelta(days=1)
+    return _run_job('student_reminder_h1', tomorrow, tomorrow + timedelta(days=1), group_by_student,
+                    lambda student, items: render_student_reminder_h1(student, items, tomorrow), dry_run)
+
+
+def queue_student_reminders_hday(today=None, dry_run=False):
+    """Same-day reminder for every student with a booking today"""
+    today = today or date.today()
+    return _run_job('student_reminder_hday', today, today + timedelta(days=1), group_by_student,
+                    lambda student, items: render_student_reminder_hday(student, items, today), dry_run)
+
+
+def queue_teacher_reminders_h1(tomorrow=None, dry_run=False):
+    """H-1 reminder for every teacher teaching tomorrow"""
+    tomorrow = tomorrow or date.today() + timedelta(days=1)
+    return _run_job('teacher_reminder_h1', tomorrow, tomorrow + timedelta(days=1), group_by_teacher,
+                    lambda teacher, items: render_teacher_reminder_h1(teacher, items, tomorrow), dry_run)
+
+
+def queue_teacher_weekly_summaries(week_start=None, dry_run=False):
+    """Summary of the coming 7 days for every teacher with bookings in it"""
+    week_start = week_start or date.today()
+    return _run_job('teacher_weekly_summary', week_start, week_start + timedelta(days=7),
+                    group_by_teacher_and_date, render_teacher_weekly_summary, dry_run)
+
+
+# Job name -> runner, for `flask reminders run`
+REMINDER_JOBS = {
+    'student-h1': queue_student_reminders_h1,
+    'student-hday': queue_student_reminders_hday,
+    'teacher-h1': queue_teacher_reminders_h1,
+    'teacher-weekly': queue_teacher_weekly_summaries,
+}
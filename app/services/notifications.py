@@ -3,7 +3,7 @@ WhatsApp Notification Service
 Provides templated notifications for students and teachers.
 """
 from datetime import datetime, date, timedelta
-from app.utils.whatsapp import send_wa_message
+from app.services.outbound_messages import enqueue_wa_message
 from app import db
 from app.models import User, Booking, StudentSchedule, Enrollment, ClassEnrollment
 
@@ -38,15 +38,12 @@ def format_phone_for_wa(phone_number: str) -> str:
 # STUDENT NOTIFICATIONS
 # ============================================================
 
-def send_student_reminder_h1(student: User, bookings: list):
-    """
-    Send H-1 reminder to student about tomorrow's schedule.
-    Called by scheduler at 18:00 WIB.
-    """
+def render_student_reminder_h1(student: User, bookings: list, tomorrow: date = None):
+    """Message text for the H-1 student reminder (None if nothing to send)"""
     if not student.phone_number or not bookings:
-        return False
+        return None
     
-    tomorrow = date.today() + timedelta(days=1)
+    tomorrow = tomorrow or date.today() + timedelta(days=1)
     tomorrow_str = tomorrow.strftime("%d %B %Y")
     day_name = DAYS_ID[tomorrow.weekday()]
     
@@ -65,20 +62,28 @@ def send_student_reminder_h1(student: User, bookings: list):
         + "\n\n".join(schedule_lines) +
         f"\n\nSampai jumpa di kelas! 🎨"
     )
-    
-    target = format_phone_for_wa(student.phone_number)
-    return send_wa_message(target, message)
+    return message
 
 
-def send_student_reminder_hday(student: User, bookings: list):
+def send_student_reminder_h1(student: User, bookings: list):
     """
-    Send same-day morning reminder to student.
-    Called by scheduler at 07:00 WIB.
+    Send H-1 reminder to student about tomorrow's schedule.
+    Called by scheduler at 18:00 WIB (in bulk via notification_batch).
     """
-    if not student.phone_number or not bookings:
+    message = render_student_reminder_h1(student, bookings)
+    if not message:
         return False
     
-    today = date.today()
+    target = format_phone_for_wa(student.phone_number)
+    return enqueue_wa_message(target, message, source='student_reminder_h1') is not None
+
+
+def render_student_reminder_hday(student: User, bookings: list, today: date = None):
+    """Message text for the same-day student reminder (None if nothing to send)"""
+    if not student.phone_number or not bookings:
+        return None
+    
+    today = today or date.today()
     today_str = today.strftime("%d %B %Y")
     day_name = DAYS_ID[today.weekday()]
     
@@ -95,9 +100,20 @@ def send_student_reminder_hday(student: User, bookings: list):
         + "\n".join(schedule_lines) +
         f"\n\nSemangat belajar! 💪"
     )
+    return message
+
+
+def send_student_reminder_hday(student: User, bookings: list):
+    """
+    Send same-day morning reminder to student.
+    Called by scheduler at 07:00 WIB (in bulk via notification_batch).
+    """
+    message = render_student_reminder_hday(student, bookings)
+    if not message:
+        return False
     
     target = format_phone_for_wa(student.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='student_reminder_hday') is not None
 
 
 def send_student_schedule_change(student: User, old_date, new_date, class_name: str, reason: str = None):
@@ -125,22 +141,19 @@ def send_student_schedule_change(student: User, old_date, new_date, class_name:
     message += "\nTerima kasih! 🙏"
     
     target = format_phone_for_wa(student.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='student_schedule_change') is not None
 
 
 # ============================================================
 # TEACHER NOTIFICATIONS
 # ============================================================
 
-def send_teacher_reminder_h1(teacher: User, bookings: list):
-    """
-    Send H-1 reminder to teacher about tomorrow's teaching schedule.
-    Called by scheduler at 18:00 WIB.
-    """
+def render_teacher_reminder_h1(teacher: User, bookings: list, tomorrow: date = None):
+    """Message text for the H-1 teacher reminder (None if nothing to send)"""
     if not teacher.phone_number or not bookings:
-        return False
+        return None
     
-    tomorrow = date.today() + timedelta(days=1)
+    tomorrow = tomorrow or date.today() + timedelta(days=1)
     tomorrow_str = tomorrow.strftime("%d %B %Y")
     day_name = DAYS_ID[tomorrow.weekday()]
     
@@ -160,19 +173,29 @@ def send_teacher_reminder_h1(teacher: User, bookings: list):
         f"\n\nTotal: {len(bookings)} sesi\n"
         f"Terima kasih! 🙏"
     )
+    return message
+
+
+def send_teacher_reminder_h1(teacher: User, bookings: list):
+    """
+    Send H-1 reminder to teacher about tomorrow's teaching schedule.
+    Called by scheduler at 18:00 WIB (in bulk via notification_batch).
+    """
+    message = render_teacher_reminder_h1(teacher, bookings)
+    if not message:
+        return False
     
     target = format_phone_for_wa(teacher.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='teacher_reminder_h1') is not None
 
 
-def send_teacher_weekly_summary(teacher: User, weekly_bookings: dict):
+def render_teacher_weekly_summary(teacher: User, weekly_bookings: dict):
     """
-    Send weekly schedule summary to teacher.
-    Called by scheduler on Sunday 07:00 WIB.
+    Message text for the weekly teacher summary (None if nothing to send).
     weekly_bookings: {date_obj: [list of bookings]}
     """
     if not teacher.phone_number or not weekly_bookings:
-        return False
+        return None
     
     # Build weekly schedule
     schedule_by_day = []
@@ -196,7 +219,7 @@ def send_teacher_weekly_summary(teacher: User, weekly_bookings: dict):
         schedule_by_day.append("\n".join(lines))
     
     if not schedule_by_day:
-        return False
+        return None
     
     message = (
         f"📆 *Jadwal Mengajar Minggu Ini*\n\n"
@@ -205,9 +228,21 @@ def send_teacher_weekly_summary(teacher: User, weekly_bookings: dict):
         f"\n\n📊 Total: {total_sessions} sesi minggu ini\n"
         f"Semangat mengajar! 💪"
     )
+    return message
+
+
+def send_teacher_weekly_summary(teacher: User, weekly_bookings: dict):
+    """
+    Send weekly schedule summary to teacher.
+    Called by scheduler on Sunday 07:00 WIB (in bulk via notification_batch).
+    weekly_bookings: {date_obj: [list of bookings]}
+    """
+    message = render_teacher_weekly_summary(teacher, weekly_bookings)
+    if not message:
+        return False
     
     target = format_phone_for_wa(teacher.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='teacher_weekly_summary') is not None
 
 
 def send_teacher_schedule_change(teacher: User, student_name: str, old_date, new_date, class_name: str):
@@ -231,7 +266,7 @@ def send_teacher_schedule_change(teacher: User, student_name: str, old_date, new
     )
     
     target = format_phone_for_wa(teacher.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='teacher_schedule_change') is not None
 
 
 def send_teacher_new_student(teacher: User, student_name: str, program_name: str, schedule_info: str = None):
@@ -256,7 +291,7 @@ def send_teacher_new_student(teacher: User, student_name: str, program_name: str
     message += "\nSelamat mengajar! 🎨"
     
     target = format_phone_for_wa(teacher.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='teacher_new_student') is not None
 
 
 def send_teacher_student_izin(teacher: User, student_name: str, class_name: str, booking_date, reason: str = None):
@@ -284,4 +319,4 @@ def send_teacher_student_izin(teacher: User, student_name: str, class_name: str,
     message += "\nSesi akan digeser ke jadwal berikutnya."
     
     target = format_phone_for_wa(teacher.phone_number)
-    return send_wa_message(target, message)
+    return enqueue_wa_message(target, message, source='teacher_student_izin') is not None
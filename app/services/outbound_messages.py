@@ -0,0 +1,282 @@
+"""
+Outbound WhatsApp Queue
+Durable queue for WA notifications, sent by a background dispatcher.
+
+Request handlers and scheduler jobs call `enqueue_wa_message`, which stores
+the message in `outbound_messages` and returns immediately. The dispatcher
+(`dispatch_outbound_messages`, run every WA_DISPATCH_INTERVAL seconds by the
+scheduler or once via `flask wa-queue dispatch`) claims due messages and sends them
+through a bounded thread pool.
+
+- Per-recipient ordering: only the oldest unfinished message of a recipient
+  is eligible, so a recipient never has two messages in flight and a message
+  waiting on backoff holds back the ones queued after it.
+- Retries: failed sends are rescheduled with exponential backoff
+  (WA_RETRY_BASE_SECONDS * 2^(attempt-1), capped at MAX_BACKOFF_SECONDS).
+- Rate limit: sends across all worker threads are spaced to at most
+  WA_SEND_RATE messages per second, matching what the gateway tolerates.
+- Dead letters: after WA_MAX_ATTEMPTS the message is marked 'dead' and no
+  longer blocks the recipient; `flask wa-queue retry-dead` puts them back.
+
+Delivery is at-least-once: a worker that dies mid-send leaves the message in
+'sending', and it is released back to 'pending' after SENDING_TIMEOUT.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, exists, func, insert, select, update
+from sqlalchemy.orm import aliased
+
+from app import db
+from app.models import OutboundMessage
+from app.utils.whatsapp import WhatsAppSendError, get_wa_client
+
+logger = logging.getLogger(__name__)
+
+UNFINISHED_STATUSES = ('pending', 'sending')
+
+# Claimed messages per round; the dispatcher loops until the queue is drained
+DISPATCH_BATCH_SIZE = 50
+# A single dispatcher run stops claiming new rounds after this long
+DISPATCH_TIME_BUDGET = timedelta(seconds=50)
+# 'sending' rows older than this belong to a dead worker
+SENDING_TIMEOUT = timedelta(minutes=5)
+MAX_BACKOFF_SECONDS = 3600
+
+_executor = None
+_executor_lock = threading.Lock()
+_rate_limiter = None
+
+
+class _RateLimiter:
+    """Spaces calls to at most `rate` per second across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('WA_DISPATCH_WORKERS', 4),
+                                           thread_name_prefix='wa-dispatch')
+        return _executor
+
+
+def _get_rate_limiter(app):
+    global _rate_limiter
+    with _executor_lock:
+        if _rate_limiter is None:
+            _rate_limiter = _RateLimiter(app.config.get('WA_SEND_RATE', 5))
+        return _rate_limiter
+
+
+def enqueue_wa_message(recipient, message, source=None):
+    """
+    Queue a WA message for `recipient` (628xxx@s.whatsapp.net or a group id)
+    and commit. Returns the OutboundMessage, or None if there is no recipient.
+    """
+    if not recipient or not message:
+        return None
+    msg = OutboundMessage(recipient=recipient, message=message, source=source,
+                          status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+    db.session.add(msg)
+    db.session.commit()
+    return msg
+
+
+def enqueue_wa_messages(items, source=None):
+    """
+    Queue many messages in one INSERT and commit; `items` is an iterable of
+    (recipient, message). Entries without a recipient or text are skipped.
+    Returns the number queued.
+    """
+    now = datetime.utcnow()
+    rows = [
+        {'recipient': recipient, 'message': message, 'source': source,
+         'status': 'pending', 'attempts': 0, 'next_attempt_at': now, 'created_at': now}
+        for recipient, message in items if recipient and message
+    ]
+    if rows:
+        db.session.execute(insert(OutboundMessage), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def backoff_delay(app, attempts):
+    """Delay before retry number `attempts` (1-based)"""
+    base = app.config.get('WA_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS))
+
+
+def release_stale_messages(now=None):
+    """Put messages stuck in 'sending' (worker died) back to 'pending'"""
+    now = now or datetime.utcnow()
+    result = db.session.execute(
+        update(OutboundMessage).where(
+            OutboundMessage.status == 'sending',
+            OutboundMessage.locked_at < now - SENDING_TIMEOUT
+        ).values(status='pending', locked_at=None, next_attempt_at=now)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def _due_message_ids(now, limit):
+    """Oldest unfinished message per recipient, if it is due"""
+    earlier = aliased(OutboundMessage)
+    blocked = exists().where(and_(
+        earlier.recipient == OutboundMessage.recipient,
+        earlier.id < OutboundMessage.id,
+        earlier.status.in_(UNFINISHED_STATUSES)
+    ))
+    stmt = select(OutboundMessage.id).where(
+        OutboundMessage.status == 'pending',
+        OutboundMessage.next_attempt_at <= now,
+        ~blocked
+    ).order_by(OutboundMessage.next_attempt_at, OutboundMessage.id).limit(limit)
+    return db.session.scalars(stmt).all()
+
+
+def _claim(message_ids, now):
+    """
+    Move candidates to 'sending'. The conditional UPDATE makes the claim safe
+    when two dispatchers race: only one of them sees rowcount 1.
+    """
+    claimed = []
+    for message_id in message_ids:
+        result = db.session.execute(
+            update(OutboundMessage).where(
+                OutboundMessage.id == message_id,
+                OutboundMessage.status == 'pending'
+            ).values(status='sending', locked_at=now)
+        )
+        if result.rowcount == 1:
+            claimed.append(message_id)
+    db.session.commit()
+    return claimed
+
+
+def _send_one(app, message_id):
+    """Executor entry point: send one claimed message and record the outcome"""
+    with app.app_context():
+        msg = db.session.get(OutboundMessage, message_id)
+        if not msg or msg.status != 'sending':
+            return 'skipped', None
+
+        recipient, body, source = msg.recipient, msg.message, msg.source
+        # Don't hold a connection open while waiting on the WA bot
+        db.session.commit()
+
+        _get_rate_limiter(app).wait()
+        error = None
+        try:
+            get_wa_client().send_message(recipient, body)
+        except WhatsAppSendError as e:
+            error = str(e)
+        except Exception as e:
+            logger.exception(f"[WA Queue] Error tak terduga saat kirim pesan {message_id}")
+            error = f"{type(e).__name__}: {e}"
+
+        now = datetime.utcnow()
+        msg = db.session.get(OutboundMessage, message_id)
+        msg.attempts = (msg.attempts or 0) + 1
+        msg.locked_at = None
+        if error is None:
+            msg.status = 'sent'
+            msg.sent_at = now
+            msg.last_error = None
+            outcome = 'sent'
+        else:
+            msg.last_error = error[:1000]
+            if msg.attempts >= app.config.get('WA_MAX_ATTEMPTS', 6):
+                msg.status = 'dead'
+                outcome = 'dead'
+                logger.error(f"[WA Queue] Pesan {message_id} ke {recipient} gagal {msg.attempts}x, "
+                             f"dipindah ke dead letter: {error}")
+            else:
+                msg.status = 'pending'
+                msg.next_attempt_at = now + backoff_delay(app, msg.attempts)
+                outcome = 'retry'
+                logger.warning(f"[WA Queue] Pesan {message_id} gagal (percobaan {msg.attempts}), "
+                               f"dicoba lagi {msg.next_attempt_at:%H:%M:%S}: {error}")
+        db.session.commit()
+        return outcome, source
+
+
+def dispatch_outbound_messages(app=None):
+    """
+    One dispatcher run: claim due messages round by round and send them
+    through the thread pool until nothing is due or the time budget is spent.
+    Returns counts per outcome; outcomes per source are logged with throughput.
+    """
+    app = app or current_app._get_current_object()
+    counts = {'sent': 0, 'retry': 0, 'dead': 0, 'skipped': 0}
+    by_source = defaultdict(lambda: {'sent': 0, 'retry': 0, 'dead': 0, 'skipped': 0})
+    started = datetime.utcnow()
+    started_clock = time.monotonic()
+
+    with app.app_context():
+        release_stale_messages()
+        executor = _get_executor(app)
+
+        while datetime.utcnow() - started < DISPATCH_TIME_BUDGET:
+            now = datetime.utcnow()
+            claimed = _claim(_due_message_ids(now, DISPATCH_BATCH_SIZE), now)
+            if not claimed:
+                break
+            for outcome, source in executor.map(lambda message_id: _send_one(app, message_id), claimed):
+                counts[outcome] += 1
+                by_source[source or '-'][outcome] += 1
+
+    if counts['sent'] or counts['retry'] or counts['dead']:
+        elapsed = max(time.monotonic() - started_clock, 0.001)
+        send_stats = get_wa_client().metrics().get('/send/message', {})
+        for source, c in sorted(by_source.items()):
+            logger.info(f"[WA Queue] {source}: terkirim {c['sent']}, gagal {c['retry'] + c['dead']} "
+                        f"(dead {c['dead']})")
+        logger.info(f"[WA Queue] Terkirim {counts['sent']}, dijadwalkan ulang {counts['retry']}, "
+                    f"dead {counts['dead']} dalam {elapsed:.1f}s ({counts['sent'] / elapsed:.1f} pesan/detik, "
+                    f"latensi kirim avg {send_stats.get('avg_ms', 0)}ms, max {send_stats.get('max_ms', 0)}ms)")
+    return counts
+
+
+def queue_stats(source=None, since=None):
+    """Message count per status (optionally for one source / created since)"""
+    stmt = select(OutboundMessage.status, func.count(OutboundMessage.id)).group_by(OutboundMessage.status)
+    if source:
+        stmt = stmt.where(OutboundMessage.source == source)
+    if since:
+        stmt = stmt.where(OutboundMessage.created_at >= since)
+    rows = db.session.execute(stmt).all()
+    return {status: count for status, count in rows}
+
+
+def retry_dead_messages(message_ids=None):
+    """Move dead-lettered messages back to the queue (all, or the given ids)"""
+    stmt = update(OutboundMessage).where(OutboundMessage.status == 'dead')
+    if message_ids:
+        stmt = stmt.where(OutboundMessage.id.in_(message_ids))
+    result = db.session.execute(stmt.values(
+        status='pending', attempts=0, next_attempt_at=datetime.utcnow()
+    ))
+    db.session.commit()
+    return result.rowcount
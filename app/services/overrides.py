@@ -0,0 +1,53 @@
+"""
+Teacher Session Override Lookup
+Resolves substitute teachers for many sessions at once instead of querying
+TeacherSessionOverride per booking/session.
+"""
+from sqlalchemy.orm import joinedload
+
+from app.models import TeacherSessionOverride
+
+
+def load_override_index(teacher_ids, start_date, end_date):
+    """
+    Load all overrides for the given original teachers within [start_date, end_date].
+
+    Returns:
+        dict keyed by (original_teacher_id, date, timeslot_id) -> TeacherSessionOverride
+        (substitute_teacher already loaded)
+    """
+    teacher_ids = {tid for tid in teacher_ids if tid is not None}
+    if not teacher_ids or start_date is None or end_date is None:
+        return {}
+
+    overrides = TeacherSessionOverride.query.options(
+        joinedload(TeacherSessionOverride.substitute_teacher)
+    ).filter(
+        TeacherSessionOverride.original_teacher_id.in_(teacher_ids),
+        TeacherSessionOverride.date >= start_date,
+        TeacherSessionOverride.date <= end_date
+    ).all()
+
+    return {(o.original_teacher_id, o.date, o.timeslot_id): o for o in overrides}
+
+
+def apply_display_teacher(bookings):
+    """
+    Set booking.display_teacher / booking.is_substitute for a list of bookings
+    using a single override query for the whole list.
+    """
+    if not bookings:
+        return bookings
+
+    dates = [b.date for b in bookings]
+    index = load_override_index({b.teacher_id for b in bookings}, min(dates), max(dates))
+
+    for booking in bookings:
+        override = index.get((booking.teacher_id, booking.date, booking.timeslot_id))
+        if override:
+            booking.display_teacher = override.substitute_teacher
+            booking.is_substitute = True
+        else:
+            booking.display_teacher = booking.teacher
+            booking.is_substitute = False
+    return bookings
@@ -0,0 +1,174 @@
+"""
+Student Progress Loader
+Builds the dashboard progress structure (enrollments_data) for a student from a
+fixed number of grouped queries + eager loading, so the number of round trips
+does not grow with enrollments, class enrollments or attendance rows.
+"""
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db
+from app.models import (
+    Attendance, Booking, ClassEnrollment, Enrollment, Program, StudentSchedule
+)
+
+SESSION_HISTORY_LIMIT = 10
+
+
+def load_student_enrollments(student_id):
+    """
+    Load all enrollments of a student with everything the dashboard touches
+    (program classes, class enrollments, schedules) eagerly loaded.
+    """
+    return Enrollment.query.options(
+        joinedload(Enrollment.program).selectinload(Program.classes),
+        selectinload(Enrollment.class_enrollments).joinedload(ClassEnrollment.program_class),
+        selectinload(Enrollment.schedules).options(
+            joinedload(StudentSchedule.teacher),
+            joinedload(StudentSchedule.timeslot),
+            joinedload(StudentSchedule.class_enrollment).joinedload(ClassEnrollment.program_class),
+        ),
+    ).filter_by(student_id=student_id).order_by(Enrollment.id).all()
+
+
+def _enrollment_status_counts(enrollment_ids):
+    """{enrollment_id: {status: count}} for attendance of completed bookings"""
+    rows = db.session.query(
+        Booking.enrollment_id, Attendance.status, func.count(Attendance.id)
+    ).join(Attendance, Attendance.booking_id == Booking.id).filter(
+        Booking.enrollment_id.in_(enrollment_ids),
+        Booking.status == 'completed'
+    ).group_by(Booking.enrollment_id, Attendance.status).all()
+
+    counts = defaultdict(dict)
+    for enrollment_id, status, total in rows:
+        counts[enrollment_id][status] = total
+    return counts
+
+
+def _class_status_counts(class_enrollment_ids):
+    """{class_enrollment_id: {status: count}} for all attendance of a class enrollment"""
+    if not class_enrollment_ids:
+        return {}
+
+    rows = db.session.query(
+        Booking.class_enrollment_id, Attendance.status, func.count(Attendance.id)
+    ).join(Attendance, Attendance.booking_id == Booking.id).filter(
+        Booking.class_enrollment_id.in_(class_enrollment_ids)
+    ).group_by(Booking.class_enrollment_id, Attendance.status).all()
+
+    counts = defaultdict(dict)
+    for class_enrollment_id, status, total in rows:
+        counts[class_enrollment_id][status] = total
+    return counts
+
+
+def _session_history(enrollment_ids, limit=SESSION_HISTORY_LIMIT):
+    """
+    Latest `limit` attendance records per enrollment (completed bookings only),
+    fetched in one query using ROW_NUMBER() partitioned by enrollment.
+    """
+    ranked = db.session.query(
+        Attendance.id.label('attendance_id'),
+        func.row_number().over(
+            partition_by=Booking.enrollment_id,
+            order_by=(Attendance.date.desc(), Attendance.id.desc())
+        ).label('rn')
+    ).join(Booking, Attendance.booking_id == Booking.id).filter(
+        Booking.enrollment_id.in_(enrollment_ids),
+        Booking.status == 'completed'
+    ).subquery()
+
+    records = Attendance.query.join(
+        ranked, ranked.c.attendance_id == Attendance.id
+    ).options(
+        joinedload(Attendance.booking).options(
+            joinedload(Booking.subject),
+            joinedload(Booking.timeslot),
+            joinedload(Booking.teacher),
+        )
+    ).filter(ranked.c.rn <= limit).order_by(
+        Attendance.date.desc(), Attendance.id.desc()
+    ).all()
+
+    history = defaultdict(list)
+    for att in records:
+        booking = att.booking
+        history[booking.enrollment_id].append({
+            'date': att.date,
+            'subject': booking.subject.name if booking.subject else '-',
+            'timeslot': booking.timeslot.name if booking.timeslot else '-',
+            'status': att.status,
+            'notes': att.notes,
+            'teacher': booking.teacher.name if booking.teacher else '-'
+        })
+    return history
+
+
+def build_enrollments_progress(enrollments):
+    """
+    Build the per-enrollment progress dicts used by the student dashboard.
+    `enrollments` should come from load_student_enrollments() so relationship
+    access below does not trigger lazy loads.
+
+    'upcoming_schedule_sessions' is left for the caller to fill in.
+    """
+    if not enrollments:
+        return []
+
+    enrollment_ids = [e.id for e in enrollments]
+    class_enrollment_ids = [ce.id for e in enrollments for ce in e.class_enrollments]
+
+    enrollment_counts = _enrollment_status_counts(enrollment_ids)
+    class_counts = _class_status_counts(class_enrollment_ids)
+    history = _session_history(enrollment_ids)
+
+    enrollments_data = []
+    for enroll in enrollments:
+        counts = enrollment_counts.get(enroll.id, {})
+
+        # Izin count from class_enrollments.izin_used (not from Attendance status)
+        izin_count = sum(ce.izin_used for ce in enroll.class_enrollments)
+
+        # Calculate progress percentage
+        total_sessions = enroll.program.total_sessions
+        completed_sessions = total_sessions - enroll.sessions_remaining
+        progress_pct = int((completed_sessions / total_sessions) * 100) if total_sessions > 0 else 0
+
+        class_enrollments_data = []
+        for ce in enroll.class_enrollments:
+            ce_counts = class_counts.get(ce.id, {})
+            class_enrollments_data.append({
+                'id': ce.id,
+                'class_name': ce.program_class.name,
+                'sessions_remaining': ce.sessions_remaining,
+                'total_sessions': ce.program_class.total_sessions,
+                'max_izin': ce.program_class.max_izin,
+                'izin_used': ce.izin_used,
+                'izin_remaining': ce.izin_remaining,
+                'status': ce.status,
+                'is_batch': ce.program_class.is_batch_based,
+                'hadir': ce_counts.get('Hadir', 0),
+                'alpha': ce_counts.get('Alpha', 0)
+            })
+
+        enrollments_data.append({
+            'enrollment_id': enroll.id,
+            'program_name': enroll.program.name,
+            'program_id': enroll.program.id,
+            'status': enroll.status,
+            'completed_sessions': completed_sessions,
+            'total_sessions': total_sessions,
+            'remaining_sessions': enroll.sessions_remaining,
+            'progress_pct': progress_pct,
+            'hadir': counts.get('Hadir', 0),
+            'izin': izin_count,
+            'alpha': counts.get('Alpha', 0),
+            'session_history': history.get(enroll.id, []),
+            'class_enrollments': class_enrollments_data,
+            'upcoming_schedule_sessions': []
+        })
+
+    return enrollments_data
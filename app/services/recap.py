@@ -0,0 +1,155 @@
+"""
+Teacher Recap Service
+Session counts per teacher per month for the recap page and all recap exports.
+
+Counts are read from the `teacher_session_rollup` table, which is incremented
+whenever attendance is inserted (see record_teacher_sessions), decremented
+when an attended booking is deleted (forget_teacher_sessions), and can be
+rebuilt/verified against the live attendance aggregate with
+`flask recap-rollup`.
+"""
+from collections import Counter
+
+from sqlalchemy import extract, func
+
+from app import db
+from app.models import Attendance, TeacherSessionRollup
+from app.utils.db import insert_or_increment
+
+MONTH_NAMES = ['Januari', 'Februari', 'Maret', 'April', 'Mei', 'Juni',
+               'Juli', 'Agustus', 'September', 'Oktober', 'November', 'Desember']
+MONTH_ABBR = ['Jan', 'Feb', 'Mar', 'Apr', 'Mei', 'Jun', 'Jul', 'Ags', 'Sep', 'Okt', 'Nov', 'Des']
+
+
+def load_recap_matrix(year, teacher_ids=None, month=None):
+    """
+    Teacher x month session matrix:
+        {teacher_id: [jan, feb, ..., des]}
+
+    A session is one booking, counted once regardless of how many students
+    attended. Reads at most 12 rollup rows per teacher. If `month` is given,
+    only that month is loaded (other months stay 0).
+
+    Every id in `teacher_ids` is present in the result, with zeros if the
+    teacher had no sessions.
+    """
+    query = db.session.query(
+        TeacherSessionRollup.teacher_id,
+        TeacherSessionRollup.month,
+        TeacherSessionRollup.sessions
+    ).filter(TeacherSessionRollup.year == year)
+    if month is not None:
+        query = query.filter(TeacherSessionRollup.month == month)
+    if teacher_ids is not None:
+        teacher_ids = list(teacher_ids)
+        if not teacher_ids:
+            return {}
+        query = query.filter(TeacherSessionRollup.teacher_id.in_(teacher_ids))
+
+    matrix = {tid: [0] * 12 for tid in (teacher_ids or [])}
+    for teacher_id, month_num, sessions in query:
+        matrix.setdefault(teacher_id, [0] * 12)[month_num - 1] = sessions
+    return matrix
+
+
+def teacher_recap_rows(year, teacher_id):
+    """[{'month', 'month_name', 'sessions'}, ...] for 12 months of one teacher"""
+    counts = load_recap_matrix(year, [teacher_id])[teacher_id]
+    return [
+        {'month': m, 'month_name': MONTH_NAMES[m - 1], 'sessions': counts[m - 1]}
+        for m in range(1, 13)
+    ]
+
+
+def record_teacher_sessions(sessions):
+    """
+    Add newly inserted attendance to the rollup, in the caller's transaction.
+
+    Args:
+        sessions: iterable of (teacher_id, date), one per booking whose
+            attendance was actually inserted (not skipped on conflict)
+    """
+    increments = _month_counts(sessions)
+    insert_or_increment(TeacherSessionRollup, [
+        {'teacher_id': teacher_id, 'year': year, 'month': month, 'sessions': count}
+        for (teacher_id, year, month), count in increments.items()
+    ], ['teacher_id', 'year', 'month'], 'sessions')
+
+
+def forget_teacher_sessions(sessions):
+    """
+    Take sessions whose booking was deleted back out of the rollup, in the
+    caller's transaction. Same argument as record_teacher_sessions.
+    """
+    for (teacher_id, year, month), count in _month_counts(sessions).items():
+        TeacherSessionRollup.query.filter_by(
+            teacher_id=teacher_id, year=year, month=month
+        ).update({TeacherSessionRollup.sessions: TeacherSessionRollup.sessions - count},
+                 synchronize_session=False)
+
+
+def delete_teacher_rollup(teacher_id):
+    """Drop a teacher's rollup rows before the teacher is deleted. Caller commits."""
+    TeacherSessionRollup.query.filter_by(teacher_id=teacher_id).delete(synchronize_session=False)
+
+
+def _month_counts(sessions):
+    """Counter of (teacher_id, year, month) over (teacher_id, date) pairs"""
+    return Counter(
+        (teacher_id, session_date.year, session_date.month)
+        for teacher_id, session_date in sessions
+        if teacher_id is not None and session_date is not None
+    )
+
+
+# ==========================================
+# REBUILD / VERIFY
+# ==========================================
+
+def live_session_counts():
+    """{(teacher_id, year, month): sessions} aggregated from attendances (full scan)"""
+    year_col = extract('year', Attendance.date)
+    month_col = extract('month', Attendance.date)
+    rows = db.session.query(
+        Attendance.teacher_id, year_col, month_col,
+        func.count(func.distinct(Attendance.booking_id))
+    ).filter(
+        Attendance.teacher_id.isnot(None),
+        Attendance.date.isnot(None),
+        Attendance.booking_id.isnot(None)
+    ).group_by(Attendance.teacher_id, year_col, month_col)
+    return {(teacher_id, int(year), int(month)): count for teacher_id, year, month, count in rows}
+
+
+def rollup_session_counts():
+    """{(teacher_id, year, month): sessions} as stored in the rollup (zero rows omitted)"""
+    rows = db.session.query(
+        TeacherSessionRollup.teacher_id,
+        TeacherSessionRollup.year,
+        TeacherSessionRollup.month,
+        TeacherSessionRollup.sessions
+    ).filter(TeacherSessionRollup.sessions != 0)
+    return {(teacher_id, year, month): sessions for teacher_id, year, month, sessions in rows}
+
+
+def find_rollup_mismatches():
+    """[((teacher_id, year, month), rollup_sessions, live_sessions), ...] where they differ"""
+    live = live_session_counts()
+    stored = rollup_session_counts()
+    return [
+        (key, stored.get(key, 0), live.get(key, 0))
+        for key in sorted(live.keys() | stored.keys())
+        if stored.get(key, 0) != live.get(key, 0)
+    ]
+
+
+def rebuild_rollup():
+    """Replace the whole rollup with the live aggregate. Caller commits. Returns row count."""
+    live = live_session_counts()
+    TeacherSessionRollup.query.delete(synchronize_session=False)
+    if live:
+        db.session.execute(TeacherSessionRollup.__table__.insert(), [
+            {'teacher_id': teacher_id, 'year': year, 'month': month, 'sessions': count}
+            for (teacher_id, year, month), count in live.items()
+        ])
+    return len(live)
@@ -0,0 +1,192 @@
+"""
+Background Report Jobs
+Runs report builders (app/services/reports.py) outside the request.
+
+The admin submits (report, params) and gets a job id back; the job runs in a
+small per-process thread pool, writes the artifact under REPORT_DIR and keeps
+it for REPORT_JOB_TTL seconds. Job state lives in the `report_jobs` table so
+any gunicorn worker can answer the polling/download requests.
+
+Identical (report, params) requests while a job is queued/running, or while
+its artifact is still fresh, reuse that job instead of building again. A
+partial unique index (ux_report_jobs_active) keeps concurrent submissions
+from queueing the same report twice.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+from app.models import ReportJob
+from app.services.reports import build_report
+from app.utils.db import insert_or_ignore
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('REPORT_WORKERS', 2),
+                                           thread_name_prefix='report')
+        return _executor
+
+
+def get_report_dir(app=None):
+    app = app or current_app
+    path = app.config.get('REPORT_DIR') or os.path.join(app.instance_path, 'reports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def hash_params(report, params):
+    payload = json.dumps({'report': report, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def is_downloadable(job, now=None):
+    now = now or datetime.utcnow()
+    return (job.status == 'done' and job.expires_at is not None and job.expires_at > now
+            and job.file_path is not None and os.path.exists(job.file_path))
+
+
+def _remove_file(path):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def purge_expired_jobs():
+    """Delete expired artifacts and old failed jobs; fail jobs stuck past REPORT_JOB_TIMEOUT"""
+    now = datetime.utcnow()
+    ttl = timedelta(seconds=current_app.config.get('REPORT_JOB_TTL', 3600))
+    timeout = timedelta(seconds=current_app.config.get('REPORT_JOB_TIMEOUT', 900))
+
+    # Queued/running jobs whose worker died (e.g. gunicorn restart) never finish
+    ReportJob.query.filter(
+        ReportJob.status.in_(ACTIVE_STATUSES),
+        ReportJob.created_at < now - timeout
+    ).update({'status': 'failed', 'error': 'Timeout', 'finished_at': now}, synchronize_session=False)
+
+    expired = ReportJob.query.filter(db.or_(
+        db.and_(ReportJob.status == 'done', ReportJob.expires_at < now),
+        db.and_(ReportJob.status == 'failed', ReportJob.created_at < now - ttl),
+    )).all()
+    for job in expired:
+        _remove_file(job.file_path)
+        db.session.delete(job)
+    db.session.commit()
+    return len(expired)
+
+
+def _find_reusable_job(report, digest):
+    now = datetime.utcnow()
+    jobs = ReportJob.query.filter(
+        ReportJob.report == report,
+        ReportJob.params_hash == digest,
+        ReportJob.status.in_(ACTIVE_STATUSES + ('done',))
+    ).order_by(ReportJob.id.desc()).all()
+    for job in jobs:
+        if job.status in ACTIVE_STATUSES or is_downloadable(job, now):
+            return job
+    return None
+
+
+def submit_report_job(report, params, user_id=None):
+    """
+    Queue `report` with normalized `params` (see parse_report_params), or return
+    the existing job for the same request. Returns the ReportJob.
+    """
+    purge_expired_jobs()
+
+    digest = hash_params(report, params)
+    job = _find_reusable_job(report, digest)
+    if job:
+        return job
+
+    inserted = insert_or_ignore(ReportJob, {
+        'report': report,
+        'params': json.dumps(params, sort_keys=True),
+        'params_hash': digest,
+        'status': 'queued',
+        'progress': 0,
+        'requested_by': user_id,
+        'created_at': datetime.utcnow(),
+    }, ['report', 'params_hash'], index_where=ReportJob.status.in_(ACTIVE_STATUSES))
+    db.session.commit()
+    if not inserted:
+        # Another worker queued the same report in between; it may already be done
+        return _find_reusable_job(report, digest) or submit_report_job(report, params, user_id)
+    job = db.session.get(ReportJob, inserted[0])
+
+    app = current_app._get_current_object()
+    _get_executor(app).submit(run_report_job, app, job.id)
+    return job
+
+
+def _set_progress(job_id, percent):
+    """Progress goes through its own connection; the builder may still be reading"""
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(update(ReportJob).where(ReportJob.id == job_id).values(progress=max(0, min(percent, 99))))
+    except Exception as e:
+        logger.warning(f"[Report] Gagal update progress job {job_id}: {e}")
+
+
+def run_report_job(app, job_id):
+    """Executor entry point: build the artifact for one queued job"""
+    with app.app_context():
+        job = db.session.get(ReportJob, job_id)
+        if not job or job.status != 'queued':
+            return
+
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        db.session.commit()
+
+        directory = get_report_dir(app)
+        part_path = os.path.join(directory, f'.{job.id}-{uuid.uuid4().hex}.part')
+        try:
+            with open(part_path, 'wb') as out:
+                filename, mimetype = build_report(job.report, json.loads(job.params), out,
+                                                  progress=lambda percent: _set_progress(job_id, percent))
+            file_path = os.path.join(directory, f'{job.id}-{uuid.uuid4().hex}{os.path.splitext(filename)[1]}')
+            os.replace(part_path, file_path)
+        except Exception as e:
+            logger.exception(f"[Report] Job {job_id} ({job.report}) gagal")
+            _remove_file(part_path)
+            db.session.rollback()
+            job = db.session.get(ReportJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)[:500]
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        now = datetime.utcnow()
+        job = db.session.get(ReportJob, job_id)
+        job.status = 'done'
+        job.progress = 100
+        job.file_path = file_path
+        job.filename = filename
+        job.mimetype = mimetype
+        job.finished_at = now
+        job.expires_at = now + timedelta(seconds=app.config.get('REPORT_JOB_TTL', 3600))
+        db.session.commit()
+        logger.info(f"[Report] Job {job_id} ({job.report}) selesai: {filename}")
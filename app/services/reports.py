@@ -0,0 +1,366 @@
+"""
+Report Builders
+Recap/attendance Excel and PDF reports, decoupled from the request so they can
+be served directly (sync export routes) or generated by a background job
+(see app/services/report_jobs.py).
+
+Each report is registered in REPORTS with the parameters it accepts. Builders
+write the file to a binary file object and return the download filename.
+"""
+from datetime import date, timedelta
+
+from app import db
+from app.models import User
+from app.services.exports import XLSX_MIMETYPE, XlsxExport, export_attendance
+from app.services.recap import MONTH_ABBR, MONTH_NAMES, load_recap_matrix
+
+PDF_MIMETYPE = 'application/pdf'
+
+
+class ReportParamError(ValueError):
+    """Invalid/missing report parameter (message is shown to the admin)"""
+
+
+# ==========================================
+# PARAMETERS
+# ==========================================
+
+def _parse_int(args, name, default=None):
+    value = args.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ReportParamError(f'Parameter {name} tidak valid.')
+
+
+def _parse_date(args, name, default):
+    value = args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        raise ReportParamError('Format tanggal tidak valid.')
+
+
+def parse_report_params(report, args):
+    """
+    Validate request args for `report` and return normalized params
+    (JSON-serializable, defaults filled in) so identical requests compare equal.
+    Raises ReportParamError.
+    """
+    if report not in REPORTS:
+        raise ReportParamError('Jenis laporan tidak dikenal.')
+    fields = REPORTS[report]['params']
+    today = date.today()
+    params = {}
+
+    if 'teacher_id' in fields:
+        teacher_id = _parse_int(args, 'teacher_id')
+        if not teacher_id:
+            raise ReportParamError('Pilih pengajar terlebih dahulu.')
+        if not db.session.get(User, teacher_id):
+            raise ReportParamError('Pengajar tidak ditemukan.')
+        params['teacher_id'] = teacher_id
+    if 'year' in fields:
+        params['year'] = _parse_int(args, 'year', today.year)
+    if 'month' in fields:
+        month = _parse_int(args, 'month', today.month)
+        if not 1 <= month <= 12:
+            raise ReportParamError('Bulan tidak valid.')
+        params['month'] = month
+    if 'start' in fields:
+        start = _parse_date(args, 'start', today.replace(day=1))
+        end = _parse_date(args, 'end', today)
+        if end < start:
+            raise ReportParamError('Tanggal akhir harus setelah tanggal awal.')
+        params['start'] = start.isoformat()
+        params['end'] = end.isoformat()
+    return params
+
+
+def build_report(report, params, out, progress=None):
+    """
+    Write `report` to the binary file object `out`.
+
+    Args:
+        params: normalized params from parse_report_params
+        progress: optional callback(percent) for long reports
+
+    Returns:
+        (filename, mimetype)
+    """
+    definition = REPORTS[report]
+    filename = definition['build'](out, progress=progress or (lambda pct: None), **params)
+    return filename, definition['mimetype']
+
+
+# ==========================================
+# EXCEL
+# ==========================================
+
+def _teacher_recap_excel(out, teacher_id, year, progress):
+    teacher = db.session.get(User, teacher_id)
+
+    export = XlsxExport()
+    ws = export.sheet(f"Rekap {year}", widths=[15, 15, 20])
+
+    # Title
+    export.title(ws, f"Rekap Sesi Pengajar: {teacher.name}")
+    export.title(ws, f"Tahun: {year}", style='sfa_subtitle')
+    export.blank(ws)
+
+    # Headers
+    export.header(ws, ['Bulan', 'Jumlah Sesi', 'Keterangan'])
+
+    # Data
+    counts = load_recap_matrix(year, [teacher_id])[teacher_id]
+    for month_name, session_count in zip(MONTH_NAMES, counts):
+        export.row(ws, [month_name, session_count, '-'], styles=['sfa_cell', 'sfa_cell_center', 'sfa_cell'])
+
+    # Total row
+    export.row(ws, ['TOTAL', sum(counts), ''], styles=['sfa_total', 'sfa_total_center', 'sfa_cell'])
+
+    export.save(out)
+    return f"rekap_{teacher.name.replace(' ', '_')}_{year}.xlsx"
+
+
+def _all_monthly_excel(out, year, month, progress):
+    teachers = User.query.filter_by(role='teacher').all()
+    months = MONTH_NAMES
+    matrix = load_recap_matrix(year, [t.id for t in teachers], month=month)
+
+    export = XlsxExport()
+    ws = export.sheet(f"Rekap {months[month-1]} {year}", widths=[8, 30, 15])
+
+    # Title
+    export.title(ws, f"Rekap Sesi Semua Pengajar - {months[month-1]} {year}")
+    export.blank(ws)
+
+    # Headers
+    export.header(ws, ['No', 'Nama Pengajar', 'Jumlah Sesi'])
+
+    # Data
+    total_all = 0
+    for idx, teacher in enumerate(teachers, 1):
+        session_count = matrix[teacher.id][month-1]
+        total_all += session_count
+        export.row(ws, [idx, teacher.name, session_count],
+                   styles=['sfa_cell_center', 'sfa_cell', 'sfa_cell_center'])
+
+    # Total row
+    export.row(ws, ['', 'TOTAL', total_all], styles=['sfa_cell', 'sfa_total', 'sfa_total_center'])
+
+    export.save(out)
+    return f"rekap_semua_pengajar_{months[month-1]}_{year}.xlsx"
+
+
+def _all_yearly_excel(out, year, progress):
+    teachers = User.query.filter_by(role='teacher').all()
+    months = MONTH_ABBR
+    matrix = load_recap_matrix(year, [t.id for t in teachers])
+
+    export = XlsxExport()
+    ws = export.sheet(f"Rekap Tahunan {year}", widths=[5, 25] + [7] * 13)
+
+    # Title
+    export.title(ws, f"Rekap Sesi Semua Pengajar - Tahun {year}")
+    export.blank(ws)
+
+    # Headers: No, Nama, Jan, Feb, ..., Des, Total
+    export.header(ws, ['No', 'Nama Pengajar'] + months + ['TOTAL'])
+
+    # Data rows
+    styles = ['sfa_cell_center', 'sfa_cell'] + ['sfa_cell_center'] * 12 + ['sfa_total_center']
+    for idx, teacher in enumerate(teachers, 1):
+        counts = matrix[teacher.id]
+        export.row(ws, [idx, teacher.name] + counts + [sum(counts)], styles=styles)
+
+    export.save(out)
+    return f"rekap_semua_pengajar_tahunan_{year}.xlsx"
+
+
+def _attendance_excel(out, start, end, progress):
+    start = date.fromisoformat(start)
+    end = date.fromisoformat(end)
+
+    export = export_attendance(start, end + timedelta(days=1), progress=progress)
+    export.save(out)
+    return f"absensi_{start.strftime('%Y%m%d')}_{end.strftime('%Y%m%d')}.xlsx"
+
+
+# ==========================================
+# PDF
+# ==========================================
+
+def _teacher_recap_pdf(out, teacher_id, year, progress):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
+    teacher = db.session.get(User, teacher_id)
+
+    # Create PDF
+    doc = SimpleDocTemplate(out, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Title
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=20)
+    elements.append(Paragraph(f"Rekap Sesi Pengajar", title_style))
+    elements.append(Paragraph(f"<b>Nama:</b> {teacher.name}", styles['Normal']))
+    elements.append(Paragraph(f"<b>Tahun:</b> {year}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # Table data
+    data = [['Bulan', 'Jumlah Sesi']]
+    counts = load_recap_matrix(year, [teacher_id])[teacher_id]
+    total_sessions = sum(counts)
+
+    for month_name, session_count in zip(MONTH_NAMES, counts):
+        data.append([month_name, str(session_count)])
+
+    data.append(['TOTAL', str(total_sessions)])
+
+    # Create table
+    table = Table(data, colWidths=[3*inch, 2*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D32F2F')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#FFEBEE')),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+
+    elements.append(table)
+    progress(50)
+
+    # Build PDF
+    doc.build(elements)
+    return f"rekap_{teacher.name.replace(' ', '_')}_{year}.pdf"
+
+
+def _all_monthly_pdf(out, year, month, progress):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
+    teachers = User.query.filter_by(role='teacher').all()
+    months = MONTH_NAMES
+    matrix = load_recap_matrix(year, [t.id for t in teachers], month=month)
+
+    doc = SimpleDocTemplate(out, pagesize=A4, rightMargin=50, leftMargin=50, topMargin=50, bottomMargin=50)
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=20)
+    elements.append(Paragraph(f"Rekap Sesi Semua Pengajar", title_style))
+    elements.append(Paragraph(f"<b>Periode:</b> {months[month-1]} {year}", styles['Normal']))
+    elements.append(Spacer(1, 20))
+
+    # Table data
+    data = [['No', 'Nama Pengajar', 'Jumlah Sesi']]
+    total_all = 0
+
+    for idx, teacher in enumerate(teachers, 1):
+        session_count = matrix[teacher.id][month-1]
+        total_all += session_count
+        data.append([str(idx), teacher.name, str(session_count)])
+
+    data.append(['', 'TOTAL', str(total_all)])
+
+    table = Table(data, colWidths=[0.5*inch, 3*inch, 1.5*inch])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D32F2F')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#FFEBEE')),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    elements.append(table)
+    progress(50)
+    doc.build(elements)
+    return f"rekap_semua_pengajar_{months[month-1]}_{year}.pdf"
+
+
+def _all_yearly_pdf(out, year, progress):
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
+    teachers = User.query.filter_by(role='teacher').all()
+    months = MONTH_ABBR
+    matrix = load_recap_matrix(year, [t.id for t in teachers])
+
+    doc = SimpleDocTemplate(out, pagesize=landscape(A4), rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+
+    elements = []
+    styles = getSampleStyleSheet()
+
+    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=14, spaceAfter=15)
+    elements.append(Paragraph(f"Rekap Sesi Semua Pengajar - Tahun {year}", title_style))
+    elements.append(Spacer(1, 10))
+
+    # Table data
+    headers = ['No', 'Nama'] + months + ['Total']
+    data = [headers]
+
+    for idx, teacher in enumerate(teachers, 1):
+        row = [str(idx), teacher.name]
+        counts = matrix[teacher.id]
+        row.extend(str(c) for c in counts)
+        row.append(str(sum(counts)))
+        data.append(row)
+
+    # Column widths for landscape
+    col_widths = [0.4*inch, 1.8*inch] + [0.5*inch]*12 + [0.6*inch]
+
+    table = Table(data, colWidths=col_widths)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#D32F2F')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ]))
+
+    elements.append(table)
+    progress(50)
+    doc.build(elements)
+    return f"rekap_semua_pengajar_tahunan_{year}.pdf"
+
+
+# report name -> definition
+REPORTS = {
+    'teacher_recap_excel': {'params': ('teacher_id', 'year'), 'build': _teacher_recap_excel, 'mimetype': XLSX_MIMETYPE},
+    'teacher_recap_pdf': {'params': ('teacher_id', 'year'), 'build': _teacher_recap_pdf, 'mimetype': PDF_MIMETYPE},
+    'all_monthly_excel': {'params': ('year', 'month'), 'build': _all_monthly_excel, 'mimetype': XLSX_MIMETYPE},
+    'all_monthly_pdf': {'params': ('year', 'month'), 'build': _all_monthly_pdf, 'mimetype': PDF_MIMETYPE},
+    'all_yearly_excel': {'params': ('year',), 'build': _all_yearly_excel, 'mimetype': XLSX_MIMETYPE},
+    'all_yearly_pdf': {'params': ('year',), 'build': _all_yearly_pdf, 'mimetype': PDF_MIMETYPE},
+    'attendance_excel': {'params': ('start', 'end'), 'build': _attendance_excel, 'mimetype': XLSX_MIMETYPE},
+}
@@ -0,0 +1,75 @@
+"""
+Schedule Expansion
+Occurrence dates of weekly schedule patterns (day_of_week, 0=Senin) over a date range.
+
+Dates are computed arithmetically instead of walking every day: the weeks in
+the range are counted once, each weekday's dates are built once and shared by
+all schedules on that weekday, and output is produced week by week in date
+order, so no sort is needed. Cost is O(occurrences), independent of how many
+days are checked per schedule.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+
+def _weekday_offsets(start_date, days_of_week):
+    """(offset from start_date, day_of_week) for each weekday, in date order within a week"""
+    start_weekday = start_date.weekday()
+    return sorted(((day - start_weekday) % 7, day) for day in set(days_of_week))
+
+
+def _week_count(start_date, end_date):
+    """Number of (possibly partial) 7-day blocks from start_date covering end_date"""
+    if end_date < start_date:
+        return 0
+    return (end_date - start_date).days // 7 + 1
+
+
+def occurrence_dates(start_date, end_date, days_of_week=range(7)):
+    """
+    {day_of_week: (date, ...)} with every date in [start_date, end_date]
+    on each requested weekday.
+    """
+    weeks = _week_count(start_date, end_date)
+    result = {}
+    for offset, day in _weekday_offsets(start_date, days_of_week):
+        first = start_date + timedelta(days=offset)
+        count = weeks if first + timedelta(weeks=weeks - 1) <= end_date else weeks - 1
+        result[day] = tuple(first + timedelta(weeks=i) for i in range(max(count, 0)))
+    return result
+
+
+def weekday_dates(start_date, end_date, days_of_week):
+    """Sorted tuple of the dates in [start_date, end_date] falling on any of days_of_week"""
+    by_day = occurrence_dates(start_date, end_date, days_of_week)
+    order = [by_day[day] for _, day in _weekday_offsets(start_date, days_of_week)]
+    return tuple(
+        dates[week]
+        for week in range(_week_count(start_date, end_date))
+        for dates in order
+        if week < len(dates)
+    )
+
+
+def expand_schedules(schedules, start_date, end_date):
+    """
+    [(date, schedule), ...] for every occurrence of each schedule (anything
+    with a day_of_week) in [start_date, end_date].
+
+    Sorted by date; schedules on the same date keep their input order.
+    """
+    by_day = defaultdict(list)
+    for sched in schedules:
+        by_day[sched.day_of_week].append(sched)
+    if not by_day:
+        return []
+
+    dates_by_day = occurrence_dates(start_date, end_date, by_day)
+    order = [(dates_by_day[day], by_day[day]) for _, day in _weekday_offsets(start_date, by_day)]
+    return [
+        (dates[week], sched)
+        for week in range(_week_count(start_date, end_date))
+        for dates, day_schedules in order
+        if week < len(dates)
+        for sched in day_schedules
+    ]
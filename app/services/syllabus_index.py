@@ -0,0 +1,100 @@
+"""
+Syllabus Index Service
+Per-class syllabus topics with prefix sums of their sessions, so the topic
+for N completed sessions is a bisect instead of a walk over the Syllabus rows.
+
+Indexes are cached per program_class_id and invalidated by the admin
+syllabus routes (add/edit/delete). Other gunicorn workers pick up changes
+after SYLLABUS_CACHE_TTL.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+from app.models import Syllabus
+from app.utils.cache import TTLCache
+
+# Safety bound for other gunicorn workers, which do not see our invalidations
+SYLLABUS_CACHE_TTL = 600
+
+# Plain copy of a Syllabus row (safe to share across requests/sessions)
+SyllabusTopic = namedtuple('SyllabusTopic', 'id topic_name sessions order')
+
+_syllabus_cache = TTLCache(ttl=SYLLABUS_CACHE_TTL)
+
+
+class SyllabusIndex:
+    """Ordered topics of one class plus cumulative session ends"""
+
+    def __init__(self, topics):
+        self.topics = tuple(topics)
+        # ends[i] = sessions of topics 0..i (the session count at which topic i is complete)
+        self.ends = tuple(accumulate(t.sessions for t in self.topics))
+
+    def __len__(self):
+        return len(self.topics)
+
+    def position(self, completed):
+        """Index of the current topic after `completed` sessions (len(self) when all are done)"""
+        return bisect_right(self.ends, completed)
+
+    def current_topic(self, completed):
+        """'Topik - 2' (session within a multi-session topic), 'Topik', 'Topik (Selesai)' or None"""
+        if not self.topics:
+            return None
+        i = self.position(completed)
+        if i == len(self.topics):
+            return self.topics[-1].topic_name + " (Selesai)"
+        topic = self.topics[i]
+        if topic.sessions > 1:
+            session_in_topic = completed - (self.ends[i] - topic.sessions) + 1
+            return f"{topic.topic_name} - {session_in_topic}"
+        return topic.topic_name
+
+    def completed_topics(self, completed):
+        return self.position(completed)
+
+    def statuses(self, completed):
+        """[{'syllabus', 'is_complete', 'is_current', 'cumulative_end'}, ...] per topic"""
+        current = self.position(completed)
+        return [{
+            'syllabus': topic,
+            'is_complete': i < current,
+            'is_current': i == current and completed >= end - topic.sessions,
+            'cumulative_end': end
+        } for i, (topic, end) in enumerate(zip(self.topics, self.ends))]
+
+
+def get_syllabus_indexes(program_class_ids):
+    """{program_class_id: SyllabusIndex}; classes missing from the cache load in one query"""
+    indexes = {}
+    missing = set()
+    for class_id in set(program_class_ids):
+        index = _syllabus_cache.get(class_id, 'index')
+        if index is None:
+            missing.add(class_id)
+        else:
+            indexes[class_id] = index
+
+    if missing:
+        generations = {class_id: _syllabus_cache.generation(class_id) for class_id in missing}
+        topics = {class_id: [] for class_id in missing}
+        for row in Syllabus.query.with_entities(
+            Syllabus.program_class_id, Syllabus.id, Syllabus.topic_name, Syllabus.sessions, Syllabus.order
+        ).filter(Syllabus.program_class_id.in_(missing)).order_by(Syllabus.program_class_id, Syllabus.order):
+            topics[row.program_class_id].append(SyllabusTopic(row.id, row.topic_name, row.sessions, row.order))
+        for class_id, class_topics in topics.items():
+            indexes[class_id] = SyllabusIndex(class_topics)
+            _syllabus_cache.set(class_id, 'index', indexes[class_id], generation=generations[class_id])
+
+    return indexes
+
+
+def get_syllabus_index(program_class_id):
+    return get_syllabus_indexes([program_class_id])[program_class_id]
+
+
+def invalidate_syllabus_index(*program_class_ids):
+    for class_id in program_class_ids:
+        if class_id is not None:
+            _syllabus_cache.invalidate(class_id)
@@ -0,0 +1,250 @@
+"""
+Teacher Calendar Service
+Builds FullCalendar events for a teacher over a date range from Booking rows
+only, using range-bounded queries and (date, timeslot) hash lookups. Weekly
+schedules are expanded once, by the booking materializer (through
+app.services.schedule_expansion), into rows up to BOOKING_HORIZON_WEEKS ahead.
+
+Results are cached per teacher, keyed on the teacher's shared CacheVersion
+(one primary key read per request). Every commit that writes a booking,
+attendance or override of that teacher bumps the version in the same
+transaction, so all gunicorn workers and containers see the change at once;
+the committing worker also drops its entries right away.
+"""
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import event, inspect, or_
+from sqlalchemy.orm import Session, joinedload
+
+from app.models import Attendance, Booking, ClassEnrollment, Enrollment, TeacherSessionOverride
+from app.utils.cache import TTLCache
+from app.utils.db import bump_cache_versions, get_cache_version
+
+# Memory bound only: entries of an old version are never read again
+CALENDAR_CACHE_TTL = 300
+
+# Largest range accepted from the calendar (FullCalendar month view = 42 days)
+MAX_RANGE_DAYS = 100
+
+_calendar_cache = TTLCache(ttl=CALENDAR_CACHE_TTL)
+
+
+def _booking_options():
+    return (
+        joinedload(Booking.timeslot),
+        joinedload(Booking.class_enrollment).joinedload(ClassEnrollment.program_class),
+        joinedload(Booking.enrollment).joinedload(Enrollment.program),
+    )
+
+
+def build_teacher_calendar_events(teacher_id, start, end):
+    """
+    Build calendar events for a teacher for dates in [start, end).
+    Sessions are grouped per (date, timeslot); izin bookings are not counted.
+    """
+    today = date.today()
+
+    # Own bookings in range
+    teacher_bookings = Booking.query.options(*_booking_options()).filter(
+        Booking.teacher_id == teacher_id,
+        Booking.date >= start,
+        Booking.date < end
+    ).order_by(Booking.date).all()
+
+    # Overrides in range where this teacher is substituted out or substituting
+    overrides = TeacherSessionOverride.query.options(
+        joinedload(TeacherSessionOverride.timeslot)
+    ).filter(
+        or_(
+            TeacherSessionOverride.original_teacher_id == teacher_id,
+            TeacherSessionOverride.substitute_teacher_id == teacher_id
+        ),
+        TeacherSessionOverride.date >= start,
+        TeacherSessionOverride.date < end
+    ).all()
+    override_keys_to_exclude = {
+        (o.date, o.timeslot_id) for o in overrides if o.original_teacher_id == teacher_id
+    }
+    overrides_as_substitute = [o for o in overrides if o.substitute_teacher_id == teacher_id]
+    substitute_keys = {(o.date, o.timeslot_id) for o in overrides_as_substitute}
+    original_teacher_ids = {o.original_teacher_id for o in overrides_as_substitute}
+
+    # Bookings of the teachers being substituted, indexed by (teacher, date, timeslot)
+    original_bookings = defaultdict(list)
+    if original_teacher_ids:
+        for b in Booking.query.options(*_booking_options()).filter(
+            Booking.teacher_id.in_(original_teacher_ids),
+            Booking.date >= start,
+            Booking.date < end
+        ).order_by(Booking.date).all():
+            original_bookings[(b.teacher_id, b.date, b.timeslot_id)].append(b)
+
+    # Sessions taken over from other teachers
+    substitute_bookings = []
+    for override in overrides_as_substitute:
+        substitute_bookings.extend(original_bookings.get(
+            (override.original_teacher_id, override.date, override.timeslot_id), []
+        ))
+
+    # Combine: own bookings (excluding overridden) + substitute bookings
+    grouped = defaultdict(list)
+    for booking in teacher_bookings:
+        key = (booking.date, booking.timeslot_id)
+        if key not in override_keys_to_exclude:
+            grouped[key].append(booking)
+    for booking in substitute_bookings:
+        grouped[(booking.date, booking.timeslot_id)].append(booking)
+
+    events = []
+    for (booking_date, timeslot_id), bookings_in_slot in grouped.items():
+        timeslot = bookings_in_slot[0].timeslot
+
+        # Exclude izin students from count
+        active_bookings = [b for b in bookings_in_slot if b.status != 'izin']
+        total_students = len(active_bookings)
+        if total_students == 0:
+            continue
+
+        completed_count = sum(1 for b in active_bookings if b.status == 'completed')
+
+        # Get class name (from first booking with class_enrollment)
+        class_name = '-'
+        for b in bookings_in_slot:
+            if b.class_enrollment:
+                class_name = b.class_enrollment.program_class.name
+                break
+            elif b.enrollment and b.enrollment.program:
+                class_name = b.enrollment.program.name
+                break
+
+        is_substitute = (booking_date, timeslot_id) in substitute_keys
+
+        # Determine global status and color
+        if completed_count == total_students:
+            color = '#28a745'  # Green - selesai
+            status = 'Selesai'
+        elif booking_date < today:
+            color = '#dc3545'  # Red - terlewat (tanggal sudah lewat tapi belum diabsen)
+            status = 'Terlewat'
+        else:
+            color = '#007bff'  # Blue - mendatang
+            status = 'Mendatang'
+
+        title = f"{timeslot.name} ({total_students} siswa)"
+        if is_substitute:
+            title = f"🔄 {title}"
+
+        events.append({
+            'id': f"{booking_date}_{timeslot_id}",
+            'title': title,
+            'start': f"{booking_date}T{timeslot.start_time.strftime('%H:%M:%S')}",
+            'end': f"{booking_date}T{timeslot.end_time.strftime('%H:%M:%S')}",
+            'color': color,
+            'extendedProps': {
+                'class_name': class_name,
+                'timeslot': timeslot.name,
+                'total_students': total_students,
+                'status': status,
+                'date': booking_date.strftime('%d %b %Y'),
+                'is_substitute': is_substitute
+            }
+        })
+
+    return events
+
+
+def calendar_version_namespace(teacher_id):
+    return f'teacher_calendar:{teacher_id}'
+
+
+def get_teacher_calendar_events(teacher_id, start, end):
+    """Cached version of build_teacher_calendar_events()"""
+    key = (start, end, date.today(), get_cache_version(calendar_version_namespace(teacher_id)))
+    events = _calendar_cache.get(teacher_id, key)
+    if events is None:
+        generation = _calendar_cache.generation(teacher_id)
+        events = build_teacher_calendar_events(teacher_id, start, end)
+        _calendar_cache.set(teacher_id, key, events, generation=generation)
+    return events
+
+
+def invalidate_teacher_calendar(*teacher_ids):
+    for teacher_id in teacher_ids:
+        if teacher_id is not None:
+            _calendar_cache.invalidate(teacher_id)
+
+
+# ==========================================
+# CACHE INVALIDATION (on commit)
+# ==========================================
+
+def _attr_values(obj, attr):
+    """Current and previous (pre-change) values of a column attribute"""
+    history = inspect(obj).attrs[attr].history
+    return set(history.added or ()) | set(history.unchanged or ()) | set(history.deleted or ())
+
+
+def _affected_teacher_ids(obj):
+    if isinstance(obj, Booking):
+        return _attr_values(obj, 'teacher_id')
+    if isinstance(obj, TeacherSessionOverride):
+        return _attr_values(obj, 'original_teacher_id') | _attr_values(obj, 'substitute_teacher_id')
+    if isinstance(obj, Attendance):
+        teacher_ids = _attr_values(obj, 'teacher_id')
+        # Booking owner, only if already loaded (never lazy-load during flush)
+        booking = obj.__dict__.get('booking')
+        if booking is not None:
+            teacher_ids.add(booking.teacher_id)
+        return teacher_ids
+    return set()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_calendar_changes(session, flush_context):
+    pending = session.info.setdefault('calendar_teacher_ids', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        pending |= _affected_teacher_ids(obj)
+
+
+def _changed_teacher_ids(session):
+    """Teachers whose calendar data this transaction wrote (ORM flushes + recorded Core writes)"""
+    teacher_ids = set(session.info.get('calendar_teacher_ids', ()))
+
+    # Rows written with Core statements (app.utils.db insert_or_ignore / update_returning /
+    # delete_returning); updates and deletes must return the teacher columns
+    for model, rows in session.info.get('core_writes', ()):
+        if model in (Booking, Attendance):
+            teacher_ids |= {row.get('teacher_id') for row in rows}
+        elif model is TeacherSessionOverride:
+            teacher_ids |= {row.get('original_teacher_id') for row in rows}
+            teacher_ids |= {row.get('substitute_teacher_id') for row in rows}
+
+    teacher_ids.discard(None)
+    return teacher_ids
+
+
+@event.listens_for(Session, 'before_commit')
+def _bump_calendar_versions(session):
+    # Flush first so _collect_calendar_changes has seen every change of the transaction
+    session.flush()
+    teacher_ids = _changed_teacher_ids(session)
+    if teacher_ids:
+        bump_cache_versions([calendar_version_namespace(t) for t in teacher_ids], session=session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_calendar_on_commit(session):
+    teacher_ids = _changed_teacher_ids(session)
+    session.info.pop('calendar_teacher_ids', None)
+    session.info.pop('core_writes', None)
+    if teacher_ids:
+        invalidate_teacher_calendar(*teacher_ids)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_calendar_changes(session, previous_transaction):
+    if previous_transaction.nested:
+        return
+    session.info.pop('calendar_teacher_ids', None)
+    session.info.pop('core_writes', None)
@@ -0,0 +1,122 @@
+"""
+WhatsApp Bot Health Cache
+Keeps the last bot status probe so pages can show it without calling wabot.
+
+The scheduler refreshes the status every WA_STATUS_REFRESH_INTERVAL seconds
+(`job_refresh_wa_status`). Each probe is kept in process memory and written
+to WA_STATUS_CACHE_FILE, so gunicorn workers that do not run the scheduler
+read the same value. A reader that finds the cache older than
+WA_STATUS_STALE_AFTER starts one background refresh in its own process and
+returns the stale value right away - the request never waits on wabot.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from flask import current_app
+
+from app.utils.whatsapp import get_wa_client
+
+logger = logging.getLogger(__name__)
+
+_cache = {'status': None, 'checked_at': None}
+_cache_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def _cache_file(app):
+    path = app.config.get('WA_STATUS_CACHE_FILE')
+    if path is None:
+        path = os.path.join(app.instance_path, 'wa_status.json')
+    return path or None  # '' disables the file backing
+
+
+def _write_file(path, status, checked_at):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.wa_status-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'status': status, 'checked_at': checked_at.isoformat()}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_file(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        return data['status'], datetime.fromisoformat(data['checked_at'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def refresh_wa_status(app=None):
+    """Probe the bot now and store the result. Returns the status dict."""
+    app = app or current_app._get_current_object()
+    status = get_wa_client().check_status()
+    checked_at = datetime.utcnow()
+
+    with _cache_lock:
+        _cache['status'] = status
+        _cache['checked_at'] = checked_at
+
+    path = _cache_file(app)
+    if path:
+        try:
+            _write_file(path, status, checked_at)
+        except OSError as e:
+            logger.warning(f"[WA Health] Gagal menulis cache status: {e}")
+    return status
+
+
+def _refresh_in_background(app):
+    """Start one refresh thread per process; callers that find one running skip"""
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            with app.app_context():
+                refresh_wa_status(app)
+        except Exception:
+            logger.exception("[WA Health] Refresh status gagal")
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=run, name='wa-health-refresh', daemon=True).start()
+
+
+def get_wa_status(app=None):
+    """
+    Cached bot status (never blocks on wabot). Besides the check_status()
+    fields the dict carries:
+      - checked_at: datetime of the probe (UTC) or None if never probed
+      - age_seconds: seconds since the probe, or None
+      - stale: True when older than WA_STATUS_STALE_AFTER (or never probed)
+    """
+    app = app or current_app._get_current_object()
+
+    with _cache_lock:
+        status, checked_at = _cache['status'], _cache['checked_at']
+
+    path = _cache_file(app)
+    if path:
+        file_status, file_checked_at = _read_file(path)
+        if file_checked_at and (checked_at is None or file_checked_at > checked_at):
+            status, checked_at = file_status, file_checked_at
+
+    age_seconds = int((datetime.utcnow() - checked_at).total_seconds()) if checked_at else None
+    stale = age_seconds is None or age_seconds > app.config.get('WA_STATUS_STALE_AFTER', 90)
+    if stale:
+        _refresh_in_background(app)
+
+    result = dict(status or {'connected': False, 'status': 'unknown', 'name': None, 'phone': None})
+    result.update(checked_at=checked_at, age_seconds=age_seconds, stale=stale)
+    return result
@@ -0,0 +1,61 @@
+"""
+Simple in-process TTL cache.
+
+Entries are grouped per namespace (e.g. one namespace per teacher) so a whole
+group can be invalidated at once. Each worker process has its own cache, so
+the TTL is the upper bound on staleness across gunicorn workers.
+"""
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe TTL cache with per-namespace invalidation"""
+
+    def __init__(self, ttl=60, max_namespaces=1000):
+        self.ttl = ttl
+        self.max_namespaces = max_namespaces
+        self._data = {}         # {namespace: {key: (expires_at, value)}}
+        self._generations = {}  # {namespace: int}, bumped on invalidate
+        self._lock = threading.Lock()
+
+    def generation(self, namespace):
+        """Current generation of a namespace (pass it back to set())"""
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._data.get(namespace, {}).get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[namespace][key]
+                return default
+            return value
+
+    def set(self, namespace, key, value, ttl=None, generation=None):
+        """
+        Store a value. If `generation` is given and the namespace was invalidated
+        since it was read, the value is dropped (it was computed from stale data).
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations.get(namespace, 0):
+                return False
+            if namespace not in self._data and len(self._data) >= self.max_namespaces:
+                self._data.clear()
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._data.setdefault(namespace, {})[key] = (expires_at, value)
+            return True
+
+    def invalidate(self, namespace):
+        with self._lock:
+            self._data.pop(namespace, None)
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            for namespace in self._generations:
+                self._generations[namespace] += 1
@@ -0,0 +1,137 @@
+"""
+Database helpers yang tidak tersedia langsung di Flask-SQLAlchemy.
+"""
+from sqlalchemy import delete, select, update
+
+from app import db
+from app.models import CacheVersion
+
+
+def _dialect_insert(model, session=None):
+    dialect = (session or db.session).get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'ON CONFLICT inserts are not supported for {dialect}')
+    return insert(model)
+
+
+def insert_or_ignore(model, rows, conflict_columns, returning=None, index_where=None):
+    """
+    INSERT ... ON CONFLICT (conflict_columns) DO NOTHING RETURNING id
+
+    Rows that collide with an existing unique key are skipped by the database
+    itself, so concurrent requests cannot double-insert.
+
+    Args:
+        model: SQLAlchemy model class
+        rows: dict or list of dicts (column -> value)
+        conflict_columns: columns of the unique constraint to check
+        returning: column to return for inserted rows (default: model.id)
+        index_where: WHERE clause of a partial unique index on conflict_columns
+
+    Returns:
+        list of ids (or `returning` values) of the rows actually inserted
+        (empty if all conflicted)
+    """
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        return []
+
+    stmt = _dialect_insert(model).values(rows).on_conflict_do_nothing(
+        index_elements=conflict_columns, index_where=index_where
+    ).returning(model.id if returning is None else returning)
+    inserted_ids = [row[0] for row in db.session.execute(stmt)]
+    _record_core_write(model, rows)
+    return inserted_ids
+
+
+def _record_core_write(model, rows):
+    """
+    Core inserts/updates/deletes bypass the ORM flush; record the written
+    rows (dicts) so listeners (e.g. cache invalidation) can react on commit
+    """
+    db.session.info.setdefault('core_writes', []).append((model, rows))
+
+
+def update_returning(model, criteria, values, returning):
+    """
+    UPDATE model SET values WHERE criteria RETURNING returning
+
+    For guarded status changes (`... AND status = 'booked'`): the database
+    decides which rows match, so of two concurrent requests only one wins.
+
+    Args:
+        model: SQLAlchemy model class
+        criteria: list of WHERE clauses
+        values: dict (column -> value or SQL expression)
+        returning: columns to return for the updated rows
+
+    Returns:
+        list of dicts (column name -> value), one per updated row
+    """
+    stmt = update(model).where(*criteria).values(**values).returning(*returning)
+    rows = [row._asdict() for row in db.session.execute(
+        stmt, execution_options={'synchronize_session': 'fetch'}
+    )]
+    _record_core_write(model, rows)
+    return rows
+
+
+def delete_returning(model, criteria, returning):
+    """DELETE FROM model WHERE criteria RETURNING returning; see update_returning"""
+    stmt = delete(model).where(*criteria).returning(*returning)
+    rows = [row._asdict() for row in db.session.execute(
+        stmt, execution_options={'synchronize_session': 'fetch'}
+    )]
+    _record_core_write(model, rows)
+    return rows
+
+
+def insert_or_increment(model, rows, conflict_columns, counter_column, session=None):
+    """
+    INSERT ... ON CONFLICT (conflict_columns) DO UPDATE
+        SET counter_column = counter_column + excluded.counter_column
+
+    Atomic counter upsert: concurrent requests adding to the same key are
+    summed by the database instead of overwriting each other.
+
+    Args:
+        model: SQLAlchemy model class
+        rows: dict or list of dicts (column -> value), keys must be unique
+        conflict_columns: columns of the unique constraint to check
+        counter_column: name of the integer column to add to
+        session: session to run in (default: db.session; for session event listeners)
+    """
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        return
+
+    stmt = _dialect_insert(model, session).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_={counter_column: getattr(model, counter_column) + stmt.excluded[counter_column]}
+    )
+    (session or db.session).execute(stmt)
+
+
+def bump_cache_versions(namespaces, session=None):
+    """
+    Increment the shared CacheVersion of each namespace (created at 1).
+    Runs in the caller's transaction, so other workers see the new version
+    exactly when the data change is committed.
+    """
+    # Sorted: concurrent transactions lock the version rows in the same order
+    rows = [{'namespace': namespace, 'version': 1} for namespace in sorted(set(namespaces))]
+    insert_or_increment(CacheVersion, rows, ['namespace'], 'version', session=session)
+
+
+def get_cache_version(namespace):
+    """Shared version of a namespace (0 when never bumped); a primary key lookup"""
+    return db.session.scalar(
+        select(CacheVersion.version).where(CacheVersion.namespace == namespace)
+    ) or 0
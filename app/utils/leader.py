@@ -0,0 +1,177 @@
+"""
+Leader election for background work that must run in exactly one process.
+
+Every gunicorn worker (and every container) runs a LeaderElector; only the
+one holding the lock runs the scheduler. The lock belongs to the process,
+not to a row, so it disappears with the process:
+
+- PostgreSQL: session-level pg_try_advisory_lock on a dedicated connection
+  (outside the app's pool). If the leader dies its connection closes and
+  the server drops the lock.
+- Other databases (SQLite in development/tests): fcntl.flock on a lock file,
+  which only coordinates processes on the same host.
+
+Standbys retry every SCHEDULER_LEADER_POLL seconds, so one takes over within
+that interval after the leader goes away. The leader checks its lock on the
+same interval and steps down if it has lost it (e.g. its connection dropped).
+"""
+import logging
+import os
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+logger = logging.getLogger(__name__)
+
+
+class AdvisoryLock:
+    """PostgreSQL session-level advisory lock held on its own connection"""
+
+    def __init__(self, url, key):
+        self.key = key
+        self.engine = create_engine(url, poolclass=NullPool)
+        self.conn = None
+
+    def acquire(self):
+        try:
+            if self.conn is None:
+                self.conn = self.engine.connect()
+            acquired = self.conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': self.key}).scalar()
+            self.conn.commit()
+        except Exception as e:
+            logger.warning(f"[Leader] Gagal mencoba advisory lock: {e}")
+            self._close()
+            return False
+        return bool(acquired)
+
+    def is_held(self):
+        """
+        A session-level lock lives as long as its connection, so a
+        successful ping means the lock is still ours.
+        """
+        if self.conn is None:
+            return False
+        try:
+            self.conn.execute(text('SELECT 1'))
+            self.conn.commit()
+            return True
+        except Exception as e:
+            logger.warning(f"[Leader] Koneksi advisory lock putus: {e}")
+            self._close()
+            return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': self.key})
+                self.conn.commit()
+            except Exception:
+                pass
+            self._close()
+
+    def _close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class FileLock:
+    """Exclusive flock on a file; released by the OS when the process exits"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        import fcntl
+
+        if self.fd is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        os.ftruncate(self.fd, 0)
+        os.write(self.fd, str(os.getpid()).encode())
+        return True
+
+    def is_held(self):
+        return self.fd is not None
+
+    def release(self):
+        import fcntl
+
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+def make_leader_lock(app, engine):
+    """Advisory lock on PostgreSQL, file lock elsewhere"""
+    if engine.dialect.name == 'postgresql':
+        return AdvisoryLock(engine.url, app.config.get('SCHEDULER_LOCK_KEY', 5724301))
+    path = app.config.get('SCHEDULER_LOCK_FILE') or os.path.join(app.instance_path, 'scheduler.lock')
+    return FileLock(path)
+
+
+class LeaderElector:
+    """
+    Background thread that keeps trying to become leader.
+    on_elected() is called when this process gets the lock, on_demoted()
+    when it loses it; both run on the elector thread.
+    """
+
+    def __init__(self, lock, on_elected, on_demoted, interval=5):
+        self.lock = lock
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.interval = interval
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='leader-elector', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Step down (if leader) and stop competing"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        if self.is_leader:
+            self._demote()
+        self.lock.release()
+
+    def _demote(self):
+        self.is_leader = False
+        try:
+            self.on_demoted()
+        except Exception:
+            logger.exception("[Leader] on_demoted gagal")
+
+    def _tick(self):
+        if self.is_leader:
+            if not self.lock.is_held():
+                logger.warning(f"[Leader] pid {os.getpid()} kehilangan lock, berhenti jadi leader")
+                self._demote()
+        elif self.lock.acquire():
+            self.is_leader = True
+            logger.info(f"[Leader] pid {os.getpid()} menjadi leader")
+            try:
+                self.on_elected()
+            except Exception:
+                logger.exception("[Leader] on_elected gagal, melepas lock")
+                self.is_leader = False
+                self.lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._tick()
+            self._stop.wait(self.interval)
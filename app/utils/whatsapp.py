@@ -1,110 +1,220 @@
-import requests
+"""
+WhatsApp Bot Client (Aldinokemal go-whatsapp-web-multidevice)
+
+All calls to the bot go through one WhatsAppClient per process: a shared
+requests.Session with a pooled HTTPAdapter, so the reminder burst and the
+outbound queue dispatcher reuse keep-alive connections instead of opening
+a new TCP connection per message. Use `get_wa_client()`.
+"""
+import logging
 import os
-import json
+import threading
+import time
+
+import requests
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
 
 WA_API_URL = os.environ.get('WA_API_URL', 'http://wabot:3000')
 
 
-def check_wa_status():
-    """
-    Check if WhatsApp bot is connected and active.
-    Uses /app/status endpoint which returns is_connected and is_logged_in.
-    Returns dict with status info.
-    """
-    try:
-        # Use /app/status endpoint for connection status
-        response = requests.get(f"{WA_API_URL}/app/status", timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            results = data.get('results', {})
-            
-            is_connected = results.get('is_connected', False)
-            is_logged_in = results.get('is_logged_in', False)
-            device_id = results.get('device_id', '')
-            
-            # Bot is considered active if both connected and logged in
-            if is_connected and is_logged_in:
-                # Try to get additional user info if available
-                name = 'WhatsApp Bot'
-                phone = device_id if device_id else '-'
-                
-                # Optionally fetch more details from /app/devices
-                try:
-                    devices_resp = requests.get(f"{WA_API_URL}/app/devices", timeout=3)
-                    if devices_resp.status_code == 200:
-                        devices_data = devices_resp.json()
-                        devices = devices_data.get('results', [])
-                        if devices and len(devices) > 0:
-                            first_device = devices[0]
-                            if isinstance(first_device, dict):
-                                name = first_device.get('PushName', name)
-                                phone = first_device.get('Device', {}).get('User', phone)
-                except:
-                    pass  # Use defaults if devices fetch fails
-                
-                return {
-                    'connected': True,
-                    'name': name,
-                    'phone': phone,
-                    'status': 'active'
-                }
-        
-        # Not connected or error
-        return {'connected': False, 'status': 'disconnected', 'name': None, 'phone': None}
-    except requests.exceptions.Timeout:
-        return {'connected': False, 'status': 'timeout', 'name': None, 'phone': None}
-    except Exception as e:
-        return {'connected': False, 'status': 'error', 'error': str(e), 'name': None, 'phone': None}
+class WhatsAppSendError(Exception):
+    """Pesan gagal dikirim (bot tidak merespon / status bukan 200)"""
 
 
-def get_wa_qr():
+class WhatsAppClient:
     """
-    Get QR code URL for WhatsApp login.
-    Returns dict with qr_link if available.
+    HTTP client for the WA bot.
+
+    Timeouts are (connect, read) tuples; connect is short so a bot that is
+    down fails fast, read covers the bot's own round-trip to WhatsApp.
+    Latency per endpoint is kept in `metrics()` (process-local).
     """
-    try:
-        response = requests.get(f"{WA_API_URL}/app/login", timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('results') and data['results'].get('qr_link'):
-                return {
-                    'success': True,
-                    'qr_link': data['results']['qr_link'],
-                    'duration': data['results'].get('qr_duration', 60)
+
+    def __init__(self, base_url=WA_API_URL, pool_size=10, connect_timeout=3, read_timeout=20):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self.session = requests.Session()
+        # Retries are handled by the outbound queue (backoff per message)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Transport
+    # ------------------------------------------------------------------
+
+    def _timeout(self, read_timeout=None):
+        return (self.connect_timeout, read_timeout or self.read_timeout)
+
+    def _record(self, endpoint, elapsed_ms, ok):
+        with self._metrics_lock:
+            m = self._metrics.setdefault(endpoint, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            m['calls'] += 1
+            m['errors'] += 0 if ok else 1
+            m['total_ms'] += elapsed_ms
+            m['max_ms'] = max(m['max_ms'], elapsed_ms)
+
+    def _request(self, method, path, endpoint=None, read_timeout=None, **kwargs):
+        """Send one request; latency is recorded under `endpoint` (default: path)"""
+        endpoint = endpoint or path
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}",
+                                            timeout=self._timeout(read_timeout), **kwargs)
+            ok = response.status_code == 200
+            return response
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._record(endpoint, elapsed_ms, ok)
+            logger.debug(f"[WA] {method} {path} {elapsed_ms:.0f}ms")
+
+    def metrics(self):
+        """Snapshot: {endpoint: {calls, errors, avg_ms, max_ms}}"""
+        with self._metrics_lock:
+            return {
+                endpoint: {
+                    'calls': m['calls'],
+                    'errors': m['errors'],
+                    'avg_ms': round(m['total_ms'] / m['calls'], 1) if m['calls'] else 0.0,
+                    'max_ms': round(m['max_ms'], 1),
                 }
-        return {'success': False, 'error': 'QR code not available'}
-    except requests.exceptions.Timeout:
-        return {'success': False, 'error': 'Timeout connecting to WA Bot'}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
+                for endpoint, m in self._metrics.items()
+            }
 
+    # ------------------------------------------------------------------
+    # Bot API
+    # ------------------------------------------------------------------
 
-def send_wa_message(target_number, message):
-    """
-    Kirim pesan WA via Aldinokemal Bot.
-    target_number: 
-      - Personal: '62812345678@s.whatsapp.net' (Perhatikan akhiran ini untuk user)
-      - Group: '12345678@g.us'
-    """
-    # Endpoint untuk send message di repo aldinokemal biasanya /send/message
-    # URL Path diperbaiki sesuai code Go: /send/message
-    url = f"{WA_API_URL}/send/message" 
-    
-    # Payload
-    payload = {
-        "phone": target_number,
-        "message": message
-    }
-    
-    try:
-        response = requests.post(url, json=payload)
-        if response.status_code == 200:
-            print(f"WA Sukses: {response.json()}")
+    def check_status(self):
+        """
+        Check if WhatsApp bot is connected and active.
+        Uses /app/status endpoint which returns is_connected and is_logged_in.
+        Returns dict with status info.
+        """
+        try:
+            response = self._request('GET', '/app/status', read_timeout=5)
+
+            if response.status_code == 200:
+                results = response.json().get('results', {})
+
+                is_connected = results.get('is_connected', False)
+                is_logged_in = results.get('is_logged_in', False)
+                device_id = results.get('device_id', '')
+
+                # Bot is considered active if both connected and logged in
+                if is_connected and is_logged_in:
+                    name = 'WhatsApp Bot'
+                    phone = device_id if device_id else '-'
+
+                    # Optionally fetch more details from /app/devices
+                    try:
+                        devices_resp = self._request('GET', '/app/devices', read_timeout=3)
+                        if devices_resp.status_code == 200:
+                            devices = devices_resp.json().get('results', [])
+                            if devices and isinstance(devices[0], dict):
+                                name = devices[0].get('PushName', name)
+                                phone = devices[0].get('Device', {}).get('User', phone)
+                    except (requests.exceptions.RequestException, ValueError):
+                        pass  # Use defaults if devices fetch fails
+
+                    return {
+                        'connected': True,
+                        'name': name,
+                        'phone': phone,
+                        'status': 'active'
+                    }
+
+            # Not connected or error
+            return {'connected': False, 'status': 'disconnected', 'name': None, 'phone': None}
+        except requests.exceptions.Timeout:
+            return {'connected': False, 'status': 'timeout', 'name': None, 'phone': None}
+        except Exception as e:
+            return {'connected': False, 'status': 'error', 'error': str(e), 'name': None, 'phone': None}
+
+    def get_qr(self):
+        """
+        Get QR code URL for WhatsApp login.
+        Returns dict with qr_link if available.
+        """
+        try:
+            response = self._request('GET', '/app/login', read_timeout=10)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get('results') and data['results'].get('qr_link'):
+                    return {
+                        'success': True,
+                        'qr_link': data['results']['qr_link'],
+                        'duration': data['results'].get('qr_duration', 60)
+                    }
+            return {'success': False, 'error': 'QR code not available'}
+        except requests.exceptions.Timeout:
+            return {'success': False, 'error': 'Timeout connecting to WA Bot'}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def get_qr_image(self, filename):
+        """PNG bytes of a QR image served by the bot, or None if not found"""
+        response = self._request('GET', f'/statics/qrcode/{filename}', endpoint='/statics/qrcode',
+                                 read_timeout=10)
+        return response.content if response.status_code == 200 else None
+
+    def send_message(self, target_number, message):
+        """
+        Kirim pesan WA, raise WhatsAppSendError bila gagal.
+        target_number:
+          - Personal: '62812345678@s.whatsapp.net' (Perhatikan akhiran ini untuk user)
+          - Group: '12345678@g.us'
+
+        Untuk notifikasi biasa pakai enqueue_wa_message (app/services/outbound_messages.py);
+        kirim langsung hanya untuk alur yang harus tahu hasilnya saat itu juga (mis. invite).
+        """
+        payload = {
+            "phone": target_number,
+            "message": message
+        }
+        try:
+            response = self._request('POST', '/send/message', json=payload)
+        except requests.exceptions.RequestException as e:
+            raise WhatsAppSendError(f"Error koneksi ke WA Bot: {e}") from e
+
+        if response.status_code != 200:
+            raise WhatsAppSendError(f"HTTP {response.status_code}: {response.text[:300]}")
+        return response
+
+    def try_send_message(self, target_number, message):
+        """send_message yang mengembalikan True/False (untuk alur sinkron)"""
+        try:
+            self.send_message(target_number, message)
+            logger.info(f"[WA] Pesan terkirim ke {target_number}")
             return True
-        else:
-            print(f"WA Gagal: {response.text}")
+        except WhatsAppSendError as e:
+            logger.warning(f"[WA] Gagal kirim ke {target_number}: {e}")
             return False
-    except Exception as e:
-        print(f"Error koneksi ke WA Bot: {e}")
-        return False
\ No newline at end of file
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_wa_client():
+    """Process-wide WhatsAppClient, configured from the app config when available"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            config = current_app.config if has_app_context() else {}
+            _client = WhatsAppClient(
+                base_url=config.get('WA_API_URL', WA_API_URL),
+                pool_size=config.get('WA_HTTP_POOL_SIZE', 10),
+                connect_timeout=config.get('WA_CONNECT_TIMEOUT', 3),
+                read_timeout=config.get('WA_READ_TIMEOUT', 20),
+            )
+        return _client
@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: weekly schedule expansion
+Compares the old per-day walk (check weekday() == day_of_week for every day
+and every schedule) and the per-schedule weekly step with
+app.services.schedule_expansion.
+
+Run from the repo root: python -m benchmarks.bench_schedule_expansion [schedules] [weeks]
+Defaults: 1000 schedules x 52 weeks. Needs no database.
+"""
+import random
+import sys
+import timeit
+from collections import namedtuple
+from datetime import date, timedelta
+
+from app.services.schedule_expansion import expand_schedules, weekday_dates
+
+Schedule = namedtuple('Schedule', 'id day_of_week timeslot_id')
+
+
+def day_walk(schedules, start_date, end_date):
+    """Old approach: every day of the range for every schedule, then sort"""
+    days = (end_date - start_date).days + 1
+    result = []
+    for sched in schedules:
+        for i in range(days):
+            current_date = start_date + timedelta(days=i)
+            if current_date.weekday() == sched.day_of_week:
+                result.append((current_date, sched))
+    result.sort(key=lambda r: r[0])
+    return result
+
+
+def weekly_step(schedules, start_date, end_date):
+    """Previous iter_weekday_dates: jump to the first weekday, step 7 days per schedule, then sort"""
+    result = []
+    for sched in schedules:
+        current_date = start_date + timedelta(days=(sched.day_of_week - start_date.weekday()) % 7)
+        while current_date <= end_date:
+            result.append((current_date, sched))
+            current_date += timedelta(days=7)
+    result.sort(key=lambda r: r[0])
+    return result
+
+
+def day_walk_available(start_date, end_date, days_of_week):
+    """Old onboarding approach: walk every day, keep the schedule weekdays"""
+    days = (end_date - start_date).days + 1
+    return [start_date + timedelta(days=i) for i in range(days)
+            if (start_date + timedelta(days=i)).weekday() in days_of_week]
+
+
+def bench(label, func, number):
+    best = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"  {label:<22} {best * 1000:9.3f} ms")
+    return best
+
+
+def main():
+    n_schedules = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    weeks = int(sys.argv[2]) if len(sys.argv) > 2 else 52
+
+    rng = random.Random(42)
+    schedules = [Schedule(i, rng.randrange(7), rng.randrange(1, 4)) for i in range(n_schedules)]
+    start_date = date.today()
+    end_date = start_date + timedelta(weeks=weeks) - timedelta(days=1)
+
+    old = day_walk(schedules, start_date, end_date)
+    new = expand_schedules(schedules, start_date, end_date)
+    assert old == new == weekly_step(schedules, start_date, end_date), 'expand_schedules differs'
+    days_of_week = {0, 2, 4}
+    assert day_walk_available(start_date, end_date, days_of_week) == list(
+        weekday_dates(start_date, end_date, days_of_week))
+
+    print(f"{n_schedules} schedules x {weeks} weeks = {len(new)} occurrences")
+    t_old = bench('day walk + sort', lambda: day_walk(schedules, start_date, end_date), 1)
+    t_step = bench('weekly step + sort', lambda: weekly_step(schedules, start_date, end_date), 5)
+    t_new = bench('expand_schedules', lambda: expand_schedules(schedules, start_date, end_date), 5)
+    print(f"  speedup                {t_old / t_new:9.1f}x vs day walk, {t_step / t_new:.1f}x vs weekly step")
+
+    print(f"available dates ({len(days_of_week)} weekdays x {weeks} weeks)")
+    t_old = bench('day walk', lambda: day_walk_available(start_date, end_date, days_of_week), 100)
+    t_new = bench('weekday_dates', lambda: weekday_dates(start_date, end_date, days_of_week), 100)
+    print(f"  speedup                {t_old / t_new:9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -55,9 +55,53 @@ class Config:
     # ==========================================================================
     
     WA_API_URL = os.environ.get('WA_API_URL', 'http://wabot:3000')
+    WA_HTTP_POOL_SIZE = int(os.environ.get('WA_HTTP_POOL_SIZE', 10))  # Keep-alive connections ke wabot
+    WA_CONNECT_TIMEOUT = float(os.environ.get('WA_CONNECT_TIMEOUT', 3))
+    WA_READ_TIMEOUT = float(os.environ.get('WA_READ_TIMEOUT', 20))
+    
+    # WA bot status cache (app/services/wa_health.py)
+    WA_STATUS_REFRESH_INTERVAL = int(os.environ.get('WA_STATUS_REFRESH_INTERVAL', 30))  # Detik antar probe
+    WA_STATUS_STALE_AFTER = int(os.environ.get('WA_STATUS_STALE_AFTER', 90))  # Lebih tua = ditandai basi
+    WA_STATUS_CACHE_FILE = os.environ.get('WA_STATUS_CACHE_FILE')  # Default: instance/wa_status.json, '' = nonaktif
+    
+    # Outbound WA queue (app/services/outbound_messages.py)
+    WA_DISPATCH_INTERVAL = int(os.environ.get('WA_DISPATCH_INTERVAL', 10))  # Detik antar putaran dispatcher
+    WA_DISPATCH_WORKERS = int(os.environ.get('WA_DISPATCH_WORKERS', 4))  # Thread pengirim paralel
+    WA_SEND_RATE = float(os.environ.get('WA_SEND_RATE', 5))  # Maks pesan/detik ke gateway (0 = tanpa batas)
+    WA_MAX_ATTEMPTS = int(os.environ.get('WA_MAX_ATTEMPTS', 6))  # Setelah ini pesan jadi 'dead'
+    WA_RETRY_BASE_SECONDS = int(os.environ.get('WA_RETRY_BASE_SECONDS', 30))  # Backoff: base * 2^(attempt-1)
     
     # Scheduler Settings
     SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'false').lower() == 'true'
+    # Hanya proses server yang ikut leader election (diset di perintah gunicorn, bukan global):
+    # perintah CLI seperti `flask db upgrade` tidak pernah menjalankan scheduler
+    SCHEDULER_WORKER = os.environ.get('SCHEDULER_WORKER', 'false').lower() == 'true'
+    # Leader election: hanya satu proses (antar worker/container) yang menjalankan job
+    SCHEDULER_LEADER_POLL = int(os.environ.get('SCHEDULER_LEADER_POLL', 5))  # Detik; standby ambil alih dalam waktu ini
+    SCHEDULER_LOCK_KEY = int(os.environ.get('SCHEDULER_LOCK_KEY', 5724301))  # Key pg_advisory_lock
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE')  # Fallback non-Postgres, default instance/scheduler.lock
+    # Job harian disimpan di DB: run yang terlewat saat restart tetap jalan bila masih dalam grace
+    SCHEDULER_MISFIRE_GRACE = int(os.environ.get('SCHEDULER_MISFIRE_GRACE', 3600))  # Detik
+    SCHEDULER_COALESCE = os.environ.get('SCHEDULER_COALESCE', 'true').lower() == 'true'  # Beberapa run terlewat = 1 run
+    # Default job APScheduler (BackgroundScheduler(job_defaults=...)); job tersimpan diselaraskan ke nilai ini
+    SCHEDULER_JOB_DEFAULTS = {
+        'misfire_grace_time': SCHEDULER_MISFIRE_GRACE,
+        'coalesce': SCHEDULER_COALESCE,
+        'max_instances': 1,
+    }
+    SCHEDULER_RUN_RETENTION_DAYS = int(os.environ.get('SCHEDULER_RUN_RETENTION_DAYS', 30))  # Riwayat scheduler_runs
+    # Rekap absensi: satu job per TimeSlot, sekian menit setelah end_time
+    ATTENDANCE_RECAP_DELAY_MINUTES = int(os.environ.get('ATTENDANCE_RECAP_DELAY_MINUTES', 90))
+    ATTENDANCE_RECAP_SYNC_INTERVAL = int(os.environ.get('ATTENDANCE_RECAP_SYNC_INTERVAL', 300))  # Detik; cek perubahan timeslot
+    
+    # Booking dibuat dari jadwal rutin sampai sekian minggu ke depan (job malam, lihat booking_materializer)
+    BOOKING_HORIZON_WEEKS = int(os.environ.get('BOOKING_HORIZON_WEEKS', 8))
+    
+    # Background report exports (Excel/PDF)
+    REPORT_DIR = os.environ.get('REPORT_DIR')  # Default: <instance>/reports
+    REPORT_JOB_TTL = int(os.environ.get('REPORT_JOB_TTL', 3600))  # Detik artifact disimpan
+    REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', 900))  # Job dianggap gagal setelah ini
+    REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))  # Thread per proses gunicorn
     
     # Google Drive
     GOOGLE_DRIVE_ROOT_FOLDER_ID = os.environ.get('GOOGLE_DRIVE_ROOT_FOLDER_ID')
@@ -45,6 +45,17 @@ target_db = current_app.extensions['migrate'].db
 # ... etc.
 
 
+# Tables managed outside the models (APScheduler job store); autogenerate
+# must not try to drop them
+EXTERNAL_TABLES = {'apscheduler_jobs'}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and name in EXTERNAL_TABLES:
+        return False
+    return True
+
+
 def get_metadata():
     if hasattr(target_db, 'metadatas'):
         return target_db.metadatas[None]
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -93,6 +105,7 @@ def run_migrations_online():
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    conf_args.setdefault("include_object", include_object)
 
     connectable = get_engine()
 
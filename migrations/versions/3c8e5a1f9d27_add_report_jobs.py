@@ -0,0 +1,47 @@
+"""Add report_jobs (background report exports)
+
+Revision ID: 3c8e5a1f9d27
+Revises: 9f3b2c7d41a8
+Create Date: 2026-10-17 13:02:51.774310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e5a1f9d27'
+down_revision = '9f3b2c7d41a8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('report_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('report', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('params_hash', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('progress', sa.Integer(), nullable=True),
+    sa.Column('file_path', sa.String(length=500), nullable=True),
+    sa.Column('filename', sa.String(length=200), nullable=True),
+    sa.Column('mimetype', sa.String(length=100), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('requested_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['requested_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_report_jobs_report_params', ['report', 'params_hash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_report_jobs_report_params')
+
+    op.drop_table('report_jobs')
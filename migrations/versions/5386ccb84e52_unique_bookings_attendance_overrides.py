@@ -0,0 +1,89 @@
+"""Unique constraints on bookings, attendances and session overrides
+
+Revision ID: 5386ccb84e52
+Revises: cd0a4d1984cf
+Create Date: 2026-10-17 10:03:18.215640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5386ccb84e52'
+down_revision = 'cd0a4d1984cf'
+branch_labels = None
+depends_on = None
+
+
+def _dedupe_bookings(conn):
+    """Keep one booking per (enrollment, date, timeslot); prefer the one with attendance."""
+    groups = conn.execute(sa.text("""
+        SELECT enrollment_id, date, timeslot_id FROM bookings
+        WHERE enrollment_id IS NOT NULL AND timeslot_id IS NOT NULL
+        GROUP BY enrollment_id, date, timeslot_id
+        HAVING COUNT(*) > 1
+    """)).fetchall()
+
+    for enrollment_id, booking_date, timeslot_id in groups:
+        rows = conn.execute(sa.text("""
+            SELECT b.id FROM bookings b
+            LEFT JOIN attendances a ON a.booking_id = b.id
+            WHERE b.enrollment_id = :e AND b.date = :d AND b.timeslot_id = :t
+            ORDER BY CASE WHEN a.id IS NULL THEN 1 ELSE 0 END, b.id
+        """), {'e': enrollment_id, 'd': booking_date, 't': timeslot_id}).fetchall()
+        ids = list(dict.fromkeys(r[0] for r in rows))
+        keeper, duplicates = ids[0], ids[1:]
+
+        for dup in duplicates:
+            params = {'keep': keeper, 'dup': dup}
+            conn.execute(sa.text("UPDATE attendances SET booking_id = :keep WHERE booking_id = :dup"), params)
+            conn.execute(sa.text("UPDATE attendance_requests SET booking_id = :keep WHERE booking_id = :dup"), params)
+            conn.execute(sa.text("UPDATE reschedule_requests SET original_booking_id = :keep WHERE original_booking_id = :dup"), params)
+            conn.execute(sa.text("UPDATE reschedule_requests SET new_booking_id = :keep WHERE new_booking_id = :dup"), params)
+            conn.execute(sa.text("DELETE FROM bookings WHERE id = :dup"), params)
+
+
+def _dedupe(conn, table, columns):
+    """Delete all but the lowest id per unique key"""
+    cols = ', '.join(columns)
+    not_null = ' AND '.join(f'{c} IS NOT NULL' for c in columns)
+    conn.execute(sa.text(f"""
+        DELETE FROM {table} WHERE id NOT IN (
+            SELECT MIN(id) FROM {table} WHERE {not_null} GROUP BY {cols}
+        ) AND {not_null}
+    """))
+
+
+def upgrade():
+    conn = op.get_bind()
+    _dedupe_bookings(conn)
+    _dedupe(conn, 'attendances', ['booking_id'])
+    _dedupe(conn, 'teacher_session_overrides', ['original_teacher_id', 'date', 'timeslot_id'])
+
+    # Unique constraints replace the plain indexes on the same columns
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_index('ix_bookings_enrollment_date_slot')
+        batch_op.create_unique_constraint('uq_bookings_enrollment_date_slot', ['enrollment_id', 'date', 'timeslot_id'])
+
+    with op.batch_alter_table('attendances', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendances_booking_id')
+        batch_op.create_unique_constraint('uq_attendances_booking_id', ['booking_id'])
+
+    with op.batch_alter_table('teacher_session_overrides', schema=None) as batch_op:
+        batch_op.drop_index('ix_session_overrides_original_date_slot')
+        batch_op.create_unique_constraint('uq_session_overrides_original_date_slot', ['original_teacher_id', 'date', 'timeslot_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('teacher_session_overrides', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_session_overrides_original_date_slot', type_='unique')
+        batch_op.create_index('ix_session_overrides_original_date_slot', ['original_teacher_id', 'date', 'timeslot_id'], unique=False)
+
+    with op.batch_alter_table('attendances', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_attendances_booking_id', type_='unique')
+        batch_op.create_index('ix_attendances_booking_id', ['booking_id'], unique=False)
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_bookings_enrollment_date_slot', type_='unique')
+        batch_op.create_index('ix_bookings_enrollment_date_slot', ['enrollment_id', 'date', 'timeslot_id'], unique=False)
@@ -0,0 +1,44 @@
+"""Add outbound_messages (WhatsApp send queue)
+
+Revision ID: 7a4d2e9b6c13
+Revises: 3c8e5a1f9d27
+Create Date: 2026-10-17 14:41:09.226518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4d2e9b6c13'
+down_revision = '3c8e5a1f9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbound_messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(length=100), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('source', sa.String(length=50), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('outbound_messages', schema=None) as batch_op:
+        batch_op.create_index('ix_outbound_messages_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+        batch_op.create_index('ix_outbound_messages_recipient_status', ['recipient', 'status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('outbound_messages', schema=None) as batch_op:
+        batch_op.drop_index('ix_outbound_messages_recipient_status')
+        batch_op.drop_index('ix_outbound_messages_status_next_attempt')
+
+    op.drop_table('outbound_messages')
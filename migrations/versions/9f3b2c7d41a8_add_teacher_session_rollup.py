@@ -0,0 +1,55 @@
+"""Add teacher_session_rollup (monthly session count per teacher)
+
+Revision ID: 9f3b2c7d41a8
+Revises: 5386ccb84e52
+Create Date: 2026-10-17 11:20:44.583102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b2c7d41a8'
+down_revision = '5386ccb84e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    rollup = op.create_table('teacher_session_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('teacher_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('sessions', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('teacher_id', 'year', 'month', name='uq_teacher_session_rollup_teacher_month')
+    )
+    with op.batch_alter_table('teacher_session_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_teacher_session_rollup_year_month', ['year', 'month'], unique=False)
+
+    # Backfill from existing attendance
+    attendances = sa.table('attendances',
+                           sa.column('booking_id', sa.Integer),
+                           sa.column('teacher_id', sa.Integer),
+                           sa.column('date', sa.Date))
+    year = sa.cast(sa.extract('year', attendances.c.date), sa.Integer)
+    month = sa.cast(sa.extract('month', attendances.c.date), sa.Integer)
+    counts = sa.select(
+        attendances.c.teacher_id, year, month,
+        sa.func.count(sa.distinct(attendances.c.booking_id))
+    ).where(
+        attendances.c.teacher_id.isnot(None),
+        attendances.c.date.isnot(None),
+        attendances.c.booking_id.isnot(None)
+    ).group_by(attendances.c.teacher_id, year, month)
+    op.execute(rollup.insert().from_select(['teacher_id', 'year', 'month', 'sessions'], counts))
+
+
+def downgrade():
+    with op.batch_alter_table('teacher_session_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_teacher_session_rollup_year_month')
+
+    op.drop_table('teacher_session_rollup')
@@ -0,0 +1,28 @@
+"""Add cache_versions for cache invalidation shared across workers
+
+Revision ID: a4f8c2e6d913
+Revises: e7c3a9d2f5b1
+Create Date: 2026-10-17 16:20:41.093127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4f8c2e6d913'
+down_revision = 'e7c3a9d2f5b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_versions',
+    sa.Column('namespace', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('namespace')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_versions')
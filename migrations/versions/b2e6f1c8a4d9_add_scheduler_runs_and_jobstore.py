@@ -0,0 +1,57 @@
+"""Add scheduler_runs and the APScheduler job store table
+
+Revision ID: b2e6f1c8a4d9
+Revises: 7a4d2e9b6c13
+Create Date: 2026-10-17 16:12:47.581203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e6f1c8a4d9'
+down_revision = '7a4d2e9b6c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scheduler_runs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('job_id', sa.String(length=100), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('duration_ms', sa.Integer(), nullable=True),
+    sa.Column('rows_scanned', sa.Integer(), nullable=True),
+    sa.Column('messages_sent', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('pid', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('scheduler_runs', schema=None) as batch_op:
+        batch_op.create_index('ix_scheduler_runs_job_started', ['job_id', 'started_at'], unique=False)
+
+    # Same layout SQLAlchemyJobStore creates itself (apscheduler 3.x); not an app model.
+    # A scheduler that already ran against this database (job store start) may have
+    # created it before this migration, so only create it when it is missing.
+    if sa.inspect(op.get_bind()).has_table('apscheduler_jobs'):
+        return
+    op.create_table('apscheduler_jobs',
+    sa.Column('id', sa.Unicode(length=191), nullable=False),
+    sa.Column('next_run_time', sa.Float(precision=25), nullable=True),
+    sa.Column('job_state', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('apscheduler_jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_apscheduler_jobs_next_run_time', ['next_run_time'], unique=False)
+
+
+def downgrade():
+    if sa.inspect(op.get_bind()).has_table('apscheduler_jobs'):
+        op.drop_table('apscheduler_jobs')  # drops its indexes too
+    with op.batch_alter_table('scheduler_runs', schema=None) as batch_op:
+        batch_op.drop_index('ix_scheduler_runs_job_started')
+
+    op.drop_table('scheduler_runs')
@@ -0,0 +1,35 @@
+"""Allow one queued/running report job per identical request
+
+Revision ID: c6d1e8f3a2b7
+Revises: a4f8c2e6d913
+Create Date: 2026-10-17 18:05:12.530481
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6d1e8f3a2b7'
+down_revision = 'a4f8c2e6d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Duplicates queued before the index existed: keep the newest, fail the rest
+    op.execute(
+        "UPDATE report_jobs SET status = 'failed', error = 'Duplikat' "
+        "WHERE status IN ('queued', 'running') AND id NOT IN ("
+        "SELECT MAX(id) FROM report_jobs WHERE status IN ('queued', 'running') "
+        "GROUP BY report, params_hash)"
+    )
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.create_index('ux_report_jobs_active', ['report', 'params_hash'], unique=True,
+                              postgresql_where=sa.text("status IN ('queued', 'running')"),
+                              sqlite_where=sa.text("status IN ('queued', 'running')"))
+
+
+def downgrade():
+    with op.batch_alter_table('report_jobs', schema=None) as batch_op:
+        batch_op.drop_index('ux_report_jobs_active')
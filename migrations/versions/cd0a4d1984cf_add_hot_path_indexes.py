@@ -0,0 +1,72 @@
+"""Add indexes for hot booking/attendance/override lookups
+
+Revision ID: cd0a4d1984cf
+Revises: 25e809e16c43
+Create Date: 2026-10-17 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cd0a4d1984cf'
+down_revision = '25e809e16c43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('student_schedules', schema=None) as batch_op:
+        batch_op.create_index('ix_student_schedules_teacher_day_slot', ['teacher_id', 'day_of_week', 'timeslot_id'], unique=False)
+        batch_op.create_index('ix_student_schedules_enrollment_id', ['enrollment_id'], unique=False)
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.create_index('ix_bookings_enrollment_date_slot', ['enrollment_id', 'date', 'timeslot_id'], unique=False)
+        batch_op.create_index('ix_bookings_teacher_date_status', ['teacher_id', 'date', 'status'], unique=False)
+        batch_op.create_index('ix_bookings_class_enrollment_id', ['class_enrollment_id'], unique=False)
+
+    with op.batch_alter_table('attendances', schema=None) as batch_op:
+        batch_op.create_index('ix_attendances_booking_id', ['booking_id'], unique=False)
+        batch_op.create_index('ix_attendances_teacher_date', ['teacher_id', 'date'], unique=False)
+
+    with op.batch_alter_table('attendance_requests', schema=None) as batch_op:
+        batch_op.create_index('ix_attendance_requests_booking_status', ['booking_id', 'approval_status'], unique=False)
+        batch_op.create_index('ix_attendance_requests_pending', ['request_date'], unique=False,
+                              postgresql_where=sa.text("approval_status = 'pending'"),
+                              sqlite_where=sa.text("approval_status = 'pending'"))
+
+    with op.batch_alter_table('teacher_session_overrides', schema=None) as batch_op:
+        batch_op.create_index('ix_session_overrides_original_date_slot', ['original_teacher_id', 'date', 'timeslot_id'], unique=False)
+        batch_op.create_index('ix_session_overrides_substitute_date', ['substitute_teacher_id', 'date'], unique=False)
+
+    with op.batch_alter_table('reschedule_requests', schema=None) as batch_op:
+        batch_op.create_index('ix_reschedule_requests_pending', ['request_date'], unique=False,
+                              postgresql_where=sa.text("status = 'pending'"),
+                              sqlite_where=sa.text("status = 'pending'"))
+
+
+def downgrade():
+    with op.batch_alter_table('reschedule_requests', schema=None) as batch_op:
+        batch_op.drop_index('ix_reschedule_requests_pending')
+
+    with op.batch_alter_table('teacher_session_overrides', schema=None) as batch_op:
+        batch_op.drop_index('ix_session_overrides_substitute_date')
+        batch_op.drop_index('ix_session_overrides_original_date_slot')
+
+    with op.batch_alter_table('attendance_requests', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendance_requests_pending')
+        batch_op.drop_index('ix_attendance_requests_booking_status')
+
+    with op.batch_alter_table('attendances', schema=None) as batch_op:
+        batch_op.drop_index('ix_attendances_teacher_date')
+        batch_op.drop_index('ix_attendances_booking_id')
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_index('ix_bookings_class_enrollment_id')
+        batch_op.drop_index('ix_bookings_teacher_date_status')
+        batch_op.drop_index('ix_bookings_enrollment_date_slot')
+
+    with op.batch_alter_table('student_schedules', schema=None) as batch_op:
+        batch_op.drop_index('ix_student_schedules_enrollment_id')
+        batch_op.drop_index('ix_student_schedules_teacher_day_slot')
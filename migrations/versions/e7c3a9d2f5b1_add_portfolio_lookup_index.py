@@ -0,0 +1,26 @@
+"""Add index for portfolio lookups per class enrollment and syllabus topic
+
+Revision ID: e7c3a9d2f5b1
+Revises: b2e6f1c8a4d9
+Create Date: 2026-10-17 14:05:12.518440
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7c3a9d2f5b1'
+down_revision = 'b2e6f1c8a4d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('portfolios', schema=None) as batch_op:
+        batch_op.create_index('ix_portfolios_class_enrollment_syllabus', ['class_enrollment_id', 'syllabus_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('portfolios', schema=None) as batch_op:
+        batch_op.drop_index('ix_portfolios_class_enrollment_syllabus')
@@ -0,0 +1,85 @@
+"""
+Shared fixtures: the app on a throwaway database, logged-in test clients
+and a SQL statement counter.
+
+Runs on a temporary SQLite file by default; set TEST_DATABASE_URL to run
+against a (disposable) Postgres database, e.g. for the EXPLAIN checks.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Config reads the environment at import time: set it before importing the app
+_db_dir = tempfile.mkdtemp(prefix='elearn-tests-')
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL') or f'sqlite:///{_db_dir}/test.db'
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ['SCHEDULER_ENABLED'] = 'false'
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.services.syllabus_index import _syllabus_cache
+from app.services.teacher_calendar import _calendar_cache
+
+
+@pytest.fixture(scope='session')
+def _app():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def app(_app):
+    """Empty schema and caches for every test (no app context is left pushed)"""
+    with _app.app_context():
+        db.drop_all()
+        db.create_all()
+    _syllabus_cache.clear()
+    _calendar_cache.clear()
+    yield _app
+    with _app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client_for(app):
+    """client_for(user_id) -> test client logged in as that user"""
+    def make_client(user_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+    return make_client
+
+
+class QueryLog(list):
+    """SQL statements executed inside count_queries()"""
+
+    def touching(self, table):
+        return [sql for sql in self if table in sql]
+
+
+@pytest.fixture
+def count_queries(app):
+    """with count_queries() as log: ... -> log holds every statement sent to the database"""
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def counter():
+        log = QueryLog()
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            log.append(statement)
+
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield log
+        finally:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
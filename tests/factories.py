@@ -0,0 +1,96 @@
+"""
+Minimal data builders for the tests. Each returns plain ids, so callers can
+use them after the app context that created the rows is gone.
+"""
+from datetime import date, time, timedelta
+
+from app import db
+from app.models import (
+    Attendance, Booking, ClassEnrollment, Enrollment, MasterClass, Portfolio, Program, ProgramClass,
+    StudentSchedule, Syllabus, TimeSlot, User
+)
+
+
+def create_user(role, name):
+    user = User(email=f'{name.lower()}@example.com', name=name, role=role)
+    db.session.add(user)
+    db.session.flush()
+    return user.id
+
+
+def create_timeslot(name='Pagi', start_hour=9):
+    timeslot = TimeSlot(name=name, start_time=time(start_hour, 0), end_time=time(start_hour + 2, 0))
+    db.session.add(timeslot)
+    db.session.flush()
+    return timeslot.id
+
+
+def create_program(name, n_classes=1, n_topics=4, sessions_per_topic=1):
+    """Program with n_classes classes of n_topics syllabus topics each -> (program_id, [class_id, ...])"""
+    master_class = MasterClass(name=f'{name} master', default_max_izin=2)
+    program = Program(name=name)
+    db.session.add_all([master_class, program])
+    db.session.flush()
+
+    class_ids = []
+    for i in range(n_classes):
+        program_class = ProgramClass(
+            program_id=program.id, master_class_id=master_class.id, name=f'{name} kelas {i + 1}',
+            total_sessions=n_topics * sessions_per_topic, max_izin=2, order=i
+        )
+        db.session.add(program_class)
+        db.session.flush()
+        db.session.add_all(
+            Syllabus(program_class_id=program_class.id, topic_name=f'Topik {k + 1}',
+                     sessions=sessions_per_topic, order=k)
+            for k in range(n_topics)
+        )
+        class_ids.append(program_class.id)
+    db.session.flush()
+    return program.id, class_ids
+
+
+def enroll_student(student_id, program_id, teacher_id, timeslot_id, completed=2, portfolios=True):
+    """
+    Active enrollment in every class of the program: a weekly schedule,
+    `completed` past sessions with attendance, one upcoming booking and
+    (optionally) a portfolio per syllabus topic. Returns the enrollment id.
+    """
+    today = date.today()
+    enrollment = Enrollment(student_id=student_id, program_id=program_id, status='active',
+                            first_class_date=today - timedelta(weeks=completed + 1))
+    db.session.add(enrollment)
+    db.session.flush()
+
+    program_classes = ProgramClass.query.filter_by(program_id=program_id).order_by(ProgramClass.order).all()
+    for i, program_class in enumerate(program_classes):
+        class_enrollment = ClassEnrollment(enrollment_id=enrollment.id, program_class_id=program_class.id,
+                                           sessions_remaining=program_class.total_sessions - completed)
+        db.session.add(class_enrollment)
+        db.session.flush()
+
+        day_of_week = (today.weekday() + i + 1) % 7
+        db.session.add(StudentSchedule(enrollment_id=enrollment.id, class_enrollment_id=class_enrollment.id,
+                                       teacher_id=teacher_id, day_of_week=day_of_week, timeslot_id=timeslot_id))
+
+        first_upcoming = today + timedelta(days=i + 1)
+        for week in range(1, completed + 1):
+            booking = Booking(enrollment_id=enrollment.id, class_enrollment_id=class_enrollment.id,
+                              date=first_upcoming - timedelta(weeks=week), timeslot_id=timeslot_id,
+                              teacher_id=teacher_id, status='completed')
+            db.session.add(booking)
+            db.session.flush()
+            db.session.add(Attendance(booking_id=booking.id, teacher_id=teacher_id, date=booking.date,
+                                      status='Hadir'))
+        db.session.add(Booking(enrollment_id=enrollment.id, class_enrollment_id=class_enrollment.id,
+                               date=first_upcoming, timeslot_id=timeslot_id, teacher_id=teacher_id,
+                               status='booked'))
+
+        if portfolios:
+            db.session.add_all(
+                Portfolio(class_enrollment_id=class_enrollment.id, syllabus_id=syllabus.id,
+                          file_name=f'karya-{syllabus.id}.png')
+                for syllabus in Syllabus.query.filter_by(program_class_id=program_class.id)
+            )
+    db.session.flush()
+    return enrollment.id
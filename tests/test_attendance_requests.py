@@ -0,0 +1,45 @@
+"""Bulk approval of a session's attendance requests."""
+import pytest
+
+from app import db
+from app.models import AttendanceRequest, Booking
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+
+@pytest.fixture
+def requests_data(app):
+    """One request on an already attended booking, one on an open booking"""
+    with app.app_context():
+        admin_id = create_user('admin', 'Admin')
+        teacher_id = create_user('teacher', 'Pengajar')
+        program_id, _ = create_program('Program')
+        enrollment_id = enroll_student(create_user('student', 'Siswa'), program_id, teacher_id,
+                                       create_timeslot(), completed=1)
+        ids = {}
+        for status in ('completed', 'booked'):
+            booking = Booking.query.filter_by(enrollment_id=enrollment_id, status=status).first()
+            att_req = AttendanceRequest(booking_id=booking.id, teacher_id=teacher_id,
+                                        status_request='Hadir', reason='Lupa absen')
+            db.session.add(att_req)
+            db.session.flush()
+            ids[status] = att_req.id
+        db.session.commit()
+    return {'admin': admin_id, 'requests': ids}
+
+
+def test_conflicting_requests_are_rejected(app, requests_data, client_for):
+    client = client_for(requests_data['admin'])
+    with client.session_transaction() as sess:
+        sess['_csrf_token'] = 'token'
+    response = client.post('/admin/attendance-request/approve-session', data={
+        'request_ids': list(requests_data['requests'].values()), 'csrf_token': 'token',
+    })
+    assert response.status_code == 302
+
+    with app.app_context():
+        conflicting = db.session.get(AttendanceRequest, requests_data['requests']['completed'])
+        approved = db.session.get(AttendanceRequest, requests_data['requests']['booked'])
+        assert conflicting.approval_status == 'rejected'
+        assert conflicting.rejection_reason
+        assert approved.approval_status == 'approved'
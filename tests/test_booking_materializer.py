@@ -0,0 +1,69 @@
+"""Upcoming booked rows follow the enrollment status."""
+from datetime import date
+
+import pytest
+
+from app import db
+from app.models import Booking, StudentSchedule
+from app.services.booking_materializer import materialize_bookings, release_schedule_bookings
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+
+@pytest.fixture
+def enrollment(app):
+    """Active enrollment with its horizon materialized"""
+    with app.app_context():
+        admin_id = create_user('admin', 'Admin')
+        student_id = create_user('student', 'Siswa')
+        program_id, _ = create_program('Program', n_classes=2, n_topics=8)
+        enrollment_id = enroll_student(student_id, program_id, create_user('teacher', 'Pengajar'),
+                                       create_timeslot(), completed=2)
+        materialize_bookings(enrollment_ids=[enrollment_id])
+        db.session.commit()
+    return {'admin': admin_id, 'student': student_id, 'enrollment': enrollment_id}
+
+
+def _bookings(enrollment_id, status):
+    return Booking.query.filter_by(enrollment_id=enrollment_id, status=status).all()
+
+
+def _update_status(client, data, status):
+    with client.session_transaction() as sess:
+        sess['_csrf_token'] = 'token'
+    return client.post(f"/admin/student/{data['student']}/{data['enrollment']}", data={
+        'update_info': '1', 'status': status, 'csrf_token': 'token',
+    })
+
+
+def test_leaving_active_releases_upcoming_bookings(app, enrollment, client_for):
+    client = client_for(enrollment['admin'])
+    with app.app_context():
+        assert any(b.date > date.today() for b in _bookings(enrollment['enrollment'], 'booked'))
+        completed = len(_bookings(enrollment['enrollment'], 'completed'))
+
+    assert _update_status(client, enrollment, 'completed').status_code == 302
+
+    with app.app_context():
+        assert not [b for b in _bookings(enrollment['enrollment'], 'booked') if b.date > date.today()]
+        # Attended history stays
+        assert len(_bookings(enrollment['enrollment'], 'completed')) == completed
+
+    assert _update_status(client, enrollment, 'active').status_code == 302
+
+    with app.app_context():
+        assert any(b.date > date.today() for b in _bookings(enrollment['enrollment'], 'booked'))
+
+
+def test_release_schedule_bookings_keeps_other_weekdays(app, enrollment):
+    with app.app_context():
+        sched, other = StudentSchedule.query.filter_by(enrollment_id=enrollment['enrollment']).all()
+        other_booked = len([b for b in _bookings(enrollment['enrollment'], 'booked')
+                            if b.date.weekday() == other.day_of_week])
+
+        assert release_schedule_bookings(sched)
+        db.session.commit()
+
+        booked = _bookings(enrollment['enrollment'], 'booked')
+        assert not [b for b in booked if b.date > date.today() and b.date.weekday() == sched.day_of_week]
+        assert len([b for b in booked if b.date.weekday() == other.day_of_week]) == other_booked
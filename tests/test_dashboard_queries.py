@@ -0,0 +1,54 @@
+"""The student dashboard loads all enrollments with a fixed number of queries."""
+import pytest
+
+from app import db
+from app.services.progress import build_enrollments_progress, load_student_enrollments
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+
+def _student_with_enrollments(n_enrollments, teacher_id, timeslot_id):
+    student_id = create_user('student', f'Siswa{n_enrollments}')
+    for i in range(n_enrollments):
+        program_id, _ = create_program(f'Program {n_enrollments}-{i}', n_classes=2)
+        enroll_student(student_id, program_id, teacher_id, timeslot_id)
+    return student_id
+
+
+@pytest.fixture
+def students(app):
+    """(student with 1 enrollment, student with 4), each enrollment with 2 classes"""
+    with app.app_context():
+        teacher_id = create_user('teacher', 'Pengajar')
+        timeslot_id = create_timeslot()
+        one = _student_with_enrollments(1, teacher_id, timeslot_id)
+        many = _student_with_enrollments(4, teacher_id, timeslot_id)
+        db.session.commit()
+    return one, many
+
+
+def test_progress_query_count_does_not_grow_with_enrollments(app, students, count_queries):
+    counts = {}
+    for student_id in students:
+        with app.app_context():
+            with count_queries() as queries:
+                enrollments_data = build_enrollments_progress(load_student_enrollments(student_id))
+            assert enrollments_data
+            counts[student_id] = len(queries)
+
+    one, many = students
+    assert counts[one] == counts[many], counts
+
+
+def test_dashboard_query_count_does_not_grow_with_enrollments(students, client_for, count_queries):
+    """Whole page, including upcoming sessions expanded from the weekly schedules"""
+    counts = {}
+    for student_id in students:
+        client = client_for(student_id)
+        with count_queries() as queries:
+            response = client.get('/')
+        assert response.status_code == 200
+        counts[student_id] = len(queries)
+
+    one, many = students
+    assert counts[one] == counts[many], counts
@@ -0,0 +1,120 @@
+"""
+The hot-path queries of `flask audit-indexes` use an index on Postgres.
+
+Needs a Postgres test database (TEST_DATABASE_URL=postgresql://...);
+skipped on SQLite.
+"""
+import os
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import insert, text
+
+from app import db
+from app.cli import _audited_queries, _plan_uses_seq_scan
+from app.models import (
+    Attendance, AttendanceRequest, Booking, ClassEnrollment, Enrollment, MasterClass, Program, ProgramClass,
+    RescheduleRequest, StudentSchedule, TeacherSessionOverride, TimeSlot, User
+)
+
+pytestmark = pytest.mark.skipif(
+    not os.environ['DATABASE_URL'].startswith('postgresql'),
+    reason='EXPLAIN plans are checked on Postgres only (set TEST_DATABASE_URL)'
+)
+
+N_TEACHERS = 20
+N_STUDENTS = 500
+N_TIMESLOTS = 3
+WEEKS = 20
+
+
+def _seed():
+    """A few months of bookings, attendance and requests, so the planner sees realistic tables"""
+    start = date.today() - timedelta(weeks=WEEKS // 2)
+    teachers = range(1, N_TEACHERS + 1)
+    students = range(N_TEACHERS + 1, N_TEACHERS + N_STUDENTS + 1)
+
+    db.session.execute(insert(User), [
+        {'id': user_id, 'email': f'user{user_id}@example.com', 'name': f'User {user_id}',
+         'role': 'teacher' if user_id in teachers else 'student'}
+        for user_id in [*teachers, *students]
+    ])
+    db.session.execute(insert(TimeSlot), [
+        {'id': i, 'name': f'Sesi {i}', 'start_time': time(8 + 3 * i), 'end_time': time(10 + 3 * i)}
+        for i in range(1, N_TIMESLOTS + 1)
+    ])
+    db.session.execute(insert(MasterClass), [{'id': 1, 'name': 'Master'}])
+    db.session.execute(insert(Program), [{'id': 1, 'name': 'Program'}])
+    db.session.execute(insert(ProgramClass), [
+        {'id': 1, 'program_id': 1, 'master_class_id': 1, 'name': 'Kelas', 'total_sessions': WEEKS}
+    ])
+    db.session.execute(insert(Enrollment), [
+        {'id': i, 'student_id': student_id, 'program_id': 1, 'status': 'active', 'first_class_date': start}
+        for i, student_id in enumerate(students, 1)
+    ])
+    db.session.execute(insert(ClassEnrollment), [
+        {'id': i, 'enrollment_id': i, 'program_class_id': 1, 'sessions_remaining': WEEKS}
+        for i in range(1, N_STUDENTS + 1)
+    ])
+
+    schedules, bookings, attendances, attendance_requests, reschedules = [], [], [], [], []
+    for i in range(1, N_STUDENTS + 1):
+        teacher_id = teachers[i % N_TEACHERS]
+        day_of_week, timeslot_id = i % 7, i % N_TIMESLOTS + 1
+        schedules.append({'id': i, 'enrollment_id': i, 'class_enrollment_id': i, 'teacher_id': teacher_id,
+                          'day_of_week': day_of_week, 'timeslot_id': timeslot_id})
+        first = start + timedelta(days=(day_of_week - start.weekday()) % 7)
+        for week in range(WEEKS):
+            booking_id = len(bookings) + 1
+            booking_date = first + timedelta(weeks=week)
+            past = booking_date < date.today()
+            bookings.append({'id': booking_id, 'enrollment_id': i, 'class_enrollment_id': i, 'date': booking_date,
+                             'timeslot_id': timeslot_id, 'teacher_id': teacher_id,
+                             'status': 'completed' if past else 'booked'})
+            if past:
+                attendances.append({'id': booking_id, 'booking_id': booking_id, 'teacher_id': teacher_id,
+                                    'date': booking_date, 'status': 'Hadir'})
+            if week % 5 == 0:
+                attendance_requests.append({
+                    'booking_id': booking_id, 'teacher_id': teacher_id, 'status_request': 'Hadir',
+                    'reason': 'Lupa absen', 'request_date': datetime.combine(booking_date, time(20)),
+                    'approval_status': 'pending' if booking_id % 50 == 0 else 'approved'
+                })
+            if week % 7 == 3:
+                reschedules.append({
+                    'student_schedule_id': i, 'original_date': booking_date, 'original_timeslot_id': timeslot_id,
+                    'original_teacher_id': teacher_id, 'new_date': booking_date + timedelta(days=1),
+                    'new_timeslot_id': timeslot_id, 'new_teacher_id': teacher_id, 'class_enrollment_id': i,
+                    'student_id': students[i - 1], 'requested_by': students[i - 1],
+                    'request_date': datetime.combine(booking_date, time(12)),
+                    'status': 'pending' if booking_id % 40 == 0 else 'approved'
+                })
+
+    overrides = [
+        {'date': start + timedelta(days=day), 'timeslot_id': slot, 'original_teacher_id': teacher_id,
+         'substitute_teacher_id': teachers[teacher_id % N_TEACHERS], 'created_by': teachers[0]}
+        for day in range(0, WEEKS * 7, 3) for slot in range(1, N_TIMESLOTS + 1) for teacher_id in teachers[::4]
+    ]
+
+    for model, rows in [(StudentSchedule, schedules), (Booking, bookings), (Attendance, attendances),
+                        (AttendanceRequest, attendance_requests), (RescheduleRequest, reschedules),
+                        (TeacherSessionOverride, overrides)]:
+        db.session.execute(insert(model), rows)
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def test_audited_queries_use_indexes(app):
+    with app.app_context():
+        _seed()
+
+        seq_scans = []
+        for name, table, stmt in _audited_queries():
+            sql = str(stmt.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+            seq_scan, plan = _plan_uses_seq_scan(sql, table)
+            db.session.rollback()
+            if seq_scan:
+                seq_scans.append(f'{name} ({table}):\n{plan}')
+
+    assert not seq_scans, 'Seq Scan in:\n' + '\n'.join(seq_scans)
@@ -0,0 +1,40 @@
+"""Portfolio status per syllabus topic is loaded in one query, however many topics a class has."""
+import pytest
+
+from app import db
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+
+@pytest.fixture
+def students(app):
+    """{n_topics: student_id} for a class with 1 topic and one with 30, a portfolio per topic"""
+    with app.app_context():
+        admin_id = create_user('admin', 'Admin')
+        teacher_id = create_user('teacher', 'Pengajar')
+        timeslot_id = create_timeslot()
+        by_topics = {}
+        for n_topics in (1, 30):
+            student_id = create_user('student', f'Siswa{n_topics}')
+            program_id, _ = create_program(f'Program {n_topics}', n_topics=n_topics)
+            enroll_student(student_id, program_id, teacher_id, timeslot_id, completed=1)
+            by_topics[n_topics] = student_id
+        db.session.commit()
+    return {'admin': admin_id, 'teacher': teacher_id, 'by_topics': by_topics}
+
+
+@pytest.mark.parametrize('viewer, url', [
+    ('student', '/portfolio/'),
+    ('admin', '/admin/student/{student_id}'),
+    ('teacher', '/teacher/students/{student_id}/progress'),
+])
+def test_portfolio_queries_do_not_grow_with_topics(students, client_for, count_queries, viewer, url):
+    portfolio_queries = {}
+    for n_topics, student_id in students['by_topics'].items():
+        client = client_for(student_id if viewer == 'student' else students[viewer])
+        with count_queries() as queries:
+            response = client.get(url.format(student_id=student_id))
+        assert response.status_code == 200
+        portfolio_queries[n_topics] = len(queries.touching('portfolios'))
+
+    assert portfolio_queries[1] == portfolio_queries[30] > 0, portfolio_queries
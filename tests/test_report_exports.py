@@ -0,0 +1,37 @@
+"""Direct export links build the report in the request and send it as a download."""
+import pytest
+
+from app import db
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+@pytest.fixture
+def recap_data(app):
+    """Admin plus a teacher with a few attended sessions"""
+    with app.app_context():
+        admin_id = create_user('admin', 'Admin')
+        teacher_id = create_user('teacher', 'Pengajar')
+        program_id, _ = create_program('Program', n_classes=2)
+        enroll_student(create_user('student', 'Siswa'), program_id, teacher_id, create_timeslot(), completed=3)
+        db.session.commit()
+    return {'admin': admin_id, 'teacher': teacher_id}
+
+
+@pytest.mark.parametrize('url, mimetype', [
+    ('/admin/teacher-recap/export-all-yearly-excel', XLSX),
+    ('/admin/teacher-recap/export-all-monthly-excel', XLSX),
+    ('/admin/teacher-recap/export-excel?teacher_id={teacher}', XLSX),
+    ('/admin/attendance/export-excel', XLSX),
+    ('/admin/teacher-recap/export-all-yearly-pdf', 'application/pdf'),
+    ('/admin/teacher-recap/export-pdf?teacher_id={teacher}', 'application/pdf'),
+])
+def test_direct_export(recap_data, client_for, url, mimetype):
+    response = client_for(recap_data['admin']).get(url.format(**recap_data))
+
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert response.headers['Content-Disposition'].startswith('attachment')
+    assert response.data
@@ -0,0 +1,27 @@
+"""Identical report requests share one queued job."""
+import json
+
+from app import db
+from app.models import ReportJob
+from app.services import report_jobs
+
+
+def test_concurrent_submission_reuses_queued_job(app, monkeypatch):
+    params = {'year': 2025}
+    with app.app_context():
+        queued = ReportJob(report='teacher_recap_yearly_excel', params=json.dumps(params),
+                           params_hash=report_jobs.hash_params('teacher_recap_yearly_excel', params),
+                           status='queued')
+        db.session.add(queued)
+        db.session.commit()
+
+        # Lookup runs before the other worker's commit is visible
+        lookups = iter([None])
+        real_lookup = report_jobs._find_reusable_job
+        monkeypatch.setattr(report_jobs, '_find_reusable_job',
+                            lambda report, digest: next(lookups, None) or real_lookup(report, digest))
+
+        job = report_jobs.submit_report_job('teacher_recap_yearly_excel', params)
+
+        assert job.id == queued.id
+        assert ReportJob.query.count() == 1
@@ -0,0 +1,32 @@
+"""The admin student detail page loads its session history with a fixed number of queries."""
+from app import db
+from app.models import Booking, Subject
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+
+def test_student_detail_query_count_does_not_grow_with_history(app, client_for, count_queries):
+    with app.app_context():
+        admin_id = create_user('admin', 'Admin')
+        teacher_id = create_user('teacher', 'Pengajar')
+        timeslot_id = create_timeslot()
+        students = {}
+        for completed in (1, 5):
+            student_id = create_user('student', f'Siswa{completed}')
+            program_id, _ = create_program(f'Program {completed}', n_classes=2, n_topics=6)
+            enrollment_id = enroll_student(student_id, program_id, teacher_id, timeslot_id, completed=completed)
+            # One subject per attended session, so per-row lazy loads would show
+            for booking in Booking.query.filter_by(enrollment_id=enrollment_id, status='completed'):
+                booking.subject = Subject(name=f'Materi {booking.id}')
+            students[completed] = (student_id, enrollment_id)
+        db.session.commit()
+
+    counts = {}
+    client = client_for(admin_id)
+    for completed, (student_id, enrollment_id) in students.items():
+        with count_queries() as queries:
+            response = client.get(f'/admin/student/{student_id}/{enrollment_id}')
+        assert response.status_code == 200
+        counts[completed] = len(queries)
+
+    assert counts[1] == counts[5], counts
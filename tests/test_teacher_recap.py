@@ -0,0 +1,58 @@
+"""The session rollup stays equal to the live attendance aggregate."""
+import pytest
+
+from app import db
+from app.models import Attendance, Booking, TeacherSessionRollup, User
+from app.services.recap import find_rollup_mismatches, rebuild_rollup
+
+from tests.factories import create_program, create_timeslot, create_user, enroll_student
+
+
+@pytest.fixture
+def recap_data(app):
+    """Admin plus a teacher whose attended sessions are in the rollup"""
+    with app.app_context():
+        admin_id = create_user('admin', 'Admin')
+        teacher_id = create_user('teacher', 'Pengajar')
+        student_id = create_user('student', 'Siswa')
+        program_id, _ = create_program('Program', n_classes=2)
+        enroll_student(student_id, program_id, teacher_id, create_timeslot(), completed=3)
+        rebuild_rollup()
+        db.session.commit()
+    return {'admin': admin_id, 'teacher': teacher_id}
+
+
+def _post(client, url):
+    with client.session_transaction() as sess:
+        sess['_csrf_token'] = 'token'
+    return client.post(url, data={'csrf_token': 'token'})
+
+
+def test_deleting_attended_booking_matches_rebuild(app, recap_data, client_for):
+    with app.app_context():
+        booking_id = db.session.query(Attendance.booking_id).filter(
+            Attendance.teacher_id == recap_data['teacher']
+        ).first()[0]
+
+    response = _post(client_for(recap_data['admin']), f'/admin/booking/delete/{booking_id}')
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(Booking, booking_id) is None
+        assert find_rollup_mismatches() == []
+
+
+def test_deleting_teacher_drops_rollup_rows(app, recap_data, client_for):
+    with app.app_context():
+        # Rollup row left at zero after the teacher's only attended booking was deleted
+        teacher_id = create_user('teacher', 'Pengganti')
+        db.session.add(TeacherSessionRollup(teacher_id=teacher_id, year=2025, month=1, sessions=0))
+        db.session.commit()
+
+    response = _post(client_for(recap_data['admin']), f'/admin/teacher/delete/{teacher_id}')
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(User, teacher_id) is None
+        assert not TeacherSessionRollup.query.filter_by(teacher_id=teacher_id).count()
+        assert find_rollup_mismatches() == []